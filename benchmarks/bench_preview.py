@@ -0,0 +1,74 @@
+"""视口渲染 (shifted_region / render_view) 的正确性检查和耗时。
+
+用法（在仓库根目录）:
+    python benchmarks/bench_preview.py [--repeat 5]
+
+检查只平移可见区域的结果与整张图平移后再裁剪逐像素相同，包括贴着原图边缘、角落的区域
+(小数偏移时插值核会读到区域外补的边)；再比较放大预览时渲染一个画布大小的视口与整图平移的耗时。
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pyimg.chromatic import ChannelShifter, apply_channel_offsets
+from pyimg.preview import shifted_region, render_view
+
+OFFSETS = [
+    {"r": (3, -2), "b": (-1.5, 2.25)},
+    {"r": (2.6, -1.7), "g": (0, 0), "b": (-0.4, 0.6)},
+    {"r": (-3.3, 4.7), "g": (0.5, -0.5)},
+]
+
+
+def rects(width, height):
+    """内部区域，以及贴着四条边、四个角和整张图的区域"""
+    return [
+        (100, 100, 300, 250), (2, 3, 7, 9),
+        (0, 0, 60, 40), (width - 50, height - 50, width, height),
+        (0, height - 100, width, height), (width - 20, 0, width, height),
+        (0, 200, 30, 260), (400, 0, 480, 5),
+        (0, 0, width, height),
+    ]
+
+
+def time_ms(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快一次 (默认 5)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # 像素值避开 0，补边的 0 混进来就能看出差别
+    img = rng.integers(1, 256, (1200, 900, 3), dtype=np.uint8)
+    shifter = ChannelShifter()
+    for offsets in OFFSETS:
+        expected = apply_channel_offsets(img, offsets)
+        for x0, y0, x1, y1 in rects(img.shape[1], img.shape[0]):
+            region = shifted_region(img, offsets, (x0, y0, x1, y1), shifter)
+            assert np.array_equal(region, expected[y0:y1, x0:x1]), (offsets, (x0, y0, x1, y1))
+        print(f"偏移 {offsets}: 全部区域一致")
+
+    page = rng.integers(1, 256, (7000, 5000, 3), dtype=np.uint8)
+    offsets = OFFSETS[0]
+    full = time_ms(lambda: shifter.apply(page, offsets), args.repeat)
+    view = time_ms(lambda: render_view(page, offsets, 2000, 3000, 2.0, 1200, 800, shifter), args.repeat)
+    print(f"5000x7000 页面，1200x800 画布放大 2 倍: 整图平移 {full:.1f} ms，只渲染视口 {view:.2f} ms")
+    print("全部通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
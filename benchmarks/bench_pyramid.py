@@ -0,0 +1,69 @@
+"""预览金字塔缓存 (PyramidCache) 的正确性检查和耗时。
+
+用法（在仓库根目录）:
+    python benchmarks/bench_pyramid.py [--repeat 5]
+
+检查文件没变时切回看过的图直接复用金字塔，文件在磁盘上被改写 (例如批处理输出到同一个文件夹) 后
+get 返回的是新像素；再比较生成金字塔与命中缓存的耗时。
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pyimg.imgio import imread, imwrite
+from pyimg.pyramid import PyramidCache
+
+
+def time_ms(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数，取最快一次 (默认 5)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "page.png")
+        cache = PyramidCache()
+        load = lambda: imread(path, cv2.IMREAD_COLOR)
+
+        first = rng.integers(0, 256, (1200, 900, 3), dtype=np.uint8)
+        imwrite(path, first)
+        pyramid = cache.get(path, load)
+        assert np.array_equal(pyramid.levels[0], first)
+        # 文件没变：同一个金字塔，不再读图
+        assert cache.get(path, lambda: 1 / 0) is pyramid
+
+        # 同样尺寸的新内容、以及尺寸不同的新图
+        for shape in ((1200, 900, 3), (800, 600, 3)):
+            new = rng.integers(0, 256, shape, dtype=np.uint8)
+            imwrite(path, new)
+            pyramid = cache.get(path, load)
+            assert np.array_equal(pyramid.levels[0], new), shape
+            assert cache.get(path, load) is pyramid
+        print("文件改写后返回新像素")
+
+        page = rng.integers(0, 256, (7000, 5000, 3), dtype=np.uint8)
+        build = time_ms(lambda: PyramidCache().get(path, page), args.repeat)
+        hit = time_ms(lambda: cache.get(path, load), args.repeat)
+        print(f"5000x7000 页面: 生成金字塔 {build:.1f} ms，命中缓存 {hit:.3f} ms")
+    print("全部通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
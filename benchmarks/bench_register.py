@@ -0,0 +1,105 @@
+"""自动通道配准 (register_channel / estimate_channel_offsets) 的精度检查和耗时。
+
+用法（在仓库根目录）:
+    python benchmarks/bench_register.py [--repeat 3]
+
+在合成的线稿页面上把 R、B 通道平移已知的亚像素距离，检查估算结果与真实值之差不超过 TOLERANCE 像素，
+并模拟 ECC 失败或跑偏的情况，检查此时退回相位相关的结果，不会给出离谱的偏移量。
+ECC 细化后的误差通常在 0.05 像素以内；只用相位相关时约 0.1~0.4 像素。
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pyimg import chromatic
+from pyimg.chromatic import register_channel, estimate_channel_offsets
+
+# (R 的真实平移, B 的真实平移)，即 channel(p + t) = G(p)
+SHIFTS = [((1.4, -2.3), (-0.7, 0.6)), ((0.25, 0.5), (-3.6, 1.2))]
+# 无论是否采用了 ECC 的结果都应满足 (原先 ECC 跑偏时会差出几十上百像素)
+TOLERANCE = 0.5
+
+
+def synthetic_page(height=1400, width=1000, seed=0):
+    """白底上随机画几百条深色抗锯齿线段，近似漫画线稿"""
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width), 235, np.uint8)
+    for _ in range(400):
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        end = (x + int(rng.integers(-80, 80)), y + int(rng.integers(-80, 80)))
+        cv2.line(page, (x, y), end, int(rng.integers(0, 80)), int(rng.integers(1, 4)), cv2.LINE_AA)
+    return page
+
+
+def shifted(channel, dx, dy):
+    matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(channel, matrix, channel.shape[::-1], flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def error(estimate, truth):
+    return math.hypot(estimate[0] - truth[0], estimate[1] - truth[1])
+
+
+def check_register(green, truth):
+    channel = shifted(green, *truth).astype(np.float32)
+    estimate = register_channel(green.astype(np.float32), channel)
+    assert error(estimate, truth) <= TOLERANCE, (estimate, truth)
+    return estimate
+
+
+def check_fallback(green, truth):
+    """ECC 抛异常、相关系数太低、或跑到很远时，结果都应落回相位相关的估计"""
+    real_ecc = cv2.findTransformECC
+    fakes = {
+        "异常": lambda *args: (_ for _ in ()).throw(cv2.error("ECC 不收敛")),
+        "相关系数低": lambda tmpl, img, warp, *args: (0.2, warp + np.float32([[0, 0, 0.4], [0, 0, -0.4]])),
+        "跑偏": lambda tmpl, img, warp, *args: (0.9, warp + np.float32([[0, 0, 33.8], [0, 0, -40.7]])),
+    }
+    try:
+        for name, fake in fakes.items():
+            chromatic.cv2.findTransformECC = fake
+            estimate = check_register(green, truth)
+            print(f"  ECC {name}: {estimate[0]:.3f}, {estimate[1]:.3f}")
+    finally:
+        chromatic.cv2.findTransformECC = real_ecc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="estimate_channel_offsets 重复次数，取最快一次 (默认 3)")
+    args = parser.parse_args()
+
+    green = synthetic_page()
+    for r_shift, b_shift in SHIFTS:
+        print(f"真实平移 R={r_shift} B={b_shift}")
+        for truth in (r_shift, b_shift):
+            estimate = check_register(green, truth)
+            print(f"  register_channel {truth}: {estimate[0]:.3f}, {estimate[1]:.3f} (误差 {error(estimate, truth):.3f})")
+            # 同样的输入，结果必须一样
+            assert check_register(green, truth) == estimate
+        check_fallback(green, r_shift)
+
+        img = cv2.merge([shifted(green, *b_shift), green, shifted(green, *r_shift)])
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            offsets = estimate_channel_offsets(img)
+            best = min(best, time.perf_counter() - start)
+        # 对齐时通道要反方向移动
+        for name, truth in (("r", r_shift), ("b", b_shift)):
+            assert error(offsets[name], (-truth[0], -truth[1])) <= TOLERANCE, (name, offsets[name], truth)
+        print(f"  estimate_channel_offsets: r={tuple(round(v, 3) for v in offsets['r'])} "
+              f"b={tuple(round(v, 3) for v in offsets['b'])}  {best * 1000:.1f} ms")
+    print("全部通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""通道平移单次耗时对比：原先的 Pillow split/paste/merge 路径 vs ChannelShifter。
+
+用法（在仓库根目录）:
+    python benchmarks/bench_shift.py [图片文件夹 ...] [--repeat 5]
+
+默认使用仓库自带的样张 (手动色差/in、图像降噪/in_clean)。
+相当于手动批量色差预览中拖动一次滑块、或批处理中处理一页时的平移开销，读写文件不计入。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pyimg.batch import list_images
+from pyimg.chromatic import ChannelShifter
+from pyimg.imgio import imread
+
+DEFAULT_DIRS = [os.path.join(ROOT, "手动色差", "in"), os.path.join(ROOT, "图像降噪", "in_clean")]
+
+INT_OFFSETS = {"r": (3, -2), "g": (0, 0), "b": (-2, 1)}
+FRACTION_OFFSETS = {"r": (2.6, -1.7), "g": (0, 0), "b": (-0.4, 0.6)}
+
+
+def legacy_shift_channel(channel, dx, dy):
+    if dx == 0 and dy == 0: return channel
+    shifted = Image.new('L', channel.size, 0)
+    shifted.paste(channel, (dx, dy))
+    return shifted
+
+
+def legacy_apply(img_pil, offsets):
+    r, g, b = img_pil.split()
+    r = legacy_shift_channel(r, *offsets['r'])
+    g = legacy_shift_channel(g, *offsets['g'])
+    b = legacy_shift_channel(b, *offsets['b'])
+    return Image.merge('RGB', (r, g, b))
+
+
+def time_ms(func, arg, offsets, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg, offsets)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folders", nargs="*", default=DEFAULT_DIRS)
+    parser.add_argument("--repeat", type=int, default=5, help="每页重复次数，取最快一次 (默认 5)")
+    args = parser.parse_args()
+
+    pages = [p for folder in args.folders if os.path.isdir(folder) for p in list_images(folder)]
+    if not pages:
+        print("没有找到样张")
+        return 1
+
+    shifter = ChannelShifter()
+    legacy, integer, fraction = [], [], []
+    for path in pages:
+        img = imread(path, cv2.IMREAD_COLOR)
+        img_pil = Image.fromarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        legacy.append(time_ms(legacy_apply, img_pil, INT_OFFSETS, args.repeat))
+        integer.append(time_ms(shifter.apply, img, INT_OFFSETS, args.repeat))
+        fraction.append(time_ms(shifter.apply, img, FRACTION_OFFSETS, args.repeat))
+        # 整数偏移的结果必须与原先一致
+        expected = cv2.cvtColor(np.asarray(legacy_apply(img_pil, INT_OFFSETS)), cv2.COLOR_RGB2BGR)
+        assert np.array_equal(shifter.apply(img, INT_OFFSETS), expected)
+
+    b, i, f = statistics.median(legacy), statistics.median(integer), statistics.median(fraction)
+    print(f"样张 {len(pages)} 页，每页取 {args.repeat} 次中最快一次 (ms/次，中位数)")
+    print(f"{'Pillow split/paste/merge (整数)':<34}{b:>10.2f}")
+    print(f"{'ChannelShifter (整数)':<34}{i:>10.2f}{b / i:>7.1f}x")
+    print(f"{'ChannelShifter (亚像素)':<34}{f:>10.2f}{b / f:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""二值化 / 去浅色 单页耗时对比：原先的 Pillow point(lambda) 路径 vs 查表 (cv2.LUT) 路径。
+
+用法（在仓库根目录）:
+    python benchmarks/bench_threshold.py [图片文件夹 ...] [--repeat 3]
+
+默认使用仓库自带的样张 (二值化/in、图像降噪/in_clean)。
+只统计内存中的处理耗时（解码后到编码前），读写文件不计入。
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from pyimg.batch import list_images
+from pyimg.imgio import imread
+from pyimg.threshold import apply_threshold, binarize_lut, whiten_lut
+
+DEFAULT_DIRS = [os.path.join(ROOT, "二值化", "in"), os.path.join(ROOT, "图像降噪", "in_clean")]
+
+
+def legacy_binarize(gray_pil, threshold):
+    return gray_pil.point(lambda p: 255 if p > threshold else 0, '1')
+
+
+def legacy_whiten(gray_pil, threshold):
+    return gray_pil.point(lambda p: 255 if p > threshold else p)
+
+
+def legacy_otsu_whiten(gray, _threshold):
+    otsu_threshold_val, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    processed_img = gray.copy()
+    processed_img[gray > otsu_threshold_val] = 255
+    return processed_img
+
+
+def time_ms(func, arg, threshold, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg, threshold)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("folders", nargs="*", default=DEFAULT_DIRS)
+    parser.add_argument("--repeat", type=int, default=3, help="每页重复次数，取最快一次 (默认 3)")
+    args = parser.parse_args()
+
+    pages = [p for folder in args.folders for p in list_images(folder)]
+    if not pages:
+        print("没有找到样张")
+        return 1
+
+    cases = [
+        ("二值化 手动 128", legacy_binarize, True, lambda g, t: apply_threshold(g, t, binarize_lut), 128),
+        ("去浅色 手动 240", legacy_whiten, True, lambda g, t: apply_threshold(g, t, whiten_lut), 240),
+        ("去浅色 Otsu", legacy_otsu_whiten, False, lambda g, t: apply_threshold(g, t, whiten_lut), -1),
+    ]
+    results = {name: ([], []) for name, *_ in cases}
+    for path in pages:
+        gray = imread(path, cv2.IMREAD_GRAYSCALE)
+        gray_pil = Image.fromarray(gray)
+        for name, legacy, legacy_on_pil, new, threshold in cases:
+            before, after = results[name]
+            before.append(time_ms(legacy, gray_pil if legacy_on_pil else gray, threshold, args.repeat))
+            after.append(time_ms(new, gray, threshold, args.repeat))
+        # 结果必须与原先一致
+        assert np.array_equal(np.asarray(legacy_whiten(gray_pil, 240)), apply_threshold(gray, 240, whiten_lut))
+
+    print(f"样张 {len(pages)} 页，每页取 {args.repeat} 次中最快一次 (ms/页，中位数)")
+    print(f"{'':<16}{'原先':>10}{'查表':>10}{'加速':>8}")
+    for name, (before, after) in results.items():
+        b, a = statistics.median(before), statistics.median(after)
+        print(f"{name:<16}{b:>10.2f}{a:>10.2f}{b / a:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
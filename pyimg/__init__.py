@@ -0,0 +1,23 @@
+"""
+pyimg: 漫画扫描图批处理工具的无界面核心。
+
+各个 Tk 小工具只负责界面，图像处理本身都放在这里的纯函数中：
+
+    pyimg.denoise    去扫描件纹路 (clean_manga_scan)
+    pyimg.threshold  二值化 / 去浅色
+    pyimg.chromatic  红蓝通道缩放色差校正
+    pyimg.stitch     拼长图
+    pyimg.convert    批量格式转换 / DDS 转 JPG
+    pyimg.batch      文件枚举与并行批处理
+    pyimg.manifest   断点续跑的任务记录
+    pyimg.cache      按内容寻址的结果缓存
+    pyimg.straighten 页面拉直
+    pyimg.crop       四边裁剪
+    pyimg.pipeline   多步骤流水线
+    pyimg.preview    色差预览的视口渲染
+    pyimg.pyramid    界面缩放用的图像金字塔
+
+命令行入口: python -m pyimg <子命令> --help
+"""
+
+__version__ = "0.2.1"
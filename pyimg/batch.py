@@ -0,0 +1,200 @@
+"""文件枚举与并行批处理。"""
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from .imgio import IOStats
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp')
+
+
+def list_images(folder, extensions=IMAGE_EXTENSIONS, recursive=False):
+    """
+    返回文件夹中所有图片的完整路径，按路径排序，保证每次处理顺序一致。
+    recursive=True 时包含子文件夹。
+    """
+    extensions = tuple(ext.lower() for ext in extensions)
+    paths = []
+    if recursive:
+        for root, _, files in os.walk(folder):
+            paths.extend(os.path.join(root, f) for f in files if f.lower().endswith(extensions))
+    else:
+        for f in os.listdir(folder):
+            full_path = os.path.join(folder, f)
+            if f.lower().endswith(extensions) and os.path.isfile(full_path):
+                paths.append(full_path)
+    return sorted(paths)
+
+
+def _init_worker():
+    # 每个进程只用一个 OpenCV 线程，避免多进程 x 多线程抢占 CPU
+    try:
+        import cv2
+        cv2.setNumThreads(1)
+    except ImportError:
+        pass
+
+
+def imap_ordered(func, jobs, workers=1, cancel_event=None, use_threads=False):
+    """
+    对每个 job (参数元组) 调用 func(*job)，依次产出 (job, result, error)。
+
+    workers > 1 时在进程池中并行执行，但结果始终按 jobs 的顺序产出，
+    日志和进度因此是确定的。单个任务抛出的异常放在 error 中返回，不会中断整批。
+    func 必须是模块顶层函数，才能被发送到子进程。
+
+    任务是边消费边提交的，同时在途的任务最多为 workers 的两倍，不会一次把整个文件夹塞进池里。
+    cancel_event (threading.Event) 被设置后立即停止提交新任务，排队中的任务被取消，
+    正在执行的任务完成并产出后生成器结束。
+    use_threads=True 时改用线程池，适合 OpenCV 这类会释放 GIL 的处理，
+    也不需要子进程（在界面程序和打包后的 exe 中更省事）。
+    """
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    jobs = iter(jobs)
+    if workers <= 1:
+        for job in jobs:
+            if cancelled():
+                return
+            try:
+                yield job, func(*job), None
+            except Exception as e:
+                yield job, None, e
+        return
+
+    if use_threads:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    max_pending = workers * 2
+    pending = deque()
+    with executor:
+        try:
+            while True:
+                while len(pending) < max_pending and not cancelled():
+                    job = next(jobs, None)
+                    if job is None:
+                        break
+                    pending.append((job, executor.submit(func, *job)))
+                if not pending:
+                    return
+                if cancelled():
+                    # 排队中的任务直接取消，只等待已经开始的任务
+                    for _, future in pending:
+                        future.cancel()
+                job, future = pending.popleft()
+                if future.cancelled():
+                    continue
+                try:
+                    yield job, future.result(), None
+                except Exception as e:
+                    yield job, None, e
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+
+class Prefetcher:
+    """
+    在后台线程中提前载入接下来要用的文件，适合界面程序逐页处理时隐藏解码等待。
+
+    load(key) 为载入函数。prefetch(keys) 提交其中尚未在途的 key，并取消不再需要的；
+    get(key) 取出结果，已载入完成时立即返回，否则等待，没有提交过的当场在调用线程中载入。
+    载入时抛出的异常在 get 时重新抛出。
+    """
+
+    def __init__(self, load, workers=1):
+        self.load = load
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._futures = {}
+
+    def prefetch(self, keys):
+        keys = list(keys)
+        for key in list(self._futures):
+            if key not in keys:
+                self._futures.pop(key).cancel()
+        for key in keys:
+            if key not in self._futures:
+                self._futures[key] = self._executor.submit(self.load, key)
+
+    def get(self, key):
+        future = self._futures.pop(key, None)
+        if future is None or future.cancelled():
+            return self.load(key)
+        return future.result()
+
+    def shutdown(self):
+        """取消排队中的载入，不等待正在进行的那一个"""
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BackgroundWriter:
+    """
+    在后台线程池中执行保存之类的收尾任务，界面提交后立即继续，不必等待编码和写盘。
+
+    最多 max_pending 个任务在途，再提交时 submit 会等到有任务完成，
+    避免操作员连续确认时积压过多整页图像占用内存。
+    每个任务结束后在工作线程中调用 on_done(name, error)，成功时 error 为 None。
+    Tk 程序不能在 on_done 中调用 after (工作线程会等界面线程处理，界面线程等待保存时就会卡死)，
+    应把结果放进 queue.Queue，由界面线程用 after 定时取出；收尾时用 shutdown(wait=False) 加 idle() 轮询。
+    """
+
+    def __init__(self, workers=2, max_pending=4, on_done=None):
+        self.on_done = on_done
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def submit(self, name, func, *args):
+        self._slots.acquire()
+        future = self._executor.submit(self._run, name, func, args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._discard)
+        return future
+
+    def _discard(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _run(self, name, func, args):
+        error = None
+        try:
+            func(*args)
+        except Exception as e:
+            error = e
+        finally:
+            self._slots.release()
+        if self.on_done is not None:
+            self.on_done(name, error)
+
+    def wait(self):
+        """等待已提交的任务全部完成"""
+        with self._lock:
+            futures, self._futures = self._futures, set()
+        for future in futures:
+            future.result()
+
+    def idle(self):
+        """已提交的任务都已结束 (on_done 也已调用完) 时返回 True"""
+        with self._lock:
+            return not self._futures
+
+    def shutdown(self, wait=True):
+        """不再接受新任务，已提交的任务照常写完。wait=True 时等它们全部结束"""
+        self._executor.shutdown(wait=wait)
+
+
+def call_with_stats(func, *args):
+    """
+    为单个任务统计 I/O：调用 func(*args, stats=IOStats())，返回 (func 的返回值, IOStats)。
+    可作为 imap_ordered 的 func 使用，job 为 (func, 参数...)。
+    """
+    stats = IOStats()
+    return func(*args, stats=stats), stats
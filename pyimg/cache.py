@@ -0,0 +1,172 @@
+"""按内容寻址的处理结果缓存。
+
+键由 (输入文件内容哈希, 操作名, 参数, 输出格式, pyimg 版本) 计算，
+同一张图用同样的参数再处理一次时，直接把上次的输出链接或复制过来，不再解码和计算。
+缓存总大小超过上限时，按最近使用时间 (文件修改时间) 从旧到新删除。
+总大小在每个进程中累计，只在第一次写入、每写入 RESCAN_INTERVAL 次和超过上限时才遍历缓存目录。
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from . import __version__
+from .manifest import file_digest
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# 其他进程写入的条目不会计入本进程的累计值，隔一段时间重新遍历一次校正
+RESCAN_INTERVAL = 256
+# 淘汰时删到上限的这个比例以下，缓存满了以后不会每写一次就遍历、淘汰一次
+EVICT_TO = 0.9
+
+# 缓存目录 -> [总大小, 上次遍历后的写入次数]。进程池的每个任务都会收到一个新的 ResultCache，
+# 所以放在模块级，同一进程内共用
+_usage = {}
+_usage_lock = threading.Lock()
+
+
+def default_cache_dir():
+    """环境变量 PYIMG_CACHE_DIR 优先，否则为系统的用户缓存目录下的 pyimg"""
+    path = os.environ.get("PYIMG_CACHE_DIR")
+    if path:
+        return path
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyimg")
+
+
+def default_max_bytes():
+    """环境变量 PYIMG_CACHE_MB 可修改缓存上限，默认 2 GB"""
+    try:
+        return int(os.environ["PYIMG_CACHE_MB"]) * 1024 ** 2
+    except (KeyError, ValueError):
+        return DEFAULT_MAX_BYTES
+
+
+class ResultCache:
+    """
+    磁盘结果缓存。可以在多个进程中同时使用：写入先写临时文件再改名，
+    条目被别的进程淘汰时按未命中处理。
+
+    link=True 时命中优先用硬链接，不占额外空间；pyimg 写文件总是先写临时文件再替换，
+    不会改到缓存里的副本。其他会原地改写输出文件的程序请用默认的复制方式。
+    """
+
+    def __init__(self, root=None, max_bytes=None, link=False):
+        self.root = os.path.abspath(root or default_cache_dir())
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self.link = link
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, input_path, op, params, output_ext, digest=None, stats=None):
+        """
+        计算缓存键：输入内容哈希 + 操作 + 参数 + 输出格式 + 版本。
+        digest 为已算好的输入哈希，不给时在这里计算，读文件的字节数计入 stats
+        """
+        if digest is None:
+            digest = file_digest(input_path, stats=stats)
+        payload = json.dumps([digest, op, params, output_ext.lower(), __version__], sort_keys=True)
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=20).hexdigest()
+
+    def _entry_path(self, key, output_ext):
+        return os.path.join(self.root, key[:2], key + output_ext.lower())
+
+    def lookup(self, op, params, input_path, output_path, digest=None, stats=None):
+        """
+        查找缓存。命中时把上次的结果放到 output_path，返回 (True, key)；
+        未命中返回 (False, key)，处理完后调用 store(key, output_path) 存入。
+        输入文件读不了时返回 (False, None)，由后面的处理去报告错误。
+        digest 为调用方已算好的输入哈希 (与任务记录共用)，不给时在这里计算，读文件的字节数计入 stats。
+        """
+        output_ext = os.path.splitext(output_path)[1]
+        try:
+            key = self.key(input_path, op, params, output_ext, digest, stats)
+        except OSError:
+            return False, None
+        entry = self._entry_path(key, output_ext)
+        try:
+            # 更新修改时间，作为 LRU 的“最近使用”
+            os.utime(entry)
+            self._place(entry, output_path)
+        except OSError:
+            return False, key
+        return True, key
+
+    def store(self, key, output_path):
+        """把刚生成的 output_path 存入缓存，然后按需淘汰旧条目。key 为 None 时什么都不做"""
+        if key is None:
+            return
+        entry = self._entry_path(key, os.path.splitext(output_path)[1])
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_path = f"{entry}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            shutil.copyfile(output_path, tmp_path)
+            added = os.path.getsize(tmp_path)
+            try:
+                # 覆盖同一个条目时只增加差值
+                added -= os.path.getsize(entry)
+            except OSError:
+                pass
+            os.replace(tmp_path, entry)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with _usage_lock:
+            usage = _usage.get(self.root)
+            if usage is not None and usage[1] < RESCAN_INTERVAL:
+                usage[0] += added
+                usage[1] += 1
+                if usage[0] <= self.max_bytes:
+                    return
+        self.evict()
+
+    def _place(self, entry, output_path):
+        tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if self.link:
+                try:
+                    os.link(entry, tmp_path)
+                except OSError:
+                    # 跨磁盘或文件系统不支持硬链接
+                    shutil.copyfile(entry, tmp_path)
+            else:
+                shutil.copyfile(entry, tmp_path)
+            os.replace(tmp_path, output_path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _entries(self):
+        # 所有缓存条目 (修改时间, 大小, 路径)。*.tmp 是正在写入的文件 (可能属于别的进程)，不算在内
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """遍历缓存目录重新统计总大小，超过上限时从最久未使用的条目开始删除，直到低于上限的 EVICT_TO"""
+        with _usage_lock:
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_bytes:
+                target = self.max_bytes * EVICT_TO
+                entries.sort()
+                for _, size, path in entries:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        continue
+                    total -= size
+                    if total <= target:
+                        break
+            _usage[self.root] = [total, 0]
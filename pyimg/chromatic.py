@@ -0,0 +1,457 @@
+"""以 G 通道为基准，按中心缩放 R/B 通道来校正扫描色差。
+
+除了手动设定的统一缩放外，还支持径向 (镜头) 模型：输出像素 p 取源通道中
+c + (p - c) * (k0 + k1 * ρ² + k2 * ρ⁴) 处的值，ρ 为到中心的距离除以半对角线长。
+统一缩放 s 相当于 (1/s, 0, 0)。系数可以从扫描页自动估算，保存为配置文件反复使用。
+"""
+import json
+import math
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from .imgio import imread, imwrite
+
+
+# 每个 (高, 宽, 缩放比例) 的定点映射表占 6 字节/像素 (3479x4924 的页面约 100 MB)，每个进程各有一份。
+# 一批图片尺寸大多相同，只需要 R、B 两份
+MAP_CACHE_SIZE = 2
+
+
+@lru_cache(maxsize=MAP_CACHE_SIZE)
+def scale_maps(height, width, scale_factor):
+    """
+    生成按中心缩放的 remap 映射表：输出像素 (x, y) 取源图中
+    c + (x - c) / scale 处的值。转换成定点格式，remap 时更快、占用更少。
+    """
+    cx = (width - 1) / 2.0
+    cy = (height - 1) / 2.0
+    xs = (cx + (np.arange(width, dtype=np.float32) - cx) / scale_factor).astype(np.float32)
+    ys = (cy + (np.arange(height, dtype=np.float32) - cy) / scale_factor).astype(np.float32)
+    map_x = np.broadcast_to(xs, (height, width))
+    map_y = np.broadcast_to(ys[:, None], (height, width))
+    map1, map2 = cv2.convertMaps(np.ascontiguousarray(map_x), np.ascontiguousarray(map_y), cv2.CV_16SC2)
+    map1.flags.writeable = False
+    map2.flags.writeable = False
+    return map1, map2
+
+
+def scale_channel(channel, scale_factor, dst=None, interpolation=cv2.INTER_LANCZOS4):
+    """
+    按中心缩放单个颜色通道，输出尺寸不变。放大和缩小都只做一次 remap，
+    缩小时超出原图的边缘用最近的像素填充。dst 可传入预先分配好的输出数组。
+    interpolation 默认与原先的 resize 一样用 LANCZOS4；INTER_CUBIC 快约 4 倍，适合预览。
+    """
+    if scale_factor == 1.0:
+        if dst is None:
+            return channel
+        np.copyto(dst, channel)
+        return dst
+    height, width = channel.shape[:2]
+    map1, map2 = scale_maps(height, width, float(scale_factor))
+    return cv2.remap(channel, map1, map2, interpolation, dst=dst, borderMode=cv2.BORDER_REPLICATE)
+
+
+def correct_aberration_image(img, r_scale, b_scale, interpolation=cv2.INTER_LANCZOS4):
+    """对 BGR 图像做色差校正，返回新图像。"""
+    # OpenCV默认通道顺序是 B, G, R
+    b_channel, g_channel, r_channel = cv2.split(img)
+
+    # 以G通道为基准，缩放R和B通道
+    corrected_r = scale_channel(r_channel, r_scale, interpolation=interpolation)
+    corrected_b = scale_channel(b_channel, b_scale, interpolation=interpolation)
+
+    # 合并通道
+    return cv2.merge([corrected_b, g_channel, corrected_r])
+
+
+@lru_cache(maxsize=MAP_CACHE_SIZE)
+def radial_maps(height, width, coeffs):
+    """生成径向模型的 remap 映射表，coeffs 为 (k0, k1, k2) 元组"""
+    k0, k1, k2 = coeffs
+    cx = (width - 1) / 2.0
+    cy = (height - 1) / 2.0
+    norm = np.hypot(cx, cy) or 1.0
+    dx = (np.arange(width, dtype=np.float32) - cx)[None, :]
+    dy = (np.arange(height, dtype=np.float32) - cy)[:, None]
+    rho2 = (dx * dx + dy * dy) / np.float32(norm * norm)
+    factor = np.float32(k0) + rho2 * (np.float32(k1) + rho2 * np.float32(k2))
+    map1, map2 = cv2.convertMaps(cx + dx * factor, cy + dy * factor, cv2.CV_16SC2)
+    map1.flags.writeable = False
+    map2.flags.writeable = False
+    return map1, map2
+
+
+def radial_channel(channel, coeffs, dst=None, interpolation=cv2.INTER_LANCZOS4):
+    """按径向模型校正单个通道，输出尺寸不变。interpolation 同 scale_channel"""
+    height, width = channel.shape[:2]
+    map1, map2 = radial_maps(height, width, tuple(float(k) for k in coeffs))
+    return cv2.remap(channel, map1, map2, interpolation, dst=dst, borderMode=cv2.BORDER_REPLICATE)
+
+
+def correct_radial_image(img, r_coeffs, b_coeffs, interpolation=cv2.INTER_LANCZOS4):
+    """按径向模型校正 BGR 图像的 R、B 通道，返回新图像"""
+    b_channel, g_channel, r_channel = cv2.split(img)
+    return cv2.merge([radial_channel(b_channel, b_coeffs, interpolation=interpolation), g_channel,
+                      radial_channel(r_channel, r_coeffs, interpolation=interpolation)])
+
+
+def _tile_shifts(reference, channel, tile, min_std):
+    """
+    把图分成 tile x tile 的小块，用相位相关测量 channel 相对 reference 的位移。
+    返回 (块中心 x, 块中心 y, dx, dy, 权重) 数组，纹理太少的块跳过。
+    """
+    height, width = reference.shape
+    window = cv2.createHanningWindow((tile, tile), cv2.CV_32F)
+    samples = []
+    for y in range(0, height - tile + 1, tile):
+        for x in range(0, width - tile + 1, tile):
+            ref_tile = reference[y:y + tile, x:x + tile]
+            if ref_tile.std() < min_std:
+                continue
+            (dx, dy), response = cv2.phaseCorrelate(ref_tile, channel[y:y + tile, x:x + tile], window)
+            # 位移超过块的四分之一多半是误匹配
+            if response < 0.1 or abs(dx) > tile / 4 or abs(dy) > tile / 4:
+                continue
+            samples.append((x + (tile - 1) / 2.0, y + (tile - 1) / 2.0, dx, dy, response))
+    return np.array(samples, dtype=np.float64).reshape(-1, 5)
+
+
+def measure_radial_shifts(img, tile=64, min_std=8.0):
+    """
+    测量 BGR 图像中 R、B 相对 G 的局部位移。返回 {"r": 样本, "b": 样本}，
+    每行为 (相对中心的 x, y, dx, dy, 权重, ρ²)，单位为 img 的像素。
+    """
+    height, width = img.shape[:2]
+    b_channel, g_channel, r_channel = (c.astype(np.float32) for c in cv2.split(img))
+    cx = (width - 1) / 2.0
+    cy = (height - 1) / 2.0
+    norm2 = cx * cx + cy * cy or 1.0
+    result = {}
+    for name, channel in (("r", r_channel), ("b", b_channel)):
+        s = _tile_shifts(g_channel, channel, tile, min_std)
+        s[:, 0] -= cx
+        s[:, 1] -= cy
+        result[name] = np.column_stack([s, (s[:, 0] ** 2 + s[:, 1] ** 2) / norm2])
+    return result
+
+
+def fit_radial(samples, degree=2):
+    """
+    用加权最小二乘拟合径向系数：位移 d = (p - c) * (k0 - 1 + k1 * ρ² + k2 * ρ⁴)。
+    degree 为 0 时只拟合统一缩放。先拟合一次，去掉残差特别大的样本后再拟合。
+    返回 ((k0, k1, k2), 均方根残差)。
+    """
+    if len(samples) < degree + 2:
+        raise ValueError("有效的测量块太少，无法估算，请换线条更多的页面")
+    x, y, dx, dy, weight, rho2 = samples.T
+    powers = np.column_stack([rho2 ** i for i in range(degree + 1)])
+    design = np.concatenate([x[:, None] * powers, y[:, None] * powers])
+    target = np.concatenate([dx, dy])
+    w = np.sqrt(np.concatenate([weight, weight]))
+    keep = np.ones(len(target), dtype=bool)
+    for _ in range(2):
+        coef = np.linalg.lstsq(design[keep] * w[keep, None], target[keep] * w[keep], rcond=None)[0]
+        residual = np.abs(design @ coef - target)
+        keep = residual <= max(3.0 * np.median(residual[keep]), 0.05)
+    rms = float(np.sqrt(np.mean(residual[keep] ** 2)))
+    coeffs = [0.0, 0.0, 0.0]
+    coeffs[:degree + 1] = coef.tolist()
+    coeffs[0] += 1.0
+    return tuple(coeffs), rms
+
+
+def _normalized(channel):
+    channel = channel.astype(np.float32)
+    return (channel - channel.mean()) / max(float(channel.std()), 1e-6)
+
+
+def _refine_step(images, current, name, degree):
+    """
+    基于梯度的一步高斯-牛顿迭代：校正后的通道 C 与 G 之差约等于
+    ∇C · (p - c) * (δ0 + δ1 * ρ² + δ2 * ρ⁴)，对所有页面的全部像素解这个线性最小二乘，返回 δ。
+    """
+    index = 2 if name == "r" else 0
+    normal = np.zeros((degree + 1, degree + 1))
+    rhs = np.zeros(degree + 1)
+    for img in images:
+        height, width = img.shape[:2]
+        # 只用于估算、不输出，三次插值足够且快得多
+        corrected = _normalized(radial_channel(img[:, :, index], current, interpolation=cv2.INTER_CUBIC))
+        reference = _normalized(img[:, :, 1])
+        gx = cv2.Sobel(corrected, cv2.CV_32F, 1, 0, ksize=3, scale=1 / 8)
+        gy = cv2.Sobel(corrected, cv2.CV_32F, 0, 1, ksize=3, scale=1 / 8)
+        cx = (width - 1) / 2.0
+        cy = (height - 1) / 2.0
+        dx = (np.arange(width, dtype=np.float32) - cx)[None, :]
+        dy = (np.arange(height, dtype=np.float32) - cy)[:, None]
+        rho2 = (dx * dx + dy * dy) / np.float32(cx * cx + cy * cy or 1.0)
+        radial = (gx * dx + gy * dy).ravel()
+        columns = [radial]
+        for _ in range(degree):
+            columns.append(columns[-1] * rho2.ravel())
+        design = np.column_stack(columns).astype(np.float64)
+        normal += design.T @ design
+        rhs += design.T @ (reference - corrected).ravel().astype(np.float64)
+    return np.linalg.solve(normal, rhs)
+
+
+def estimate_radial(images, degree=2, tile=64, iterations=5):
+    """
+    从一组 BGR 图像估算 R、B 的径向系数，返回 {"r": (k0, k1, k2), "b": ...}。
+    先用分块相位相关粗估 (能处理几个像素的位移)，但它对亚像素位移会偏小，
+    所以再以粗估结果为起点，用全图梯度做几步高斯-牛顿迭代细化。
+    """
+    result = {}
+    for name in ("r", "b"):
+        samples = np.concatenate([measure_radial_shifts(img, tile)[name] for img in images])
+        coeffs = np.array(fit_radial(samples, degree)[0])
+        for _ in range(iterations):
+            delta = _refine_step(images, tuple(coeffs), name, degree)
+            coeffs[:degree + 1] += delta
+            if np.abs(delta).max() < 1e-6:
+                break
+        result[name] = tuple(coeffs.tolist())
+    return result
+
+
+def corner_shift(coeffs, width, height):
+    """按系数计算图像四角处的位移 (像素)，用来直观判断色差大小"""
+    return (sum(coeffs) - 1.0) * np.hypot((width - 1) / 2.0, (height - 1) / 2.0)
+
+
+def estimate_profile(paths, work_max=2000, degree=2, tile=64, stats=None):
+    """
+    从若干张扫描页估算径向色差配置。页面先缩小到最长边 work_max，
+    所有页面合在一起拟合。同一台扫描仪、同样设置扫出来的页面估算一次即可。
+    返回可直接传给 save_profile 的字典，其中 r_corner_px / b_corner_px 为第一页四角处的位移。
+    """
+    images = []
+    size = None
+    for path in paths:
+        img = imread(path, cv2.IMREAD_COLOR, stats=stats)
+        if img is None:
+            continue
+        height, width = img.shape[:2]
+        size = size or (width, height)
+        work_scale = min(1.0, work_max / max(height, width))
+        if work_scale < 1.0:
+            img = cv2.resize(img, (round(width * work_scale), round(height * work_scale)), interpolation=cv2.INTER_AREA)
+        images.append(img)
+    if not images:
+        raise IOError("没有可读取的图片")
+    profile = {"model": "radial", "pages": len(images)}
+    for name, coeffs in estimate_radial(images, degree, tile).items():
+        profile[name] = list(coeffs)
+        profile[name + "_corner_px"] = round(float(corner_shift(coeffs, *size)), 3)
+    return profile
+
+
+def shift_channel(channel, dx, dy, dst=None):
+    """
+    把单个通道平移 (dx, dy) 像素，可以是小数，用一次 warpAffine 完成。
+    移出的部分丢掉，空出来的边缘填 0，与整数平移时粘贴的效果一致。
+    """
+    if dx == 0 and dy == 0:
+        if dst is None:
+            return channel
+        np.copyto(dst, channel)
+        return dst
+    height, width = channel.shape[:2]
+    matrix = np.float32([[1, 0, dx], [0, 1, dy]])
+    return cv2.warpAffine(channel, matrix, (width, height), dst=dst, flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+
+class ChannelShifter:
+    """
+    把 BGR 图像的各通道分别平移，结果写进复用的 H x W x 3 数组。
+    整数偏移直接用切片赋值搬数据并把空出的边缘填 0；小数偏移先在复用的单通道缓冲区里
+    用 2x2 核做双线性插值，再按整数部分搬过去。图片尺寸不变时不会再分配内存。
+
+    apply 返回的是内部缓冲区，下一次调用会覆盖它，需要保留时请自行 copy。
+    每个线程应使用各自的实例。
+    """
+
+    def __init__(self):
+        self._out = None
+        self._src = None
+        self._dst = None
+
+    def _buffers(self, shape):
+        if self._out is None or self._out.shape != shape:
+            self._out = np.empty(shape, dtype=np.uint8)
+            self._src = np.empty(shape[:2], dtype=np.uint8)
+            self._dst = np.empty(shape[:2], dtype=np.uint8)
+        return self._out
+
+    @staticmethod
+    def _span(offset, length):
+        # 平移 offset 后，目标和源在这一维上的有效区间
+        offset = max(-length, min(length, offset))
+        if offset >= 0:
+            return slice(offset, length), slice(0, length - offset)
+        return slice(0, length + offset), slice(-offset, length)
+
+    def _shift_int(self, src, out, index, dx, dy):
+        height, width = src.shape[:2]
+        dst_y, src_y = self._span(dy, height)
+        dst_x, src_x = self._span(dx, width)
+        out[dst_y, dst_x, index] = src[src_y, src_x]
+        # 空出来的边缘
+        if dy > 0:
+            out[:dst_y.start, :, index] = 0
+        elif dy < 0:
+            out[dst_y.stop:, :, index] = 0
+        if dx > 0:
+            out[:, :dst_x.start, index] = 0
+        elif dx < 0:
+            out[:, dst_x.stop:, index] = 0
+
+    def _shift_fraction(self, img, out, index, dx, dy):
+        # 平移拆成整数部分和 [0, 1) 的小数部分：小数部分的双线性插值就是一个 2x2 卷积核，
+        # filter2D 比通用的 warpAffine 快得多，整数部分再用切片搬过去
+        ix, iy = math.floor(dx), math.floor(dy)
+        fx, fy = dx - ix, dy - iy
+        kernel = np.float32([[fx * fy, (1 - fx) * fy],
+                             [fx * (1 - fy), (1 - fx) * (1 - fy)]])
+        cv2.extractChannel(img, index, self._src)
+        cv2.filter2D(self._src, -1, kernel, dst=self._dst, anchor=(1, 1), borderType=cv2.BORDER_CONSTANT)
+        self._shift_int(self._dst, out, index, ix, iy)
+
+    def apply(self, img, offsets):
+        """按 {"r": (dx, dy), "g": ..., "b": ...} 平移各通道，缺少的通道不动"""
+        out = self._buffers(img.shape)
+        for index, name in enumerate("bgr"):
+            dx, dy = offsets.get(name, (0, 0))
+            if float(dx).is_integer() and float(dy).is_integer():
+                self._shift_int(img[:, :, index], out, index, int(dx), int(dy))
+            else:
+                self._shift_fraction(img, out, index, dx, dy)
+        return out
+
+
+def apply_channel_offsets(img, offsets):
+    """按 {"r": (dx, dy), "g": ..., "b": ...} 平移 BGR 图像的各通道，返回新图像"""
+    return ChannelShifter().apply(img, offsets)
+
+
+# ECC 细化的结果只在相关系数够高、且与相位相关的结果相差不到 ECC_MAX_CORRECTION 像素时采用：
+# 有的 OpenCV 版本上 ECC 会跑到几十上百像素以外，同样的输入每次结果还不一样
+ECC_MIN_CORRELATION = 0.5
+ECC_MAX_CORRECTION = 1.0
+
+
+def _phase_shift(reference, channel):
+    window = cv2.createHanningWindow(reference.shape[::-1], cv2.CV_32F)
+    (dx, dy), _ = cv2.phaseCorrelate(reference, channel, window)
+    return dx, dy
+
+
+def register_channel(reference, channel, levels=4, min_size=256):
+    """
+    求 channel 相对 reference 的平移 (tx, ty)，即 channel(p + t) ≈ reference(p)。
+    先在金字塔顶层用相位相关求粗略位移，逐层放大并用上一层的结果预先对齐后继续相关，
+    最后用 ECC 迭代细化到亚像素；ECC 失败或结果不可信时返回相位相关的结果。
+    两张图都应为 float32 单通道。
+    """
+    pyramid = [(reference, channel)]
+    while len(pyramid) < levels and min(pyramid[-1][0].shape) // 2 >= min_size:
+        ref, ch = pyramid[-1]
+        pyramid.append((cv2.pyrDown(ref), cv2.pyrDown(ch)))
+
+    tx = ty = 0.0
+    for level, (ref, ch) in enumerate(reversed(pyramid)):
+        if level:
+            tx, ty = tx * 2, ty * 2
+        aligned = shift_channel(ch, -tx, -ty)
+        dx, dy = _phase_shift(ref, aligned)
+        tx, ty = tx + dx, ty + dy
+
+    warp = np.float32([[1, 0, tx], [0, 1, ty]])
+    criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 50, 1e-4)
+    try:
+        correlation, warp = cv2.findTransformECC(reference, channel, warp, cv2.MOTION_TRANSLATION, criteria, None, 5)
+    except cv2.error:
+        # 纹理太少时 ECC 可能不收敛
+        return float(tx), float(ty)
+    ex, ey = float(warp[0, 2]), float(warp[1, 2])
+    if not (correlation >= ECC_MIN_CORRELATION and math.hypot(ex - tx, ey - ty) <= ECC_MAX_CORRECTION):
+        return float(tx), float(ty)
+    return ex, ey
+
+
+def estimate_channel_offsets(img, work_max=2000):
+    """
+    自动求出把 R、B 对齐到 G 所需的平移量，返回可直接传给 apply_channel_offsets 的字典。
+    在缩小到最长边 work_max 的图上计算，结果换算回原图像素。
+    """
+    height, width = img.shape[:2]
+    work_scale = min(1.0, work_max / max(height, width))
+    if work_scale < 1.0:
+        img = cv2.resize(img, (round(width * work_scale), round(height * work_scale)), interpolation=cv2.INTER_AREA)
+    b_channel, g_channel, r_channel = (c.astype(np.float32) for c in cv2.split(img))
+    offsets = {"g": (0.0, 0.0)}
+    for name, channel in (("r", r_channel), ("b", b_channel)):
+        tx, ty = register_channel(g_channel, channel)
+        # 对齐时通道要反方向移动
+        offsets[name] = (-tx / work_scale, -ty / work_scale)
+    return offsets
+
+
+def save_profile(path, profile):
+    """把径向色差配置保存为 JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+
+
+def load_profile(path):
+    """读取 save_profile 保存的配置，返回 (r 系数, b 系数)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        profile = json.load(f)
+    if profile.get("model") != "radial":
+        raise ValueError(f"不支持的色差配置: {path}")
+    return tuple(profile["r"]), tuple(profile["b"])
+
+
+def correct_radial(input_path, output_path, r_coeffs, b_coeffs, cache=None, digest=None, stats=None):
+    """按径向系数读取、校正并保存单张图片，其余同 correct_aberration"""
+    cache_key = None
+    if cache is not None:
+        hit, cache_key = cache.lookup("chroma-radial", {"r": list(r_coeffs), "b": list(b_coeffs)}, input_path, output_path,
+                                      digest, stats)
+        if hit:
+            return True
+
+    img = imread(input_path, cv2.IMREAD_COLOR, stats=stats)
+    if img is None:
+        raise IOError("无法读取图像文件，请检查文件是否损坏或路径是否正确。")
+
+    imwrite(output_path, correct_radial_image(img, r_coeffs, b_coeffs), stats=stats)
+    if cache is not None:
+        cache.store(cache_key, output_path)
+    return False
+
+
+def correct_aberration(input_path, output_path, r_scale, b_scale, cache=None, digest=None, stats=None):
+    """
+    读取、校正并保存单张图片，失败时抛出 IOError。
+    cache 为 ResultCache 时先查缓存，命中返回 True；digest 为已算好的输入哈希。
+    """
+    cache_key = None
+    if cache is not None:
+        hit, cache_key = cache.lookup("chroma", {"r_scale": r_scale, "b_scale": b_scale}, input_path, output_path,
+                                      digest, stats)
+        if hit:
+            return True
+
+    img = imread(input_path, cv2.IMREAD_COLOR, stats=stats)
+    if img is None:
+        raise IOError("无法读取图像文件，请检查文件是否损坏或路径是否正确。")
+
+    corrected_img = correct_aberration_image(img, r_scale, b_scale)
+    imwrite(output_path, corrected_img, stats=stats)
+    if cache is not None:
+        cache.store(cache_key, output_path)
+    return False
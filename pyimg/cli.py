@@ -0,0 +1,380 @@
+"""
+命令行入口，无需图形界面即可批量运行各个工具：
+
+    python -m pyimg denoise  输入文件夹 输出文件夹 [--strength 10] [--white 85] [--workers 4]
+    python -m pyimg binarize 输入文件夹 输出文件夹 [--threshold -1] [--method sauvola --block-size 31]
+    python -m pyimg whiten   输入文件夹 输出文件夹 [--threshold 240]
+    python -m pyimg chroma   输入文件夹 输出文件夹 [--r-scale 0.9995] [--b-scale 1.0005] [--profile 配置.json]
+    python -m pyimg chroma-estimate 输入文件夹 配置.json [--pages 5]
+    python -m pyimg stitch   输入文件夹 输出文件 [--direction vertical] [--batch-size 0] [--stream | --tile-size N]
+    python -m pyimg convert  输入文件夹 输出文件夹 --from PNG --to JPEG
+    python -m pyimg dds2jpg  输入文件夹 输出文件夹
+    python -m pyimg pipeline 输入文件夹 输出文件夹 流水线定义.json
+
+处理失败的文件会打印出来，只要有失败退出码就为 1。
+逐文件处理的子命令会在输出文件夹里记录处理结果 (.pyimg_manifest.jsonl)，
+加 --resume 可跳过上次已成功、输入和参数都没变的文件，中断后接着跑。
+加 --cache 使用结果缓存：同一张图用同样参数处理过（哪怕输出到别的文件夹），直接复制上次的结果。
+"""
+import argparse
+import os
+import sys
+
+from . import __version__
+from .batch import IMAGE_EXTENSIONS, list_images, imap_ordered, call_with_stats
+from .imgio import IOStats
+from .manifest import JobManifest, input_digest
+from .cache import ResultCache
+
+
+def _default_workers():
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def _output_path(input_dir, output_dir, path):
+    """保持输入目录的子目录结构"""
+    out_path = os.path.join(output_dir, os.path.relpath(path, input_dir))
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    return out_path
+
+
+def _list_inputs(folder, extensions=IMAGE_EXTENSIONS, recursive=False):
+    """列出要处理的图片，并打印因格式不支持而跳过的文件 (隐藏文件如任务记录不算)"""
+    files = list_images(folder, extensions, recursive)
+    listed = set(files)
+    skipped = [p for p in list_images(folder, ("",), recursive)
+               if p not in listed and not os.path.basename(p).startswith(".")]
+    if skipped:
+        names = ", ".join(os.path.relpath(p, folder) for p in skipped[:5])
+        more = f" 等 {len(skipped)} 个" if len(skipped) > 5 else ""
+        print(f"跳过不支持的文件: {names}{more}")
+    return files
+
+
+def _open_manifest(args, jobs, params):
+    """
+    打开输出文件夹的任务记录。--resume 时从 jobs 中去掉上次已成功、输入和参数都没变的文件。
+    返回 (manifest, 待处理的 jobs)。
+    """
+    manifest = JobManifest(args.output)
+    if args.resume:
+        jobs, skipped = manifest.pending(jobs, params)
+        if skipped:
+            print(f"跳过 {skipped} 个已完成的文件 (--resume)")
+    return manifest, jobs
+
+
+def _make_cache(args):
+    return ResultCache() if args.cache else None
+
+
+def _cache_digest(cache, path, stats):
+    # 用结果缓存时，输入哈希在这里 (主进程) 算一次，附在任务参数末尾 (紧跟 cache)，
+    # 任务查缓存和写任务记录共用；不用缓存时为 None，由任务记录自己计算。读的字节数计入 stats
+    return input_digest(path, stats) if cache is not None else None
+
+
+def _run_jobs(func, jobs, workers, manifest=None, params=None, cache=None):
+    """
+    执行任务并打印结果和 I/O 统计，返回失败数。给出 manifest 时记录每个文件的结果。
+    jobs 的参数以 cache 结尾，这里再附上输入哈希。
+    """
+    failed = 0
+    total = len(jobs)
+    io_total = IOStats()
+    # 生成器：哈希与子进程的处理交替进行
+    measured_jobs = ((func,) + tuple(job) + (_cache_digest(cache, job[0], io_total),) for job in jobs)
+    for i, (job, result, error) in enumerate(imap_ordered(call_with_stats, measured_jobs, workers), start=1):
+        name = os.path.basename(job[1])
+        if error is not None:
+            failed += 1
+            print(f"[{i}/{total}] 失败 {name}: {error}")
+        else:
+            io_total.add(result[1])
+            # 任务函数返回 True 表示命中了结果缓存
+            print(f"[{i}/{total}] 完成 {name}{' (缓存)' if result[0] is True else ''}")
+        if manifest is not None:
+            manifest.record(job[1], params, error is None, output_path=job[2], error=error, digest=job[-1],
+                            stats=io_total)
+    print(f"I/O 统计: {io_total}")
+    return failed
+
+
+def cmd_denoise(args):
+    from .denoise import clean_manga_scan_job
+
+    files = _list_inputs(args.input)
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [(f, _output_path(args.input, args.output, f), args.strength, args.white) for f in files]
+    params = {"op": "denoise", "strength": args.strength, "white": args.white}
+    manifest, jobs = _open_manifest(args, jobs, params)
+    cache = _make_cache(args)
+    total = len(jobs)
+    io_total = IOStats()
+    jobs = ((clean_manga_scan_job,) + job + (cache, _cache_digest(cache, job[0], io_total)) for job in jobs)
+    failed = 0
+    for i, (job, result, error) in enumerate(imap_ordered(call_with_stats, jobs, args.workers), start=1):
+        if error is not None:
+            failed += 1
+            manifest.record(job[1], params, False, output_path=job[2], error=error, digest=job[-1],
+                            stats=io_total)
+            print(f"[{i}/{total}] 处理异常 {os.path.basename(job[1])}: {error}")
+            continue
+        (ok, messages), stats = result
+        io_total.add(stats)
+        failed += not ok
+        manifest.record(job[1], params, ok, output_path=job[2], error=None if ok else "; ".join(messages),
+                        digest=job[-1], stats=io_total)
+        for msg in messages:
+            print(f"[{i}/{total}] {msg}")
+    print(f"I/O 统计: {io_total}")
+    return failed
+
+
+def cmd_binarize(args):
+    from .threshold import THRESHOLD_EXTENSIONS, binarize_file
+
+    files = _list_inputs(args.input, THRESHOLD_EXTENSIONS)
+    os.makedirs(args.output, exist_ok=True)
+    # 文件数少于进程数时，多出来的核用于单页内的分带并行
+    band_workers = max(1, args.workers // max(1, min(args.workers, len(files))))
+    cache = _make_cache(args)
+    jobs = [(f, _output_path(args.input, args.output, f), args.threshold,
+             args.method, args.block_size, args.c, args.k, band_workers, cache) for f in files]
+    # band_workers 不影响结果，不计入参数
+    params = {"op": "binarize", "threshold": args.threshold, "method": args.method,
+              "block_size": args.block_size, "c": args.c, "k": args.k}
+    manifest, jobs = _open_manifest(args, jobs, params)
+    return _run_jobs(binarize_file, jobs, args.workers, manifest, params, cache)
+
+
+def cmd_whiten(args):
+    from .threshold import THRESHOLD_EXTENSIONS, whiten_file
+
+    files = _list_inputs(args.input, THRESHOLD_EXTENSIONS)
+    os.makedirs(args.output, exist_ok=True)
+    cache = _make_cache(args)
+    jobs = [(f, _output_path(args.input, args.output, f), args.threshold, cache) for f in files]
+    params = {"op": "whiten", "threshold": args.threshold}
+    manifest, jobs = _open_manifest(args, jobs, params)
+    return _run_jobs(whiten_file, jobs, args.workers, manifest, params, cache)
+
+
+def cmd_chroma(args):
+    from .chromatic import correct_aberration, correct_radial, load_profile
+
+    files = _list_inputs(args.input, recursive=True)
+    cache = _make_cache(args)
+    if args.profile:
+        r_coeffs, b_coeffs = load_profile(args.profile)
+        func = correct_radial
+        jobs = [(f, _output_path(args.input, args.output, f), r_coeffs, b_coeffs, cache) for f in files]
+        params = {"op": "chroma-radial", "r": r_coeffs, "b": b_coeffs}
+    else:
+        func = correct_aberration
+        jobs = [(f, _output_path(args.input, args.output, f), args.r_scale, args.b_scale, cache) for f in files]
+        params = {"op": "chroma", "r_scale": args.r_scale, "b_scale": args.b_scale}
+    manifest, jobs = _open_manifest(args, jobs, params)
+    return _run_jobs(func, jobs, args.workers, manifest, params, cache)
+
+
+def cmd_chroma_estimate(args):
+    from .chromatic import estimate_profile, save_profile
+
+    files = list_images(args.input, recursive=True)
+    if not files:
+        print("源文件夹中未找到任何图片文件！")
+        return 1
+    # 均匀抽取几页，线条多的页面越多估算越稳
+    step = max(1, len(files) // args.pages)
+    sample = files[::step][:args.pages]
+    print(f"从 {len(sample)} 页估算径向色差...")
+    profile = estimate_profile(sample, work_max=args.work_size, degree=args.degree)
+    save_profile(args.output, profile)
+    print(f"红通道系数: {profile['r']} (四角位移 {profile['r_corner_px']} 像素)")
+    print(f"蓝通道系数: {profile['b']} (四角位移 {profile['b_corner_px']} 像素)")
+    print(f"已保存到 {args.output}")
+    return 0
+
+
+def cmd_stitch(args):
+    from .stitch import stitch_images, save_stitched, plan_batches, stitch_streaming
+
+    files = list_images(args.input)
+    if not files:
+        print("源文件夹中未找到任何图片文件！")
+        return 1
+    failed = 0
+    io_total = IOStats()
+    batches = plan_batches(files, args.batch_size, args.output)
+    for n, (batch, output_file) in enumerate(batches, start=1):
+        try:
+            if args.stream or args.tile_size > 0:
+                written = stitch_streaming(batch, output_file, direction=args.direction,
+                                           tile_size=args.tile_size, stats=io_total)
+                if not written:
+                    raise ValueError("没有可处理的图片")
+                print(f"[{n}/{len(batches)}] 成功保存: {', '.join(written)}")
+                continue
+            stitched_image = stitch_images(batch, direction=args.direction, stats=io_total)
+            if stitched_image is None:
+                raise ValueError("没有可处理的图片")
+            save_stitched(output_file, stitched_image, stats=io_total)
+            print(f"[{n}/{len(batches)}] 成功保存: {output_file}")
+        except Exception as e:
+            failed += 1
+            print(f"[{n}/{len(batches)}] 拼接失败: {e}")
+    print(f"I/O 统计: {io_total}")
+    return failed
+
+
+def cmd_convert(args):
+    from .convert import convert_folder
+
+    def progress(index, total, filename, error):
+        if error is not None:
+            print(f"[{index}/{total}] 转换失败：{filename} - {error}")
+        else:
+            print(f"[{index}/{total}] 已转换：{filename}")
+
+    success, total = convert_folder(args.input, args.output, args.from_format, args.to_format, progress)
+    return total - success
+
+
+def cmd_dds2jpg(args):
+    from .convert import convert_dds_to_jpg
+
+    failures = []
+
+    def log(message):
+        print(message)
+        if message.startswith("转换失败"):
+            failures.append(message)
+
+    convert_dds_to_jpg(args.input, args.output, log_callback=log)
+    return len(failures)
+
+
+def cmd_pipeline(args):
+    from .pipeline import Pipeline, load_definition
+
+    definition = load_definition(args.definition)
+    pipeline = Pipeline.from_definition(definition)
+    files = _list_inputs(args.input)
+    os.makedirs(args.output, exist_ok=True)
+    jobs = [(f, pipeline.output_path_for(_output_path(args.input, args.output, f))) for f in files]
+    # 整个流水线定义作为参数，任一步骤改了都会重新处理
+    params = {"op": "pipeline", "definition": definition}
+    manifest, jobs = _open_manifest(args, jobs, params)
+    print(f"流水线: {' -> '.join(stage.op for stage in pipeline.stages)}，共 {len(jobs)} 个文件")
+
+    failed = 0
+    io_total = IOStats()
+    for i, (input_path, output_path, error) in enumerate(pipeline.run(jobs, stats=io_total), start=1):
+        name = os.path.basename(input_path)
+        if error is not None:
+            failed += 1
+            print(f"[{i}/{len(jobs)}] 失败 {name}: {error}")
+        else:
+            print(f"[{i}/{len(jobs)}] 完成 {name}")
+        manifest.record(input_path, params, error is None, output_path=output_path, error=error, stats=io_total)
+    print(f"I/O 统计: {io_total}")
+    return failed
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m pyimg", description="漫画扫描图批处理工具（命令行版）")
+    parser.add_argument("--version", action="version", version=f"pyimg {__version__}")
+    sub = parser.add_subparsers(dest="command", metavar="子命令")
+    sub.required = True
+
+    def add_io(p, output_help="输出文件夹"):
+        p.add_argument("input", help="输入文件夹")
+        p.add_argument("output", help=output_help)
+
+    def add_batch_options(p):
+        p.add_argument("-j", "--workers", type=int, default=_default_workers(),
+                       help="并行进程数 (默认: CPU 核心数 - 1)")
+        p.add_argument("--resume", action="store_true",
+                       help="断点续跑：跳过上次已成功、输入和参数都没变的文件，只重试失败的")
+        p.add_argument("--cache", action="store_true",
+                       help="使用结果缓存 (目录见 PYIMG_CACHE_DIR，上限 PYIMG_CACHE_MB，默认 2048)")
+
+    p = sub.add_parser("denoise", help="去扫描件纹路 / 降噪")
+    add_io(p)
+    p.add_argument("--strength", type=int, default=10, help="降噪强度 (默认 10，推荐 5-15)")
+    p.add_argument("--white", type=int, default=85, help="白点阈值百分位 (默认 85，推荐 80-95)")
+    add_batch_options(p)
+    p.set_defaults(func=cmd_denoise)
+
+    p = sub.add_parser("binarize", help="二值化")
+    add_io(p)
+    p.add_argument("--threshold", type=int, default=-1, help="阈值 0-255，-1 为 Otsu 自动阈值 (默认)")
+    p.add_argument("--method", choices=("global", "mean", "gaussian", "sauvola"), default="global",
+                   help="global 为全局阈值 (默认)；mean/gaussian/sauvola 为局部阈值，适合光照不均的扫描页")
+    p.add_argument("--block-size", type=int, default=31, help="局部阈值的窗口大小，奇数 (默认 31)")
+    p.add_argument("--c", type=float, default=10, help="mean/gaussian：窗口均值减去的常数 (默认 10)")
+    p.add_argument("--k", type=float, default=0.2, help="sauvola：标准差权重 (默认 0.2)")
+    add_batch_options(p)
+    p.set_defaults(func=cmd_binarize)
+
+    p = sub.add_parser("whiten", help="去浅色：高于阈值的像素变白")
+    add_io(p)
+    p.add_argument("--threshold", type=int, default=240, help="阈值 0-255，-1 为 Otsu 自动阈值 (默认 240)")
+    add_batch_options(p)
+    p.set_defaults(func=cmd_whiten)
+
+    p = sub.add_parser("chroma", help="红蓝通道缩放色差校正（包含子文件夹）")
+    add_io(p)
+    p.add_argument("--r-scale", type=float, default=0.9995, help="红通道缩放 (默认 0.9995)")
+    p.add_argument("--b-scale", type=float, default=1.0005, help="蓝通道缩放 (默认 1.0005)")
+    p.add_argument("--profile", help="chroma-estimate 生成的径向色差配置，指定后忽略 --r-scale / --b-scale")
+    add_batch_options(p)
+    p.set_defaults(func=cmd_chroma)
+
+    p = sub.add_parser("chroma-estimate", help="从扫描页自动估算径向色差，保存为配置文件")
+    add_io(p, output_help="输出的配置文件 (.json)")
+    p.add_argument("--pages", type=int, default=5, help="均匀抽取用于估算的页数 (默认 5)")
+    p.add_argument("--work-size", type=int, default=2000, help="估算时把页面缩小到的最长边 (默认 2000)")
+    p.add_argument("--degree", type=int, choices=(0, 1, 2), default=2,
+                   help="径向多项式阶数，0 为统一缩放 (默认 2)")
+    p.set_defaults(func=cmd_chroma_estimate)
+
+    p = sub.add_parser("stitch", help="拼长图")
+    add_io(p, output_help="输出文件 (如 out.jpg，分批时自动添加 _partN)")
+    p.add_argument("--direction", choices=("vertical", "horizontal"), default="vertical", help="拼接方向 (默认 vertical)")
+    p.add_argument("--batch-size", type=int, default=0, help="每批图片数量，0 为不分批 (默认)")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument("--stream", action="store_true",
+                      help="逐行流式写出单张 PNG，不受 65500 像素限制，内存占用低 (仅纵向，输出须为 .png)")
+    mode.add_argument("--tile-size", type=int, default=0,
+                      help="流式拼接并按此长度 (像素) 切成 _001、_002… 分块文件，0 为不切块 (默认)")
+    p.set_defaults(func=cmd_stitch)
+
+    p = sub.add_parser("convert", help="批量格式转换")
+    add_io(p)
+    p.add_argument("--from", dest="from_format", required=True, help="源格式 (按文件后缀匹配，如 PNG)")
+    p.add_argument("--to", dest="to_format", required=True, help="目标格式 (Pillow 格式名，如 JPEG)")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("dds2jpg", help="DDS 批量转 JPG")
+    add_io(p)
+    p.set_defaults(func=cmd_dds2jpg)
+
+    p = sub.add_parser("pipeline", help="按定义文件依次执行多个步骤，中间结果不落盘")
+    add_io(p)
+    p.add_argument("definition", help="流水线定义文件 (.json，或安装 PyYAML 后用 .yaml)")
+    p.add_argument("--resume", action="store_true",
+                   help="断点续跑：跳过上次已成功、输入和流水线定义都没变的文件")
+    p.set_defaults(func=cmd_pipeline)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.isdir(args.input):
+        print(f"错误: 输入文件夹不存在: {args.input}", file=sys.stderr)
+        return 2
+    failed = args.func(args)
+    return 1 if failed else 0
@@ -0,0 +1,92 @@
+"""图片格式批量转换。"""
+import os
+
+from PIL import Image
+
+
+def get_image_formats(folder):
+    """
+    获取文件夹中所有图片的格式（不重复）
+    """
+    formats = set()
+    if not os.path.exists(folder):
+        return []
+
+    for filename in os.listdir(folder):
+        try:
+            with Image.open(os.path.join(folder, filename)) as img:
+                formats.add(img.format.upper())
+        except (IOError, ValueError):
+            continue
+    return sorted(list(formats))
+
+
+def output_filename_for(filename, to_format):
+    """根据目标格式生成输出文件名，JPEG 使用 .jpg 后缀。"""
+    base_name = os.path.splitext(filename)[0]
+    if to_format.upper() == 'JPEG':
+        return f"{base_name}.jpg"
+    return f"{base_name}.{to_format.lower()}"
+
+
+def convert_image(input_path, output_path, to_format):
+    """把单张图片转换为 to_format (Pillow 格式名，如 'PNG', 'JPEG')。"""
+    with Image.open(input_path) as img:
+        # 转换模式以避免JPG保存问题（如RGBA模式）
+        if img.mode == 'RGBA' and to_format.upper() == 'JPEG':
+            img = img.convert('RGB')
+        img.save(output_path, to_format.upper())
+
+
+def convert_folder(input_folder, output_folder, from_format, to_format, progress_callback=None):
+    """
+    把 input_folder 中后缀为 from_format 的图片全部转换为 to_format。
+    progress_callback(index, total, filename, error) 在每个文件处理完后调用，成功时 error 为 None。
+    返回 (成功数, 总数)。
+    """
+    os.makedirs(output_folder, exist_ok=True)
+
+    files_to_convert = sorted(f for f in os.listdir(input_folder) if f.lower().endswith(from_format.lower()))
+    total_files = len(files_to_convert)
+    count_success = 0
+
+    for i, filename in enumerate(files_to_convert):
+        input_path = os.path.join(input_folder, filename)
+        output_path = os.path.join(output_folder, output_filename_for(filename, to_format))
+        error = None
+        try:
+            convert_image(input_path, output_path, to_format)
+            count_success += 1
+        except Exception as e:
+            error = e
+        if progress_callback:
+            progress_callback(i + 1, total_files, filename, error)
+
+    return count_success, total_files
+
+
+def convert_dds_to_jpg(source_folder, target_folder, log_callback=print):
+    """
+    批量将 DDS 图片转换为 JPG 格式并保存到目标文件夹。
+
+    :param source_folder: 包含 DDS 图片的源文件夹路径。
+    :param target_folder: 保存 JPG 图片的目标文件夹路径。
+    """
+    # 确保目标文件夹存在
+    if not os.path.exists(target_folder):
+        os.makedirs(target_folder)
+
+    # 遍历源文件夹中的文件
+    for file_name in sorted(os.listdir(source_folder)):
+        if file_name.lower().endswith('.dds'):
+            source_path = os.path.join(source_folder, file_name)
+            target_path = os.path.join(target_folder, file_name.rsplit('.', 1)[0] + '.jpg')
+
+            try:
+                # 打开 DDS 图片并转换为 RGB
+                with Image.open(source_path) as img:
+                    img = img.convert('RGB')
+                    img.save(target_path, 'JPEG')
+                    log_callback(f"成功转换: {file_name} -> {target_path}")
+            except Exception as e:
+                log_callback(f"转换失败: {file_name}, 错误: {e}")
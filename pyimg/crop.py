@@ -0,0 +1,18 @@
+"""按四边像素裁剪并可选缩放（批量裁剪）。"""
+import cv2
+
+
+def crop_image(img, top=0, bottom=0, left=0, right=0, scale=1.0):
+    """
+    从四边各裁掉指定像素，scale 不为 1 时再按比例缩放（缩小用 INTER_AREA，放大用 LANCZOS）。
+    返回的是裁剪区域的视图，未缩放时不复制像素。
+    """
+    height, width = img.shape[:2]
+    if left + right >= width or top + bottom >= height:
+        raise ValueError(f"裁剪量超过图片尺寸 ({width}x{height})")
+    cropped = img[top:height - bottom, left:width - right]
+    if scale == 1.0:
+        return cropped
+    new_size = (max(1, int(cropped.shape[1] * scale)), max(1, int(cropped.shape[0] * scale)))
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LANCZOS4
+    return cv2.resize(cropped, new_size, interpolation=interpolation)
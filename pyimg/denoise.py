@@ -0,0 +1,93 @@
+"""去除扫描漫画的纸纹和噪点。"""
+import os
+
+import cv2
+import numpy as np
+
+from .imgio import imread, imwrite
+
+
+def denoise_image(img, denoise_strength=10, white_threshold_percentile=90):
+    """
+    对灰度图做降噪、自动色阶和轻度锐化，返回处理后的 uint8 图像。
+    """
+    # 1. 降噪 (Denoising)
+    # h: 决定过滤器强度的参数。
+    denoised = cv2.fastNlMeansDenoising(img, None, h=denoise_strength, templateWindowSize=7, searchWindowSize=21)
+
+    # 2. 自动色阶 / 漂白纸纹
+    # 计算像素亮度的直方图百分位
+    black_point = np.percentile(denoised, 5)
+    white_point = np.percentile(denoised, white_threshold_percentile)
+
+    # 防止除以零或阈值倒挂
+    if white_point <= black_point:
+        white_point = 255
+        black_point = 0
+
+    # 限制范围并拉伸对比度
+    clipped = np.clip(denoised, black_point, white_point)
+
+    # 归一化到 0-255
+    # 注意: 使用 float 运算防止溢出，最后转回 uint8
+    normalized = ((clipped - black_point) / (white_point - black_point) * 255).astype(np.uint8)
+
+    # 3. (可选) 锐化线条
+    kernel = np.array([[-1, -1, -1],
+                       [-1, 9, -1],
+                       [-1, -1, -1]])
+    sharpened = cv2.filter2D(normalized, -1, kernel)
+    return cv2.addWeighted(normalized, 0.7, sharpened, 0.3, 0)
+
+
+def clean_manga_scan(image_path, output_path, denoise_strength=10, white_threshold_percentile=90, log_callback=None,
+                     cache=None, digest=None, stats=None):
+    """
+    去除扫描漫画的纸纹和噪点，成功返回 True。
+    cache 为 ResultCache 时，同一输入和参数处理过就直接取上次的结果；digest 为已算好的输入哈希。
+    stats 为 IOStats 时累加本次读写的字节数。
+    """
+    try:
+        cache_key = None
+        if cache is not None:
+            params = {"strength": denoise_strength, "white": white_threshold_percentile}
+            hit, cache_key = cache.lookup("denoise", params, image_path, output_path, digest, stats)
+            if hit:
+                if log_callback: log_callback(f"成功 (缓存): {os.path.basename(output_path)}")
+                return True
+
+        # 1. 读取图片 (imgio 处理了中文路径问题)
+        img = imread(image_path, cv2.IMREAD_GRAYSCALE, stats=stats)
+
+        if img is None:
+            if log_callback: log_callback(f"错误: 无法读取图片 {os.path.basename(image_path)}")
+            return False
+
+        final_img = denoise_image(img, denoise_strength, white_threshold_percentile)
+
+        # 2. 保存结果
+        try:
+            imwrite(output_path, final_img, stats=stats)
+        except IOError:
+            if log_callback: log_callback(f"保存失败: {os.path.basename(output_path)}")
+            return False
+        if cache is not None:
+            cache.store(cache_key, output_path)
+        if log_callback: log_callback(f"成功: {os.path.basename(output_path)}")
+        return True
+
+    except Exception as e:
+        if log_callback: log_callback(f"处理异常 {os.path.basename(image_path)}: {str(e)}")
+        return False
+
+
+def clean_manga_scan_job(image_path, output_path, denoise_strength=10, white_threshold_percentile=90, cache=None,
+                         digest=None, stats=None):
+    """
+    供 batch.imap_ordered 使用的任务函数。
+    子进程无法直接写界面日志，所以先把日志收集起来，随结果 (ok, messages) 一起返回。
+    """
+    messages = []
+    ok = clean_manga_scan(image_path, output_path, denoise_strength, white_threshold_percentile,
+                          log_callback=messages.append, cache=cache, digest=digest, stats=stats)
+    return ok, messages
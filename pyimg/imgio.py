@@ -0,0 +1,112 @@
+"""
+支持中文路径的图片读写。
+
+OpenCV 的 imread/imwrite 在 Windows 上不支持非 ASCII 路径，
+所以各工具都用 imdecode/imencode 自己读写文件。这里统一实现：
+读取时把源文件内存映射 (mmap) 后直接交给 imdecode，不再额外复制一份文件内容；
+写入时把编码结果直接写到磁盘。每次读写的字节数都记录在 IOStats 中，方便统计 I/O 开销。
+"""
+import mmap
+import os
+import threading
+
+import cv2
+import numpy as np
+
+
+def format_bytes(n):
+    """把字节数格式化为易读的字符串"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class IOStats:
+    """一次任务中读写的文件数和字节数。为查结果缓存、写任务记录而计算内容哈希读的文件单独计数"""
+
+    def __init__(self):
+        self.files_read = 0
+        self.bytes_read = 0
+        self.files_written = 0
+        self.bytes_written = 0
+        self.files_hashed = 0
+        self.bytes_hashed = 0
+
+    def add(self, other):
+        """累加另一个 IOStats（例如进程池中单个文件的统计）"""
+        self.files_read += other.files_read
+        self.bytes_read += other.bytes_read
+        self.files_written += other.files_written
+        self.bytes_written += other.bytes_written
+        self.files_hashed += other.files_hashed
+        self.bytes_hashed += other.bytes_hashed
+        return self
+
+    def __str__(self):
+        text = (f"读取 {self.files_read} 个文件 ({format_bytes(self.bytes_read)})，"
+                f"写入 {self.files_written} 个文件 ({format_bytes(self.bytes_written)})")
+        if self.files_hashed:
+            text += f"，计算哈希 {self.files_hashed} 个文件 ({format_bytes(self.bytes_hashed)})"
+        return text
+
+
+def imread(path, flags=cv2.IMREAD_COLOR, stats=None):
+    """
+    读取图片，支持中文路径。无法解码时返回 None（与 cv2.imread 一致），
+    文件不存在等错误照常抛出 OSError。
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                img = cv2.imdecode(buf, flags)
+            finally:
+                # 关闭 mmap 前必须释放对它的引用
+                del buf
+
+    if stats is not None:
+        stats.files_read += 1
+        stats.bytes_read += size
+    return img
+
+
+def imencode(ext, img, params=None):
+    """编码图片，失败时抛出 IOError"""
+    is_success, buf = cv2.imencode(ext, img, params or [])
+    if not is_success:
+        raise IOError(f"无法编码图像为 {ext} 格式")
+    return buf
+
+
+def write_buffer(path, buf, stats=None):
+    """
+    把已编码的数据写入文件，返回写入的字节数。
+    先写临时文件再替换目标文件：中途出错不会留下写了一半的文件，
+    也不会改动与目标硬链接在一起的文件（例如结果缓存中的副本）。
+    """
+    buf = np.asarray(buf, dtype=np.uint8)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        buf.tofile(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if stats is not None:
+        stats.files_written += 1
+        stats.bytes_written += buf.nbytes
+    return buf.nbytes
+
+
+def imwrite(path, img, params=None, stats=None):
+    """
+    按扩展名编码并保存图片，支持中文路径。编码失败时抛出 IOError。
+    返回写入的字节数。
+    """
+    buf = imencode(os.path.splitext(path)[1], img, params)
+    return write_buffer(path, buf, stats)
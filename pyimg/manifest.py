@@ -0,0 +1,124 @@
+"""批处理任务记录，用于中断后断点续跑。
+
+每个输出文件夹里放一个 JSON lines 文件，每处理完一个文件追加一行：
+输入路径、大小、修改时间、内容哈希、处理参数和结果。
+重新运行时，输入和参数都没变、上次又成功了的文件直接跳过，失败的文件会重试。
+只追加不改写，程序中途崩溃最多丢掉最后一行。
+"""
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = ".pyimg_manifest.jsonl"
+
+
+def file_digest(path, chunk_size=1 << 20, stats=None):
+    """文件内容的 BLAKE2b 哈希 (十六进制)。stats 为 IOStats 时计入 files_hashed / bytes_hashed"""
+    h = hashlib.blake2b(digest_size=16)
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+            size += len(chunk)
+    if stats is not None:
+        stats.files_hashed += 1
+        stats.bytes_hashed += size
+    return h.hexdigest()
+
+
+def input_digest(path, stats=None):
+    """同 file_digest，文件读不了时返回 None (由后面的处理去报告错误)"""
+    try:
+        return file_digest(path, stats=stats)
+    except OSError:
+        return None
+
+
+def _normalize(params):
+    # 经过一次 JSON 往返，元组变列表，保证和读回来的记录可以直接比较
+    return json.loads(json.dumps(params, sort_keys=True))
+
+
+class JobManifest:
+    """
+    输出文件夹中的任务记录。同一个输入文件以最后一条记录为准。
+    只应在一个线程中调用 record（批处理时在汇总结果的线程中调用）。
+    """
+
+    def __init__(self, output_dir, name=MANIFEST_NAME):
+        self.path = os.path.join(output_dir, name)
+        self.entries = {}
+        self._load()
+
+    @staticmethod
+    def _key(input_path):
+        return os.path.normcase(os.path.abspath(input_path))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.entries[self._key(entry["input"])] = entry
+                except (ValueError, KeyError):
+                    # 崩溃时写了一半的行，忽略
+                    continue
+
+    def is_done(self, input_path, params, output_path=None):
+        """上次已成功处理、输入内容和参数都没变、输出文件仍在时返回 True"""
+        entry = self.entries.get(self._key(input_path))
+        if entry is None or entry.get("status") != "ok":
+            return False
+        if entry.get("params") != _normalize(params):
+            return False
+        if output_path is not None and not os.path.exists(output_path):
+            return False
+        try:
+            st = os.stat(input_path)
+        except OSError:
+            return False
+        if entry.get("size") != st.st_size:
+            return False
+        if entry.get("mtime_ns") == st.st_mtime_ns:
+            return True
+        # 修改时间变了 (例如重新复制过)，内容一样也算没变
+        return entry.get("hash") == file_digest(input_path)
+
+    def record(self, input_path, params, ok, output_path=None, error=None, digest=None, stats=None):
+        """
+        追加一条处理结果。digest 为已算好的输入哈希 (例如查结果缓存时算的)，不给时在这里计算，
+        读文件的字节数计入 stats。
+        """
+        try:
+            st = os.stat(input_path)
+            size, mtime_ns = st.st_size, st.st_mtime_ns
+            if digest is None:
+                digest = file_digest(input_path, stats=stats)
+        except OSError:
+            size = mtime_ns = digest = None
+        entry = {
+            "input": os.path.abspath(input_path),
+            "output": os.path.abspath(output_path) if output_path else None,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "hash": digest,
+            "params": _normalize(params),
+            "status": "ok" if ok else "failed",
+            "error": None if error is None else str(error),
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.entries[self._key(input_path)] = entry
+
+    def pending(self, jobs, params):
+        """
+        从 jobs 中去掉已完成的任务。jobs 的每一项以 (输入路径, 输出路径, ...) 开头。
+        返回 (待处理的 jobs, 跳过的数量)。
+        """
+        todo = [job for job in jobs if not self.is_done(job[0], params, job[1])]
+        return todo, len(jobs) - len(todo)
@@ -0,0 +1,257 @@
+"""多步处理流水线：每页只解码一次、编码一次，中间结果以数组在各步骤之间传递。
+
+流水线定义可以是 Python 列表/字典，也可以是 JSON 或 YAML 文件，例如::
+
+    {
+        "output_ext": ".png",
+        "stages": [
+            {"op": "straighten", "tolerance": 30},
+            {"op": "crop", "top": 50, "bottom": 50, "left": 40, "right": 40},
+            {"op": "chroma", "r_scale": 0.9995, "b_scale": 1.0005},
+            {"op": "denoise", "strength": 10, "white": 85, "workers": 3},
+            {"op": "binarize", "threshold": -1}
+        ]
+    }
+
+读取、每个步骤、写出各占一个线程（步骤可用 workers 指定多个线程），
+之间用有界队列连接，不同页面同时处在不同步骤上。OpenCV 的计算会释放 GIL，
+所以各步骤可以真正并行。
+"""
+import inspect
+import json
+import os
+import queue
+import threading
+from functools import lru_cache
+
+import cv2
+
+from .chromatic import correct_aberration_image, correct_radial_image, load_profile
+from .crop import crop_image
+from .denoise import denoise_image
+from .imgio import imread, imwrite
+from .straighten import straighten_page
+from .threshold import apply_threshold, binarize_lut, whiten_lut, local_threshold, bilevel_params
+
+
+def _stage_straighten(img, background=None, tolerance=30):
+    return straighten_page(img, background, tolerance)
+
+
+def _stage_crop(img, top=0, bottom=0, left=0, right=0, scale=1.0):
+    return crop_image(img, top, bottom, left, right, scale)
+
+
+@lru_cache(maxsize=None)
+def _load_chroma_profile(path):
+    return load_profile(path)
+
+
+def _stage_chroma(img, r_scale=0.9995, b_scale=1.0005, profile=None):
+    # 指定了 chroma-estimate 生成的配置文件时按径向模型校正
+    if profile:
+        return correct_radial_image(img, *_load_chroma_profile(profile))
+    return correct_aberration_image(img, r_scale, b_scale)
+
+
+def _stage_denoise(img, strength=10, white=85):
+    return denoise_image(img, strength, white)
+
+
+def _stage_binarize(img, threshold=-1, method="global", block_size=31, c=10, k=0.2):
+    if method == "global":
+        return apply_threshold(img, threshold, binarize_lut)
+    return local_threshold(img, method, block_size, c, k)
+
+
+def _stage_whiten(img, threshold=240):
+    return apply_threshold(img, threshold, whiten_lut)
+
+
+# 操作名 -> (函数, 需要的输入: "color" 为 BGR 三通道，"gray" 为灰度，"any" 都可以)
+STAGES = {
+    "straighten": (_stage_straighten, "color"),
+    "crop": (_stage_crop, "any"),
+    "chroma": (_stage_chroma, "color"),
+    "denoise": (_stage_denoise, "gray"),
+    "binarize": (_stage_binarize, "gray"),
+    "whiten": (_stage_whiten, "gray"),
+}
+
+_DONE = object()
+
+
+class Stage:
+    """流水线中的一步，apply 负责按需转换颜色后调用处理函数"""
+
+    def __init__(self, op, params=None, workers=1):
+        if op not in STAGES:
+            raise ValueError(f"未知的处理步骤: {op} (可用: {', '.join(STAGES)})")
+        self.op = op
+        self.func, self.needs = STAGES[op]
+        self.params = dict(params or {})
+        self.workers = max(1, int(workers))
+        try:
+            inspect.signature(self.func).bind(None, **self.params)
+        except TypeError as e:
+            raise ValueError(f"步骤 {op} 的参数有误: {e}")
+
+    def apply(self, img):
+        if self.needs == "gray" and img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        elif self.needs == "color" and img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        return self.func(img, **self.params)
+
+    def __repr__(self):
+        return f"Stage({self.op!r}, {self.params!r}, workers={self.workers})"
+
+
+def parse_definition(definition):
+    """
+    把定义转换为 (stages, output_ext)。definition 可以是步骤列表，
+    也可以是带 "stages" 和可选 "output_ext" 的字典。每个步骤为 {"op": ..., 参数...}。
+    """
+    if isinstance(definition, dict):
+        steps = definition.get("stages", [])
+        output_ext = definition.get("output_ext")
+    else:
+        steps, output_ext = definition, None
+    if not steps:
+        raise ValueError("流水线中没有任何步骤")
+    stages = []
+    for step in steps:
+        step = dict(step)
+        op = step.pop("op", None)
+        workers = step.pop("workers", 1)
+        stages.append(Stage(op, step, workers))
+    if output_ext and not output_ext.startswith("."):
+        output_ext = "." + output_ext
+    return stages, output_ext
+
+
+def load_definition(path):
+    """读取 JSON 或 YAML (.yml/.yaml，需要安装 PyYAML) 格式的流水线定义"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if os.path.splitext(path)[1].lower() in ('.yml', '.yaml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("读取 YAML 格式的流水线需要安装 PyYAML: pip install pyyaml")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+
+class Pipeline:
+    """
+    按顺序执行多个步骤。process 处理单张已解码的图片；
+    run 对一批文件以生产者/消费者方式并行执行，每页只读一次、写一次。
+    """
+
+    def __init__(self, stages, output_ext=None, queue_size=4):
+        self.stages = list(stages)
+        self.output_ext = output_ext
+        self.queue_size = queue_size
+
+    @classmethod
+    def from_definition(cls, definition, **kwargs):
+        stages, output_ext = parse_definition(definition)
+        return cls(stages, output_ext, **kwargs)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        return cls.from_definition(load_definition(path), **kwargs)
+
+    def output_path_for(self, output_path):
+        """按 output_ext 替换输出文件的扩展名"""
+        if self.output_ext:
+            return os.path.splitext(output_path)[0] + self.output_ext
+        return output_path
+
+    def process(self, img):
+        for stage in self.stages:
+            img = stage.apply(img)
+        return img
+
+    def _read_flag(self):
+        # 第一步只需要灰度时直接解码为灰度，省去一次颜色转换
+        return cv2.IMREAD_GRAYSCALE if self.stages[0].needs == "gray" else cv2.IMREAD_COLOR
+
+    def _encode_params(self, output_path):
+        if self.stages[-1].op == "binarize":
+            return bilevel_params(output_path)
+        return None
+
+    def run(self, jobs, stats=None, cancel_event=None):
+        """
+        jobs 为 (输入路径, 输出路径) 列表。按完成顺序产出 (输入路径, 输出路径, error)，
+        成功时 error 为 None。cancel_event 被设置后不再读入新页面，已读入的页面会处理完。
+        """
+        jobs = list(jobs)
+        if not jobs:
+            return
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+        results = queue.Queue()
+        read_flag = self._read_flag()
+
+        def reader():
+            for input_path, output_path in jobs:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                try:
+                    img = imread(input_path, read_flag, stats=stats)
+                    error = None if img is not None else IOError(f"无法解码文件: {os.path.basename(input_path)}")
+                except Exception as e:
+                    img, error = None, e
+                queues[0].put((input_path, output_path, img, error))
+            queues[0].put(_DONE)
+
+        def stage_worker(stage, in_q, out_q, remaining, lock):
+            while True:
+                item = in_q.get()
+                if item is _DONE:
+                    # 放回去让同一步骤的其他线程也能结束，最后一个线程通知下一步
+                    in_q.put(_DONE)
+                    with lock:
+                        remaining[0] -= 1
+                        last = remaining[0] == 0
+                    if last:
+                        out_q.put(_DONE)
+                    return
+                input_path, output_path, img, error = item
+                if error is None:
+                    try:
+                        img = stage.apply(img)
+                    except Exception as e:
+                        img, error = None, e
+                out_q.put((input_path, output_path, img, error))
+
+        def writer():
+            while True:
+                item = queues[-1].get()
+                if item is _DONE:
+                    results.put(_DONE)
+                    return
+                input_path, output_path, img, error = item
+                if error is None:
+                    try:
+                        imwrite(output_path, img, self._encode_params(output_path), stats=stats)
+                    except Exception as e:
+                        error = e
+                results.put((input_path, output_path, error))
+
+        threads = [threading.Thread(target=reader, daemon=True), threading.Thread(target=writer, daemon=True)]
+        for stage, in_q, out_q in zip(self.stages, queues, queues[1:]):
+            remaining, lock = [stage.workers], threading.Lock()
+            threads.extend(threading.Thread(target=stage_worker, args=(stage, in_q, out_q, remaining, lock), daemon=True)
+                           for _ in range(stage.workers))
+        for t in threads:
+            t.start()
+
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            yield item
+        for t in threads:
+            t.join()
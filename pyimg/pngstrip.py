@@ -0,0 +1,117 @@
+"""
+逐行写入 PNG 的简易编码器。
+
+OpenCV 的 imencode 需要整张图在内存中，且单边不能超过 65500 像素。
+拼长图时用这里的 PngStripWriter 一段一段地写入像素行，
+内存中只需保留当前这一段，输出高度只受 PNG 格式本身 (2^31-1) 限制。
+"""
+import os
+import struct
+import zlib
+
+import numpy as np
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_IDAT_FLUSH_SIZE = 1 << 20  # 压缩数据攒够 1MB 写一个 IDAT 块
+_FILTER_UP = 2
+
+
+def _chunk(chunk_type, data):
+    return (struct.pack(">I", len(data)) + chunk_type + data
+            + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF))
+
+
+class PngStripWriter:
+    """
+    按从上到下的顺序写入 8 位 RGB / 灰度 PNG。
+
+        with PngStripWriter(path, width, height) as writer:
+            writer.write_rows(rows)  # rows: (n, width, 3) BGR 或 (n, width) 灰度
+
+    写入的总行数必须等于 height。每行使用 PNG 的 Up 滤波，
+    漫画这类大面积纯色的图像压缩率接近 OpenCV 的默认设置。
+    """
+
+    def __init__(self, path, width, height, channels=3, compression=6, stats=None):
+        if channels not in (1, 3):
+            raise ValueError("channels 只能是 1 (灰度) 或 3 (BGR)")
+        self.path = path
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.stats = stats
+        self.rows_written = 0
+        self._compressor = zlib.compressobj(compression)
+        self._pending = []
+        self._pending_size = 0
+        self._prev_row = np.zeros(width * channels, dtype=np.uint8)
+        self._bytes_written = 0
+
+        self._file = open(path, 'wb')
+        color_type = 2 if channels == 3 else 0
+        ihdr = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+        self._write(PNG_SIGNATURE + _chunk(b'IHDR', ihdr))
+
+    def _write(self, data):
+        self._file.write(data)
+        self._bytes_written += len(data)
+
+    def _flush_idat(self, data):
+        self._pending.append(data)
+        self._pending_size += len(data)
+        if self._pending_size >= _IDAT_FLUSH_SIZE:
+            self._write(_chunk(b'IDAT', b''.join(self._pending)))
+            self._pending = []
+            self._pending_size = 0
+
+    def write_rows(self, rows):
+        """写入若干行像素，rows 的宽度和通道数必须与构造时一致"""
+        n = rows.shape[0]
+        if n == 0:
+            return
+        if self.rows_written + n > self.height:
+            raise ValueError(f"写入的行数超过了声明的高度 {self.height}")
+        if self.channels == 3:
+            rows = rows[:, :, ::-1]  # BGR -> RGB
+        flat = np.ascontiguousarray(rows, dtype=np.uint8).reshape(n, self.width * self.channels)
+        if flat.shape[1] != self.width * self.channels:
+            raise ValueError("行宽度与声明的宽度不一致")
+
+        # Up 滤波：每行减去上一行 (uint8 运算自然按 256 取模，正是 PNG 要求的)
+        filtered = np.empty((n, flat.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = _FILTER_UP
+        np.subtract(flat[0], self._prev_row, out=filtered[0, 1:])
+        np.subtract(flat[1:], flat[:-1], out=filtered[1:, 1:])
+        self._prev_row = flat[-1].copy()
+
+        self._flush_idat(self._compressor.compress(filtered.tobytes()))
+        self.rows_written += n
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"只写入了 {self.rows_written}/{self.height} 行")
+            self._pending.append(self._compressor.flush())
+            self._write(_chunk(b'IDAT', b''.join(self._pending)))
+            self._write(_chunk(b'IEND', b''))
+        finally:
+            self._file.close()
+            self._file = None
+        if self.stats is not None:
+            self.stats.files_written += 1
+            self.stats.bytes_written += self._bytes_written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._file is not None:
+            # 出错时删除写了一半的文件
+            self._file.close()
+            self._file = None
+            os.remove(self.path)
+        return False
@@ -0,0 +1,104 @@
+"""界面预览用的视口渲染：只处理画布上看得见的那一块，耗时与画布大小有关，与原图大小无关。"""
+import math
+
+import cv2
+import numpy as np
+
+from .chromatic import ChannelShifter
+from .pyramid import visible_rect, display_rect
+
+
+def _margin(offsets):
+    return math.ceil(max([abs(v) for xy in offsets.values() for v in xy] + [0])) + 1
+
+
+def _padded_crop(img, rect, margin):
+    # 取 rect 四周多 margin 像素的区域，超出原图的部分补 0
+    x0, y0, x1, y1 = rect
+    img_h, img_w = img.shape[:2]
+    sx0, sy0 = max(0, x0 - margin), max(0, y0 - margin)
+    sx1, sy1 = min(img_w, x1 + margin), min(img_h, y1 + margin)
+    return cv2.copyMakeBorder(img[sy0:sy1, sx0:sx1],
+                              sy0 - (y0 - margin), (y1 + margin) - sy1,
+                              sx0 - (x0 - margin), (x1 + margin) - sx1,
+                              cv2.BORDER_CONSTANT, value=0)
+
+
+def _clear_outside(region, img, offsets, rect):
+    # 整图做小数平移时，插值结果按整数部分 (ix, iy) 搬过去，搬出原图的那几行、几列整体填 0；
+    # 局部区域的插值核却能读到补边后的像素，在原图边缘会多出一行/列非 0 值，这里同样清掉
+    x0, y0, x1, y1 = rect
+    img_h, img_w = img.shape[:2]
+    for index, name in enumerate("bgr"):
+        dx, dy = offsets.get(name, (0, 0))
+        if float(dx).is_integer() and float(dy).is_integer():
+            continue
+        ix, iy = math.floor(dx), math.floor(dy)
+        region[:, :max(0, ix - x0), index] = 0
+        region[:, max(0, img_w + ix - x0):, index] = 0
+        region[:max(0, iy - y0), :, index] = 0
+        region[max(0, img_h + iy - y0):, :, index] = 0
+
+
+def shifted_region(img, offsets, rect, shifter=None):
+    """
+    只对 rect = (x0, y0, x1, y1) 区域做通道平移，结果与整张图平移后再裁剪相同。
+    区域四周多取偏移量那么宽的边，超出原图的部分补 0，与整图平移时空出的边缘一致。
+    返回的是 shifter 内部缓冲区的一部分，下一次平移会覆盖它。
+    """
+    x0, y0, x1, y1 = rect
+    offsets = offsets or {}
+    margin = _margin(offsets)
+    shifted = (shifter or ChannelShifter()).apply(_padded_crop(img, rect, margin), offsets)
+    region = shifted[margin:margin + y1 - y0, margin:margin + x1 - x0]
+    _clear_outside(region, img, offsets, rect)
+    return region
+
+
+def render_view(img, offsets, view_x, view_y, zoom, width, height, shifter=None, interpolation=None, pyramid=None):
+    """
+    渲染 width x height 画布的可见部分，返回 (BGR 数组, (画布 x, 画布 y))，
+    数组应贴在画布的这个位置；完全不可见时返回 None。
+    放大时先裁出可见区域、平移通道再放大；缩小时先把可见区域缩小，再按 zoom 缩小后的偏移量平移，
+    两种情况下平移的像素数都不超过画布大小。传入 img 的 ImagePyramid 时，缩小显示改从最接近的一层取样。
+    interpolation 默认放大时用最近邻 (便于看清像素)，缩小时用 INTER_LINEAR。
+    """
+    offsets = offsets or {}
+    if pyramid is not None and zoom < 1:
+        img, scale = pyramid.level_for(zoom)
+        zoom /= scale
+        view_x *= scale
+        view_y *= scale
+        offsets = {name: (dx * scale, dy * scale) for name, (dx, dy) in offsets.items()}
+    rect = visible_rect((img.shape[1], img.shape[0]), view_x, view_y, zoom, width, height)
+    if rect is None:
+        return None
+    x0, y0, x1, y1 = rect
+    shifter = shifter or ChannelShifter()
+    dest_x, dest_y, size_w, size_h = display_rect(rect, view_x, view_y, zoom)
+    if interpolation is None:
+        interpolation = cv2.INTER_NEAREST if zoom >= 1 else cv2.INTER_LINEAR
+
+    if zoom >= 1:
+        region = shifted_region(img, offsets, rect, shifter)
+        if (size_w, size_h) != (x1 - x0, y1 - y0):
+            region = cv2.resize(region, (size_w, size_h), interpolation=interpolation)
+        return np.ascontiguousarray(region), (dest_x, dest_y)
+
+    # 先缩小 (不拷贝原图)，再在小图上补边，补边宽度按 zoom 缩小
+    margin = _margin(offsets)
+    img_h, img_w = img.shape[:2]
+    sx0, sy0 = max(0, x0 - margin), max(0, y0 - margin)
+    sx1, sy1 = min(img_w, x1 + margin), min(img_h, y1 + margin)
+    small = cv2.resize(img[sy0:sy1, sx0:sx1], (max(1, round((sx1 - sx0) * zoom)), max(1, round((sy1 - sy0) * zoom))),
+                       interpolation=interpolation)
+    scaled_margin = round(margin * zoom)
+    left = round((sx0 - (x0 - margin)) * zoom)
+    top = round((sy0 - (y0 - margin)) * zoom)
+    right = max(0, 2 * scaled_margin + size_w - left - small.shape[1])
+    bottom = max(0, 2 * scaled_margin + size_h - top - small.shape[0])
+    small = cv2.copyMakeBorder(small, top, bottom, left, right, cv2.BORDER_CONSTANT, value=0)
+    scaled_offsets = {name: (dx * zoom, dy * zoom) for name, (dx, dy) in offsets.items()}
+    region = shifter.apply(small, scaled_offsets)
+    region = region[scaled_margin:scaled_margin + size_h, scaled_margin:scaled_margin + size_w]
+    return np.ascontiguousarray(region), (dest_x, dest_y)
@@ -0,0 +1,141 @@
+"""界面预览用的图像金字塔 (mipmap)。
+
+载入图片时一次性生成 1、1/2、1/4 … 各层，缩放显示时取不小于目标比例的最近一层再缩放，
+不必每次都从原图缩放；再配合只渲染可见区域，缩放、平移的耗时只与画布大小有关。
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+
+
+def visible_rect(image_size, view_x, view_y, zoom, width, height):
+    """
+    画布左上角对应原图坐标 (view_x, view_y)，每个原图像素显示为 zoom 个画布像素时，
+    返回原图中可见的整数区域 (x0, y0, x1, y1)，完全不可见时返回 None。
+    """
+    img_w, img_h = image_size
+    x0 = max(0, math.floor(view_x))
+    y0 = max(0, math.floor(view_y))
+    x1 = min(img_w, math.ceil(view_x + width / zoom))
+    y1 = min(img_h, math.ceil(view_y + height / zoom))
+    if x1 <= x0 or y1 <= y0:
+        return None
+    return x0, y0, x1, y1
+
+
+def display_rect(rect, view_x, view_y, zoom):
+    """可见区域 rect 在画布上的位置和尺寸 (x, y, 宽, 高)，与 visible_rect 配合使用"""
+    x0, y0, x1, y1 = rect
+    dest_x = round((x0 - view_x) * zoom)
+    dest_y = round((y0 - view_y) * zoom)
+    return (dest_x, dest_y,
+            max(1, round((x1 - view_x) * zoom) - dest_x), max(1, round((y1 - view_y) * zoom) - dest_y))
+
+
+class ImagePyramid:
+    """
+    一张图的各级缩小版本。levels[0] 为原图 (不复制)，之后每层用 pyrDown 缩小一半，
+    直到短边小于 min_size。
+    """
+
+    def __init__(self, image, min_size=256):
+        self.levels = [image]
+        while min(self.levels[-1].shape[:2]) // 2 >= min_size:
+            self.levels.append(cv2.pyrDown(self.levels[-1]))
+
+    @property
+    def size(self):
+        """原图尺寸 (宽, 高)"""
+        return self.levels[0].shape[1], self.levels[0].shape[0]
+
+    def level_for(self, zoom):
+        """返回 (该层图像, 该层相对原图的比例)，取比例不小于 zoom 的最小一层"""
+        width = self.levels[0].shape[1]
+        for level in reversed(self.levels):
+            scale = level.shape[1] / width
+            if scale >= zoom:
+                return level, scale
+        return self.levels[0], 1.0
+
+    def resize(self, size, interpolation=cv2.INTER_AREA):
+        """把整张图缩放到 size = (宽, 高)，从最接近的一层取样"""
+        level, _ = self.level_for(max(size[0] / self.size[0], size[1] / self.size[1]))
+        if (level.shape[1], level.shape[0]) == tuple(size):
+            return level
+        return cv2.resize(level, tuple(size), interpolation=interpolation)
+
+    def render(self, view_x, view_y, zoom, width, height, interpolation=None):
+        """
+        渲染 width x height 画布的可见部分，view_x / view_y 为画布左上角对应的原图坐标。
+        返回 (数组, (画布 x, 画布 y))，完全不可见时返回 None。
+        interpolation 默认放大时用最近邻；缩小时用 INTER_LINEAR，取的层与目标比例相差不到一半，
+        层本身已经过 pyrDown 平滑，双线性足够，比 INTER_AREA 的非整数倍缩小快得多。
+        """
+        level, scale = self.level_for(zoom)
+        zoom /= scale
+        view_x *= scale
+        view_y *= scale
+        rect = visible_rect((level.shape[1], level.shape[0]), view_x, view_y, zoom, width, height)
+        if rect is None:
+            return None
+        x0, y0, x1, y1 = rect
+        dest_x, dest_y, size_w, size_h = display_rect(rect, view_x, view_y, zoom)
+        region = level[y0:y1, x0:x1]
+        if (size_w, size_h) != (x1 - x0, y1 - y0):
+            if interpolation is None:
+                interpolation = cv2.INTER_NEAREST if zoom >= 1 else cv2.INTER_LINEAR
+            region = cv2.resize(region, (size_w, size_h), interpolation=interpolation)
+        return region, (dest_x, dest_y)
+
+
+class PyramidCache:
+    """
+    按 key (通常为文件路径) 保存最近用过的几张图的金字塔，切回看过的图时不必重建。
+    key 是存在的文件时同时记下它的修改时间和大小，文件被改写 (例如输出到了同一个文件夹) 后重新生成。
+    可以在后台预读线程中调用，生成金字塔时不持有锁。
+    """
+
+    def __init__(self, max_items=4, min_size=256):
+        self.max_items = max_items
+        self.min_size = min_size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(key):
+        # 在读图之前取：读的过程中文件又被改写时，下次 get 会再生成一次，不会一直用旧图
+        try:
+            st = os.stat(key)
+        except (OSError, TypeError, ValueError):
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, key, image):
+        """
+        取出 key 对应的金字塔，没有或文件已改变时用 image 生成。
+        image 也可以是返回图像的函数，只在需要时调用。
+        """
+        signature = self._signature(key)
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] == signature:
+                self._items.move_to_end(key)
+                return item[1]
+        pyramid = ImagePyramid(image() if callable(image) else image, self.min_size)
+        with self._lock:
+            self._items[key] = (signature, pyramid)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+        return pyramid
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+# 各个界面共用的缓存
+pyramid_cache = PyramidCache()
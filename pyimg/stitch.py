@@ -0,0 +1,299 @@
+"""Stitch a folder of pages into long strips (拼长图)."""
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .imgio import imread, imwrite
+from .pngstrip import PngStripWriter
+
+# OpenCV's imencode refuses images larger than this on either side
+MAX_ENCODE_DIM = 65500
+
+EXIF_ORIENTATION = 0x0112
+# Orientations that rotate by 90 degrees; cv2.imdecode applies them, so width and height swap
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def probe_size(path):
+    """
+    Reads the (height, width) of an image from its header without decoding
+    any pixels, as cv2.IMREAD_COLOR would return it (EXIF rotation applied).
+    Returns None if Pillow cannot parse the header.
+    """
+    try:
+        with Image.open(path) as im:
+            width, height = im.size
+            if im.format == "PNG":
+                # PngImageFile.getexif() decodes the whole image, only look at chunks before IDAT
+                exif = Image.Exif()
+                if "exif" in im.info:
+                    exif.load(im.info["exif"])
+            else:
+                exif = im.getexif()
+            orientation = exif.get(EXIF_ORIENTATION, 1)
+    except Exception:
+        return None
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return height, width
+
+
+def _fitted_shape(size, direction, max_dim):
+    """Shape (h, w) of an image of the given size once resized to max_dim across the strip."""
+    h, w = size
+    if direction == "vertical":
+        return int(h * (max_dim / w)), max_dim
+    return max_dim, int(w * (max_dim / h))
+
+
+def _plan_strip(image_paths, direction, stats=None):
+    """
+    Probe pass shared by all stitch modes. Returns (shapes, max_dim, total_length)
+    where shapes is [(path, (h, w))] with each image's size after resizing,
+    or None if no image could be read. Files Pillow cannot parse are decoded
+    once as a fallback.
+    """
+    if direction not in ("vertical", "horizontal"):
+        raise ValueError("Direction must be 'vertical' or 'horizontal'.")
+
+    sizes = []
+    for path in image_paths:
+        size = probe_size(path)
+        if size is None:
+            img = imread(path, cv2.IMREAD_COLOR, stats=stats)
+            if img is None:
+                print(f"Warning: Could not read image '{path}'. Skipping.")
+                continue
+            size = img.shape[:2]
+        sizes.append((path, size))
+
+    if not sizes:
+        return None
+
+    # Max width for vertical stacking, max height for horizontal stacking
+    axis = 1 if direction == "vertical" else 0
+    max_dim = max(size[axis] for _, size in sizes)
+    shapes = [(path, _fitted_shape(size, direction, max_dim)) for path, size in sizes]
+    total_length = sum(shape[1 - axis] for _, shape in shapes)
+    return shapes, max_dim, total_length
+
+
+def measure_strip(image_paths, direction="vertical"):
+    """
+    Returns the exact (width, height) of the strip stitch_images would produce,
+    reading only file headers, or None if no image could be read.
+    """
+    plan = _plan_strip(image_paths, direction)
+    if plan is None:
+        return None
+    _, max_dim, total_length = plan
+    if direction == "vertical":
+        return max_dim, total_length
+    return total_length, max_dim
+
+
+def _load_fitted(path, shape, stats=None):
+    """Decodes one image and resizes it to the planned shape. Returns None if unreadable."""
+    img = imread(path, cv2.IMREAD_COLOR, stats=stats)
+    if img is None:
+        return None
+    if img.shape[:2] != shape:
+        img = cv2.resize(img, (shape[1], shape[0]), interpolation=cv2.INTER_AREA)
+    return img
+
+
+def stitch_images(image_paths, direction="vertical", stats=None):
+    """
+    Stitches multiple images either vertically or horizontally.
+    Adjusts dimensions to match for seamless stitching.
+    Returns the stitched image as a NumPy array.
+
+    Sizes are probed from the file headers first, so the output is allocated
+    once and every image is decoded just in time and copied straight into it.
+
+    Args:
+        image_paths (list): A list of paths to the images to be stitched.
+        direction (str): "vertical" for vertical stitching, "horizontal" for horizontal.
+                         Defaults to "vertical".
+        stats (IOStats): Optional, accumulates bytes read.
+    """
+    if not image_paths:
+        return None
+
+    plan = _plan_strip(image_paths, direction, stats=stats)
+    if plan is None:
+        return None
+    shapes, max_dim, total_length = plan
+
+    if total_length > MAX_ENCODE_DIM:
+        side = "height" if direction == "vertical" else "width"
+        print(f"Warning: Total {side} {total_length} pixels exceeds the {MAX_ENCODE_DIM} pixel limit for saving; "
+              f"use smaller batches or streamed output.")
+
+    if direction == "vertical":
+        stitched_image = np.empty((total_length, max_dim, 3), dtype=np.uint8)
+    else:
+        stitched_image = np.empty((max_dim, total_length, 3), dtype=np.uint8)
+
+    offset = 0
+    for path, shape in shapes:
+        img = _load_fitted(path, shape, stats=stats)
+        if img is None:
+            print(f"Warning: Could not read image '{path}'. Skipping.")
+            continue
+        if direction == "vertical":
+            stitched_image[offset:offset + shape[0]] = img
+            offset += shape[0]
+        else:
+            stitched_image[:, offset:offset + shape[1]] = img
+            offset += shape[1]
+
+    if offset == 0:
+        return None
+    if offset < total_length:
+        # Some image failed to decode after probing; drop the unused tail
+        if direction == "vertical":
+            stitched_image = stitched_image[:offset]
+        else:
+            stitched_image = np.ascontiguousarray(stitched_image[:, :offset])
+    return stitched_image
+
+
+class TileWriter:
+    """
+    Writes a strip as sequentially numbered tiles: <name>_001<ext>, <name>_002<ext>, ...
+    Every tile is tile_size pixels long along the stitching axis (the last one
+    may be shorter), so only one tile buffer is ever held in memory.
+    """
+
+    def __init__(self, output_path, cross_dim, tile_size, direction="vertical", stats=None):
+        if not 0 < tile_size <= MAX_ENCODE_DIM:
+            raise ValueError(f"Tile size must be between 1 and {MAX_ENCODE_DIM} pixels.")
+        self.base, self.ext = os.path.splitext(output_path)
+        self.direction = direction
+        self.tile_size = tile_size
+        self.stats = stats
+        self.paths = []
+        # Horizontal strips are buffered transposed so both directions fill axis 0
+        self._buffer = np.empty((tile_size, cross_dim, 3), dtype=np.uint8)
+        self._filled = 0
+
+    def write(self, img):
+        """Appends an image that was already fitted to the cross dimension."""
+        if self.direction == "horizontal":
+            img = img.transpose(1, 0, 2)
+        offset = 0
+        while offset < img.shape[0]:
+            n = min(self.tile_size - self._filled, img.shape[0] - offset)
+            self._buffer[self._filled:self._filled + n] = img[offset:offset + n]
+            self._filled += n
+            offset += n
+            if self._filled == self.tile_size:
+                self._flush()
+
+    def _flush(self):
+        if self._filled == 0:
+            return
+        tile = self._buffer[:self._filled]
+        if self.direction == "horizontal":
+            tile = np.ascontiguousarray(tile.transpose(1, 0, 2))
+        path = f"{self.base}_{len(self.paths) + 1:03d}{self.ext}"
+        imwrite(path, tile, encode_params_for(self.ext), stats=self.stats)
+        self.paths.append(path)
+        self._filled = 0
+
+    def close(self):
+        self._flush()
+        return self.paths
+
+
+def stitch_streaming(image_paths, output_path, direction="vertical", tile_size=0, stats=None):
+    """
+    Stitches images without ever holding the whole strip in memory, so the
+    result is not limited by OpenCV's 65500 pixel encoder limit.
+
+    Sizes are probed from the file headers, then the images are decoded, resized and
+    written out one at a time. Peak memory is about one source image plus the
+    output row/tile buffer, no matter how long the strip is.
+
+    Args:
+        image_paths (list): Paths of the images to stitch.
+        output_path (str): With tile_size 0, a .png file written row by row
+                           (vertical only). Otherwise the base name of the tiles.
+        direction (str): "vertical" or "horizontal".
+        tile_size (int): 0 for a single streamed PNG, otherwise the tile length in pixels.
+        stats (IOStats): Optional, accumulates bytes read and written.
+
+    Returns the list of files written (empty if no image could be read).
+    """
+    if tile_size <= 0:
+        if direction != "vertical":
+            raise ValueError("Streamed PNG output only supports vertical stitching; use tiles for horizontal strips.")
+        if os.path.splitext(output_path)[1].lower() != ".png":
+            raise ValueError("Streamed output without tiles must be a .png file.")
+
+    plan = _plan_strip(image_paths, direction, stats=stats)
+    if plan is None:
+        return []
+    shapes, max_dim, total_length = plan
+
+    if tile_size > 0:
+        writer = TileWriter(output_path, max_dim, tile_size, direction, stats=stats)
+        for path, shape in shapes:
+            img = _load_fitted(path, shape, stats=stats)
+            if img is None:
+                print(f"Warning: Could not read image '{path}'. Skipping.")
+                continue
+            writer.write(img)
+        return writer.close()
+
+    with PngStripWriter(output_path, max_dim, total_length, stats=stats) as writer:
+        for path, shape in shapes:
+            img = _load_fitted(path, shape, stats=stats)
+            if img is None:
+                # The PNG header already promised these rows, the partial file is removed
+                raise IOError(f"Could not read image '{path}'")
+            writer.write_rows(img)
+    return [output_path]
+
+
+def encode_params_for(ext):
+    """Default encoder parameters for the output extension."""
+    ext = ext.lower()
+    if ext in ('.jpg', '.jpeg'):
+        return [int(cv2.IMWRITE_JPEG_QUALITY), 95]
+    if ext == '.png':
+        return [int(cv2.IMWRITE_PNG_COMPRESSION), 9]
+    return []
+
+
+def save_stitched(output_path, stitched_image, stats=None):
+    """
+    Saves a stitched image (robustly for non-ASCII paths).
+    Raises IOError if the image cannot be encoded.
+    """
+    output_ext = os.path.splitext(output_path)[1]
+    imwrite(output_path, stitched_image, encode_params_for(output_ext), stats=stats)
+
+
+def plan_batches(image_paths, batch_size, output_base_file):
+    """
+    Splits image_paths into batches and names the output file of each batch.
+    A batch_size of 0 (or one that covers everything) means a single batch
+    written to output_base_file; otherwise outputs are named <name>_partN<ext>.
+
+    Returns a list of (batch_image_paths, batch_output_file).
+    """
+    total_images = len(image_paths)
+    if batch_size <= 0 or batch_size >= total_images:
+        return [(image_paths, output_base_file)]
+
+    output_dir, output_name_ext = os.path.split(output_base_file)
+    output_name, output_ext = os.path.splitext(output_name_ext)
+    batches = [image_paths[i:i + batch_size] for i in range(0, total_images, batch_size)]
+    return [
+        (batch, os.path.join(output_dir, f"{output_name}_part{n}{output_ext}"))
+        for n, batch in enumerate(batches, start=1)
+    ]
@@ -0,0 +1,128 @@
+"""按背景色找出页面轮廓，旋转拉直并裁掉背景（图片拉直）。"""
+import cv2
+import numpy as np
+
+# 找轮廓时使用的工作图最大边长，保证速度
+WORK_MAX_SIZE = 1000
+
+
+def straighten_transform(image_shape, contour):
+    """
+    计算拉直用的仿射矩阵和输出尺寸 (宽, 高)，轮廓无效时尺寸为 (0, 0)。
+    只做几何计算，不碰像素，可以在界面线程中提前得到输出尺寸。
+    """
+    rect = cv2.minAreaRect(contour)
+    (cx, cy), (w, h), angle = rect
+
+    # 角度规范化，防止180度翻转
+    if angle < -45:
+        angle += 90
+        w, h = h, w
+    elif angle > 45:
+        angle -= 90
+        w, h = h, w
+
+    (h_img, w_img) = image_shape[:2]
+    center = (w_img // 2, h_img // 2)
+    M = cv2.getRotationMatrix2D(center, angle, 1.0)
+
+    contour_points = contour.reshape(-1, 1, 2).astype(np.float32)
+    rotated_contour_points = cv2.transform(contour_points, M)
+
+    x, y, w_crop, h_crop = cv2.boundingRect(rotated_contour_points)
+
+    if w_crop <= 0 or h_crop <= 0:
+        return M, (0, 0)
+
+    M[0, 2] -= x
+    M[1, 2] -= y
+    return M, (w_crop, h_crop)
+
+
+def straightened_size(image_shape, contour):
+    """straighten_and_crop 输出图像的尺寸 (宽, 高)"""
+    _, size = straighten_transform(image_shape, contour)
+    return size if size != (0, 0) else (10, 10)
+
+
+def straighten_and_crop(image_cv, contour):
+    """
+    根据轮廓旋转图像（微调 +/- 45度），防止翻转。
+    """
+    M, (w_crop, h_crop) = straighten_transform(image_cv.shape, contour)
+
+    if w_crop <= 0 or h_crop <= 0:
+        return np.full((10, 10, 3), 255, dtype=np.uint8)
+
+    final_image = cv2.warpAffine(
+        image_cv, M, (w_crop, h_crop),
+        flags=cv2.INTER_CUBIC,
+        borderMode=cv2.BORDER_CONSTANT,
+        borderValue=(255, 255, 255)
+    )
+
+    return final_image
+
+
+def corner_background(image_cv, patch=10):
+    """取四个角 patch x patch 区域的中位数作为背景色，返回 RGB"""
+    h, w = image_cv.shape[:2]
+    corners = np.concatenate([
+        image_cv[:patch, :patch].reshape(-1, 3), image_cv[:patch, w - patch:].reshape(-1, 3),
+        image_cv[h - patch:, :patch].reshape(-1, 3), image_cv[h - patch:, w - patch:].reshape(-1, 3),
+    ])
+    b, g, r = np.median(corners, axis=0).astype(int)
+    return int(r), int(g), int(b)
+
+
+def color_distance(image_cv, color_bgr):
+    """
+    每个像素与 color_bgr 在各通道上差值的最大值 (uint8 单通道图)。
+    距离不超过 tolerance 与 inRange(color - tolerance, color + tolerance) 完全等价，
+    所以同一个颜色换容差时只需对这张图做一次阈值。
+    """
+    diff = cv2.absdiff(image_cv, (*[int(c) for c in color_bgr], 0))
+    b, g, r = cv2.split(diff)
+    return cv2.max(cv2.max(b, g), r)
+
+
+def largest_region(distance, tolerance, min_area=50):
+    """distance 中大于 tolerance (与背景色不同) 的最大区域的轮廓，没有或面积太小时返回 None"""
+    _, mask_inv = cv2.threshold(distance, tolerance, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(mask_inv, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(largest) < min_area:
+        return None
+    return largest
+
+
+def find_page_contour(image_cv, background_rgb, tolerance=30, work_max=WORK_MAX_SIZE):
+    """
+    在缩小的工作图上找出与背景色差别超过 tolerance 的最大区域，
+    返回原图坐标下的轮廓，找不到时返回 None。
+    """
+    h, w = image_cv.shape[:2]
+    work_scale = min(1.0, work_max / max(w, h))
+    img_work = cv2.resize(image_cv, (int(w * work_scale), int(h * work_scale)))
+
+    # OpenCV 需要 BGR
+    largest = largest_region(color_distance(img_work, background_rgb[::-1]), tolerance)
+    if largest is None:
+        return None
+    # 将轮廓坐标从 work 尺寸映射回 orig 尺寸
+    return (largest / work_scale).astype(np.int32)
+
+
+def straighten_page(image_cv, background=None, tolerance=30):
+    """
+    自动拉直一页：background 为 RGB 背景色，None 时取四角的颜色。
+    找不到页面轮廓时原样返回。
+    """
+    if background is None:
+        background = corner_background(image_cv)
+    contour = find_page_contour(image_cv, tuple(background), tolerance)
+    if contour is None:
+        return image_cv
+    return straighten_and_crop(image_cv, contour)
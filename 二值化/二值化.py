@@ -1,24 +1,49 @@
 import os
+import sys
+import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import tkinter.ttk as ttk # 导入 ttk 模块
-from PIL import Image
-import cv2 # 导入OpenCV库
-import numpy as np # OpenCV依赖Numpy
+
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.threshold import binarize_file
+from pyimg.imgio import IOStats
+from pyimg.batch import imap_ordered, call_with_stats
+from pyimg.cache import ResultCache
 
 class ImageBinarizerApp:
     """
     一个通过Tkinter GUI对图片进行二值化处理的应用程序。
     支持手动阈值和Otsu's自动阈值，并修复了中文路径问题。
+    光照不均的扫描页可以选择自适应均值、自适应高斯或 Sauvola 局部阈值。
     """
+    # 界面显示的名称 -> binarize_file 的 method 参数
+    METHODS = {
+        "全局阈值 (手动/Otsu)": "global",
+        "自适应均值": "mean",
+        "自适应高斯": "gaussian",
+        "Sauvola 局部阈值": "sauvola",
+    }
+
     def __init__(self, root):
         self.root = root
         self.root.title("图片二值化工具")
-        self.root.geometry("600x280") # 调整窗口大小以容纳进度条
+        self.root.geometry("600x360") # 调整窗口大小以容纳进度条和局部阈值参数
 
         self.source_dir = tk.StringVar()
         self.dest_dir = tk.StringVar()
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        # 处理在后台线程池中进行，线程数跟随 CPU 核数
+        self.workers = os.cpu_count() or 1
+        self.use_cache = tk.BooleanVar(value=True)
         self.threshold_val = tk.StringVar(value='-1')
+        self.method_val = tk.StringVar(value="全局阈值 (手动/Otsu)")
+        self.block_size_val = tk.StringVar(value='31')
+        self.c_val = tk.StringVar(value='10')
+        self.k_val = tk.StringVar(value='0.2')
 
         self.create_widgets()
 
@@ -37,12 +62,30 @@ class ImageBinarizerApp:
         tk.Label(main_frame, text="阈值 (-1 为 Otsu 自动阈值):").grid(row=2, column=0, sticky="w", pady=5)
         tk.Entry(main_frame, textvariable=self.threshold_val, width=10).grid(row=2, column=1, sticky="w", padx=5)
 
-        process_button = tk.Button(main_frame, text="开始处理", command=self.process_images, bg="#4CAF50", fg="white")
-        process_button.grid(row=3, column=1, pady=15, sticky="ew") # 调整pady
+        # 局部阈值：窗口大小对所有局部方式有效，C 用于均值/高斯，k 用于 Sauvola
+        tk.Label(main_frame, text="阈值方式:").grid(row=3, column=0, sticky="w", pady=5)
+        ttk.Combobox(main_frame, textvariable=self.method_val, values=list(self.METHODS), state="readonly", width=22).grid(row=3, column=1, sticky="w", padx=5)
+
+        local_frame = tk.Frame(main_frame)
+        local_frame.grid(row=4, column=1, columnspan=2, sticky="w", padx=5)
+        tk.Label(main_frame, text="局部阈值参数:").grid(row=4, column=0, sticky="w", pady=5)
+        tk.Label(local_frame, text="窗口(奇数)").pack(side=tk.LEFT)
+        tk.Entry(local_frame, textvariable=self.block_size_val, width=6).pack(side=tk.LEFT, padx=(2, 10))
+        tk.Label(local_frame, text="C").pack(side=tk.LEFT)
+        tk.Entry(local_frame, textvariable=self.c_val, width=6).pack(side=tk.LEFT, padx=(2, 10))
+        tk.Label(local_frame, text="Sauvola k").pack(side=tk.LEFT)
+        tk.Entry(local_frame, textvariable=self.k_val, width=6).pack(side=tk.LEFT, padx=2)
+
+        self.process_button = tk.Button(main_frame, text="开始处理", command=self.process_images, bg="#4CAF50", fg="white")
+        self.process_button.grid(row=5, column=1, pady=15, sticky="ew") # 调整pady
+
+        self.cancel_button = tk.Button(main_frame, text="取消", command=self.cancel_processing, state="disabled")
+        self.cancel_button.grid(row=5, column=2, padx=5, pady=15, sticky="ew")
+        tk.Checkbutton(main_frame, text="使用结果缓存", variable=self.use_cache).grid(row=5, column=0, sticky="w")
 
         # --- [新增] 进度条部分 ---
         self.progress_frame = tk.Frame(main_frame)
-        self.progress_frame.grid(row=4, column=0, columnspan=3, sticky="ew", pady=10) # 调整行和pady
+        self.progress_frame.grid(row=6, column=0, columnspan=3, sticky="ew", pady=10) # 调整行和pady
 
         self.progress_label = tk.Label(self.progress_frame, text="处理进度: 0%")
         self.progress_label.pack(side=tk.LEFT, padx=(0, 10))
@@ -87,6 +130,17 @@ class ImageBinarizerApp:
             messagebox.showerror("错误", "阈值必须是 -1 或 0 到 255 之间的整数！")
             return
 
+        method = self.METHODS[self.method_val.get()]
+        try:
+            block_size = int(self.block_size_val.get())
+            c = float(self.c_val.get())
+            k = float(self.k_val.get())
+            if block_size < 3 or block_size % 2 == 0:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("错误", "窗口大小必须是不小于 3 的奇数，C 和 k 必须是数字！")
+            return
+
         if not os.path.exists(dest):
             try:
                 os.makedirs(dest)
@@ -94,97 +148,107 @@ class ImageBinarizerApp:
                 messagebox.showerror("错误", f"创建目标文件夹失败: {e}")
                 return
         
-        mode_text = "Otsu 自动阈值" if threshold == -1 else f"手动阈值 ({threshold})"
+        if method != "global":
+            mode_text = f"{self.method_val.get()} (窗口 {block_size})"
+        else:
+            mode_text = "Otsu 自动阈值" if threshold == -1 else f"手动阈值 ({threshold})"
         self.status_label.config(text=f"正在使用 {mode_text} 模式处理中...")
         self.root.update_idletasks() # 立即更新界面，显示状态信息
 
-        processed_count = 0
-        skipped_count = 0
         valid_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff')
 
-        # --- [新增] 获取所有符合条件的图片文件列表，用于计算总数和进度 ---
-        image_files = [f for f in os.listdir(source) if f.lower().endswith(valid_extensions)]
+        image_files = sorted(f for f in os.listdir(source) if f.lower().endswith(valid_extensions))
         total_images = len(image_files)
 
         if total_images == 0:
             messagebox.showinfo("信息", "源文件夹中没有找到支持的图片文件。")
             self.status_label.config(text="请选择路径，输入-1可使用Otsu自动阈值")
-            # 确保进度条在没有文件时也重置
             self.progressbar["value"] = 0
             self.progress_label.config(text="处理进度: 0%")
             return
 
-        # 初始化进度条的最大值和当前值
         self.progressbar["maximum"] = total_images
         self.progressbar["value"] = 0
         self.progress_label.config(text="处理进度: 0%")
-        self.root.update_idletasks() # 立即更新界面，显示进度条初始状态
+        self.process_button.config(state="disabled", text="正在处理中...")
+        self.cancel_button.config(state="normal")
 
+        # 界面线程只负责显示，处理放到后台线程，进度通过队列传回
+        self.cancel_event = threading.Event()
+        cache = ResultCache() if self.use_cache.get() else None
+        # 文件数少于线程数时，把多出来的线程分给单页内的分带并行
+        band_workers = max(1, self.workers // min(self.workers, total_images))
+        jobs = [(binarize_file, os.path.join(source, f), os.path.join(dest, f), threshold,
+                 method, block_size, c, k, band_workers, cache) for f in image_files]
+        threading.Thread(target=self.run_jobs, args=(jobs, total_images), daemon=True).start()
+        self.root.after(100, self.process_progress_queue)
+
+    def run_jobs(self, jobs, total_images):
+        """在后台线程中执行，通过 progress_queue 汇报进度"""
+        processed_count = 0
+        skipped_count = 0
+        cached_count = 0
+        io_stats = IOStats()
         try:
-            for i, filename in enumerate(image_files): # 遍历图片文件列表
-                try:
-                    source_path = os.path.join(source, filename)
-                    dest_path = os.path.join(dest, filename)
-
-                    if threshold == -1:
-                        # --- 使用能处理中文路径的OpenCV读取方式 ---
-                        with open(source_path, 'rb') as f:
-                            file_bytes = np.frombuffer(f.read(), dtype=np.uint8)
-                        
-                        img_cv = cv2.imdecode(file_bytes, cv2.IMREAD_GRAYSCALE)
-                        
-                        if img_cv is None:
-                            print(f"无法解码文件: {filename}，跳过。")
-                            skipped_count += 1
-                            continue
-                        
-                        otsu_threshold_val, binarized_img = cv2.threshold(
-                            img_cv, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-                        )
-
-                        # --- 使用能处理中文路径的OpenCV保存方式 ---
-                        is_success, im_buf_arr = cv2.imencode(os.path.splitext(dest_path)[1], binarized_img)
-                        if is_success:
-                            with open(dest_path, "wb") as f:
-                                f.write(im_buf_arr.tobytes())
-                        else:
-                            print(f"无法编码文件: {filename}，跳过。")
-                            skipped_count += 1
-                            continue
-
-                    else:
-                        # Pillow 对中文路径支持较好，通常无需修改
-                        with Image.open(source_path) as img:
-                            grayscale_img = img.convert('L')
-                            binarized_img = grayscale_img.point(lambda p: 255 if p > threshold else 0, '1')
-                            binarized_img.save(dest_path)
-                    
-                    processed_count += 1
-                except Exception as e:
-                    print(f"处理文件 {filename} 时出错: {e}")
+            for job, result, error in imap_ordered(call_with_stats, jobs, self.workers,
+                                                   cancel_event=self.cancel_event, use_threads=True):
+                if error is not None:
+                    print(f"处理文件 {os.path.basename(job[1])} 时出错: {error}")
                     skipped_count += 1
-                
-                # --- [新增] 更新进度条和进度标签 ---
-                current_progress = i + 1
-                self.progressbar["value"] = current_progress
-                percentage = int((current_progress / total_images) * 100)
-                self.progress_label.config(text=f"处理进度: {percentage}% ({current_progress}/{total_images})")
-                self.root.update_idletasks() # 刷新GUI，显示最新进度
-
-            final_message = f"处理完成！成功处理 {processed_count} 个图片，跳过 {skipped_count} 个文件。"
+                else:
+                    io_stats.add(result[1])
+                    processed_count += 1
+                    cached_count += result[0] is True
+                self.progress_queue.put(("progress", processed_count + skipped_count, total_images))
+        except Exception as e:
+            self.progress_queue.put(("error", e))
+            return
+        self.progress_queue.put(("done", processed_count, skipped_count, cached_count, total_images, io_stats))
+
+    def process_progress_queue(self):
+        """在界面线程中取出进度并更新界面，处理结束前每 100ms 轮询一次"""
+        try:
+            while True:
+                message = self.progress_queue.get_nowait()
+                if message[0] == "progress":
+                    _, current_progress, total_images = message
+                    self.progressbar["value"] = current_progress
+                    percentage = int((current_progress / total_images) * 100)
+                    self.progress_label.config(text=f"处理进度: {percentage}% ({current_progress}/{total_images})")
+                else:
+                    self.on_processing_done(message)
+                    return
+        except queue.Empty:
+            self.root.after(100, self.process_progress_queue)
+
+    def cancel_processing(self):
+        """不再提交新文件，正在处理的文件完成后结束"""
+        self.cancel_event.set()
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text="正在取消，等待处理中的文件完成...")
+
+    def on_processing_done(self, message):
+        if message[0] == "error":
+            self.status_label.config(text="处理失败！")
+            messagebox.showerror("错误", f"处理过程中发生未知错误: {message[1]}")
+        else:
+            _, processed_count, skipped_count, cached_count, total_images, io_stats = message
+            remaining = total_images - processed_count - skipped_count
+            if remaining:
+                final_message = f"已取消！成功处理 {processed_count} 个图片，跳过 {skipped_count} 个文件，未处理 {remaining} 个文件。"
+            else:
+                final_message = f"处理完成！成功处理 {processed_count} 个图片，跳过 {skipped_count} 个文件。"
+            if cached_count:
+                final_message += f"其中 {cached_count} 个直接使用了缓存结果。"
             self.status_label.config(text=final_message)
+            print(f"I/O 统计: {io_stats}")
             messagebox.showinfo("完成", final_message)
 
-        except Exception as e:
-            error_message = f"处理过程中发生未知错误: {e}"
-            self.status_label.config(text="处理失败！")
-            messagebox.showerror("错误", error_message)
-        finally:
-            # --- [新增] 确保在处理结束后进度条归零或设为满格（这里设为0，表示完成一轮准备开始下一轮） ---
-            self.progressbar["value"] = 0
-            self.progress_label.config(text="处理进度: 0%")
-            self.status_label.config(text="请选择路径，输入-1可使用Otsu自动阈值") # 恢复初始提示
-            self.root.update_idletasks() # 确保最终状态更新
+        self.progressbar["value"] = 0
+        self.progress_label.config(text="处理进度: 0%")
+        self.status_label.config(text="请选择路径，输入-1可使用Otsu自动阈值")
+        self.process_button.config(state="normal", text="开始处理")
+        self.cancel_button.config(state="disabled")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -1,10 +1,17 @@
 import os
+import sys
+import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import tkinter.ttk as ttk
-from PIL import Image
-import cv2
-import numpy as np
+
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.threshold import whiten_file
+from pyimg.imgio import IOStats
+from pyimg.batch import imap_ordered, call_with_stats
+from pyimg.cache import ResultCache
 
 class ImageThresholdWhitenerApp:
     """
@@ -20,6 +27,11 @@ class ImageThresholdWhitenerApp:
 
         self.source_dir = tk.StringVar()
         self.dest_dir = tk.StringVar()
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        # 处理在后台线程池中进行，线程数跟随 CPU 核数
+        self.workers = os.cpu_count() or 1
+        self.use_cache = tk.BooleanVar(value=True)
         self.threshold_val = tk.StringVar(value='240') # --- [修改] 将默认值设为240，这是一个常用的去背景/水印的阈值
 
         self.create_widgets()
@@ -42,8 +54,12 @@ class ImageThresholdWhitenerApp:
         tk.Entry(main_frame, textvariable=self.threshold_val, width=10).grid(row=2, column=1, sticky="w", padx=5)
 
 
-        process_button = tk.Button(main_frame, text="开始处理", command=self.process_images, bg="#4CAF50", fg="white")
-        process_button.grid(row=3, column=1, pady=15, sticky="ew")
+        self.process_button = tk.Button(main_frame, text="开始处理", command=self.process_images, bg="#4CAF50", fg="white")
+        self.process_button.grid(row=3, column=1, pady=15, sticky="ew")
+
+        self.cancel_button = tk.Button(main_frame, text="取消", command=self.cancel_processing, state="disabled")
+        self.cancel_button.grid(row=3, column=2, padx=5, pady=15, sticky="ew")
+        tk.Checkbutton(main_frame, text="使用结果缓存", variable=self.use_cache).grid(row=3, column=0, sticky="w")
 
         self.progress_frame = tk.Frame(main_frame)
         self.progress_frame.grid(row=4, column=0, columnspan=3, sticky="ew", pady=10)
@@ -100,11 +116,9 @@ class ImageThresholdWhitenerApp:
         self.status_label.config(text=f"正在使用 {mode_text} 模式处理中...")
         self.root.update_idletasks()
 
-        processed_count = 0
-        skipped_count = 0
         valid_extensions = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff')
 
-        image_files = [f for f in os.listdir(source) if f.lower().endswith(valid_extensions)]
+        image_files = sorted(f for f in os.listdir(source) if f.lower().endswith(valid_extensions))
         total_images = len(image_files)
 
         if total_images == 0:
@@ -117,85 +131,82 @@ class ImageThresholdWhitenerApp:
         self.progressbar["maximum"] = total_images
         self.progressbar["value"] = 0
         self.progress_label.config(text="处理进度: 0%")
-        self.root.update_idletasks()
-
+        self.process_button.config(state="disabled", text="正在处理中...")
+        self.cancel_button.config(state="normal")
+
+        # 界面线程只负责显示，处理放到后台线程，进度通过队列传回
+        cache = ResultCache() if self.use_cache.get() else None
+        self.cancel_event = threading.Event()
+        jobs = [(whiten_file, os.path.join(source, f), os.path.join(dest, f), threshold, cache) for f in image_files]
+        threading.Thread(target=self.run_jobs, args=(jobs, total_images), daemon=True).start()
+        self.root.after(100, self.process_progress_queue)
+
+    def run_jobs(self, jobs, total_images):
+        """在后台线程中执行，通过 progress_queue 汇报进度"""
+        processed_count = 0
+        skipped_count = 0
+        cached_count = 0
+        io_stats = IOStats()
         try:
-            for i, filename in enumerate(image_files):
-                try:
-                    source_path = os.path.join(source, filename)
-                    dest_path = os.path.join(dest, filename)
-
-                    if threshold == -1:
-                        # --- Otsu's 自动阈值处理 (OpenCV) ---
-                        with open(source_path, 'rb') as f:
-                            file_bytes = np.frombuffer(f.read(), dtype=np.uint8)
-                        
-                        img_cv = cv2.imdecode(file_bytes, cv2.IMREAD_GRAYSCALE)
-                        
-                        if img_cv is None:
-                            print(f"无法解码文件: {filename}，跳过。")
-                            skipped_count += 1
-                            continue
-                        
-                        # --- [核心修改] ---
-                        # 1. 先用Otsu方法获取最佳阈值，但不使用它返回的二值化图像
-                        otsu_threshold_val, _ = cv2.threshold(
-                            img_cv, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU
-                        )
-                        
-                        # 2. 创建一个原始图像的副本进行操作
-                        processed_img = img_cv.copy()
-                        
-                        # 3. 使用Numpy的布尔索引，高效地将所有高于阈值的像素设置为255
-                        #   这会保留所有低于或等于阈值的像素的原始值
-                        processed_img[img_cv > otsu_threshold_val] = 255
-                        # --- 修改结束 ---
-
-                        is_success, im_buf_arr = cv2.imencode(os.path.splitext(dest_path)[1], processed_img) # 保存处理后的图像
-                        if is_success:
-                            with open(dest_path, "wb") as f:
-                                f.write(im_buf_arr.tobytes())
-                        else:
-                            print(f"无法编码文件: {filename}，跳过。")
-                            skipped_count += 1
-                            continue
-
-                    else:
-                        # --- 手动阈值处理 (Pillow) ---
-                        with Image.open(source_path) as img:
-                            grayscale_img = img.convert('L')
-                            # --- [核心修改] ---
-                            # 使用 lambda 函数：如果像素值 p > threshold，则变为 255 (白色)
-                            # 否则 (p <= threshold)，保持其原始值 p
-                            # 注意：不再指定输出模式为 '1' (1-bit)，因为结果是灰度图
-                            processed_img = grayscale_img.point(lambda p: 255 if p > threshold else p)
-                            # --- 修改结束 ---
-                            processed_img.save(dest_path)
-                    
-                    processed_count += 1
-                except Exception as e:
-                    print(f"处理文件 {filename} 时出错: {e}")
+            for job, result, error in imap_ordered(call_with_stats, jobs, self.workers,
+                                                   cancel_event=self.cancel_event, use_threads=True):
+                if error is not None:
+                    print(f"处理文件 {os.path.basename(job[1])} 时出错: {error}")
                     skipped_count += 1
-                
-                current_progress = i + 1
-                self.progressbar["value"] = current_progress
-                percentage = int((current_progress / total_images) * 100)
-                self.progress_label.config(text=f"处理进度: {percentage}% ({current_progress}/{total_images})")
-                self.root.update_idletasks()
-
-            final_message = f"处理完成！成功处理 {processed_count} 个图片，跳过 {skipped_count} 个文件。"
+                else:
+                    io_stats.add(result[1])
+                    processed_count += 1
+                    cached_count += result[0] is True
+                self.progress_queue.put(("progress", processed_count + skipped_count, total_images))
+        except Exception as e:
+            self.progress_queue.put(("error", e))
+            return
+        self.progress_queue.put(("done", processed_count, skipped_count, cached_count, total_images, io_stats))
+
+    def process_progress_queue(self):
+        """在界面线程中取出进度并更新界面，处理结束前每 100ms 轮询一次"""
+        try:
+            while True:
+                message = self.progress_queue.get_nowait()
+                if message[0] == "progress":
+                    _, current_progress, total_images = message
+                    self.progressbar["value"] = current_progress
+                    percentage = int((current_progress / total_images) * 100)
+                    self.progress_label.config(text=f"处理进度: {percentage}% ({current_progress}/{total_images})")
+                else:
+                    self.on_processing_done(message)
+                    return
+        except queue.Empty:
+            self.root.after(100, self.process_progress_queue)
+
+    def cancel_processing(self):
+        """不再提交新文件，正在处理的文件完成后结束"""
+        self.cancel_event.set()
+        self.cancel_button.config(state="disabled")
+        self.status_label.config(text="正在取消，等待处理中的文件完成...")
+
+    def on_processing_done(self, message):
+        if message[0] == "error":
+            self.status_label.config(text="处理失败！")
+            messagebox.showerror("错误", f"处理过程中发生未知错误: {message[1]}")
+        else:
+            _, processed_count, skipped_count, cached_count, total_images, io_stats = message
+            remaining = total_images - processed_count - skipped_count
+            if remaining:
+                final_message = f"已取消！成功处理 {processed_count} 个图片，跳过 {skipped_count} 个文件，未处理 {remaining} 个文件。"
+            else:
+                final_message = f"处理完成！成功处理 {processed_count} 个图片，跳过 {skipped_count} 个文件。"
+            if cached_count:
+                final_message += f"其中 {cached_count} 个直接使用了缓存结果。"
             self.status_label.config(text=final_message)
+            print(f"I/O 统计: {io_stats}")
             messagebox.showinfo("完成", final_message)
 
-        except Exception as e:
-            error_message = f"处理过程中发生未知错误: {e}"
-            self.status_label.config(text="处理失败！")
-            messagebox.showerror("错误", error_message)
-        finally:
-            self.progressbar["value"] = 0
-            self.progress_label.config(text="处理进度: 0%")
-            self.status_label.config(text="请选择路径，并设置一个阈值（例如 240）")
-            self.root.update_idletasks()
+        self.progressbar["value"] = 0
+        self.progress_label.config(text="处理进度: 0%")
+        self.status_label.config(text="请选择路径，并设置一个阈值（例如 240）")
+        self.process_button.config(state="normal", text="开始处理")
+        self.cancel_button.config(state="disabled")
 
 if __name__ == "__main__":
     root = tk.Tk()
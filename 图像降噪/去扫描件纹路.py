@@ -1,72 +1,18 @@
-import cv2
-import numpy as np
 import os
+import sys
 import threading
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 
-# --- 核心处理逻辑 ---
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.batch import IMAGE_EXTENSIONS, list_images, imap_ordered, call_with_stats
+from pyimg.denoise import clean_manga_scan_job
+from pyimg.imgio import IOStats
+from pyimg.manifest import JobManifest, input_digest
+from pyimg.cache import ResultCache
 
-def clean_manga_scan(image_path, output_path, denoise_strength=10, white_threshold_percentile=90, log_callback=None):
-    """
-    去除扫描漫画的纸纹和噪点。
-    """
-    try:
-        # 1. 读取图片
-        # 尝试处理中文路径问题 (OpenCV直接读取中文路径在某些系统会失败，用imdecode代替)
-        try:
-            img_data = np.fromfile(image_path, dtype=np.uint8)
-            img = cv2.imdecode(img_data, cv2.IMREAD_GRAYSCALE)
-        except Exception:
-            # 回退到普通读取
-            img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        
-        if img is None:
-            if log_callback: log_callback(f"错误: 无法读取图片 {os.path.basename(image_path)}")
-            return False
-
-        # 2. 降噪 (Denoising)
-        # h: 决定过滤器强度的参数。
-        denoised = cv2.fastNlMeansDenoising(img, None, h=denoise_strength, templateWindowSize=7, searchWindowSize=21)
-
-        # 3. 自动色阶 / 漂白纸纹
-        # 计算像素亮度的直方图百分位
-        black_point = np.percentile(denoised, 5)   
-        white_point = np.percentile(denoised, white_threshold_percentile)
-
-        # 防止除以零或阈值倒挂
-        if white_point <= black_point:
-            white_point = 255
-            black_point = 0
-
-        # 限制范围并拉伸对比度
-        clipped = np.clip(denoised, black_point, white_point)
-        
-        # 归一化到 0-255
-        # 注意: 使用 float 运算防止溢出，最后转回 uint8
-        normalized = ((clipped - black_point) / (white_point - black_point) * 255).astype(np.uint8)
-
-        # 4. (可选) 锐化线条
-        kernel = np.array([[-1,-1,-1], 
-                           [-1, 9,-1], 
-                           [-1,-1,-1]])
-        sharpened = cv2.filter2D(normalized, -1, kernel)
-        final_img = cv2.addWeighted(normalized, 0.7, sharpened, 0.3, 0)
-
-        # 5. 保存结果
-        # 处理中文路径保存问题
-        is_success, im_buf = cv2.imencode(os.path.splitext(output_path)[1], final_img)
-        if is_success:
-            im_buf.tofile(output_path)
-            if log_callback: log_callback(f"成功: {os.path.basename(output_path)}")
-            return True
-        else:
-            if log_callback: log_callback(f"保存失败: {os.path.basename(output_path)}")
-            return False
-
-    except Exception as e:
-        if log_callback: log_callback(f"处理异常 {os.path.basename(image_path)}: {str(e)}")
-        return False
 
 # --- GUI 界面类 ---
 
@@ -86,6 +32,10 @@ class MangaCleanerApp:
         self.output_dir = tk.StringVar()
         self.denoise_val = tk.IntVar(value=10)
         self.white_threshold_val = tk.IntVar(value=85)
+        self.cpu_count = os.cpu_count() or 1
+        self.workers_val = tk.IntVar(value=max(1, self.cpu_count - 1))
+        self.resume_val = tk.BooleanVar(value=True)
+        self.cache_val = tk.BooleanVar(value=True)
         self.is_processing = False
 
         self._init_ui()
@@ -128,6 +78,15 @@ class MangaCleanerApp:
         self.white_label.grid(row=2, column=2, pady=(10, 0))
         ttk.Label(param_frame, text="(百分比越小画面越亮/白。推荐 80-95%)", foreground="gray", font=("", 8)).grid(row=3, column=1, sticky="w", padx=10)
 
+        # 并行进程数
+        ttk.Label(param_frame, text="并行进程数 (Workers):").grid(row=4, column=0, sticky="w", pady=(10, 0))
+        ttk.Spinbox(param_frame, from_=1, to=self.cpu_count, textvariable=self.workers_val, width=6).grid(row=4, column=1, sticky="w", padx=10, pady=(10, 0))
+        ttk.Label(param_frame, text=f"(1 为单进程顺序处理。本机 CPU 核心数: {self.cpu_count})", foreground="gray", font=("", 8)).grid(row=5, column=1, sticky="w", padx=10)
+
+        # 断点续跑
+        ttk.Checkbutton(param_frame, text="断点续跑 (跳过上次已成功、输入和参数都没变的文件)", variable=self.resume_val).grid(row=6, column=0, columnspan=3, sticky="w", pady=(10, 0))
+        ttk.Checkbutton(param_frame, text="使用结果缓存 (同一张图用同样参数处理过时直接复制上次的结果)", variable=self.cache_val).grid(row=7, column=0, columnspan=3, sticky="w")
+
         # 3. 进度和日志
         progress_frame = ttk.LabelFrame(main_frame, text="处理日志", padding="10")
         progress_frame.pack(fill=tk.BOTH, expand=True, pady=5)
@@ -197,9 +156,8 @@ class MangaCleanerApp:
                 os.makedirs(output_path)
                 self.root.after(0, self.log, f"创建输出目录: {output_path}")
 
-            # 支持的图片格式
-            valid_extensions = {'.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff', '.webp'}
-            files = [f for f in os.listdir(input_path) if os.path.splitext(f.lower())[1] in valid_extensions]
+            # 支持的图片格式 (按文件名排序，保证日志和处理顺序稳定)
+            files = list_images(input_path, IMAGE_EXTENSIONS)
             
             total_files = len(files)
             if total_files == 0:
@@ -207,30 +165,53 @@ class MangaCleanerApp:
                 self.root.after(0, self.finish_processing)
                 return
 
-            self.root.after(0, self.log, f"找到 {total_files} 个文件，准备开始...")
-            
             denoise = self.denoise_val.get()
             white_thresh = self.white_threshold_val.get()
+            try:
+                workers = max(1, min(int(self.workers_val.get()), total_files))
+            except (tk.TclError, ValueError):
+                workers = 1
+
+            self.root.after(0, self.log, f"找到 {total_files} 个文件，使用 {workers} 个进程，准备开始...")
+
+            jobs = [(in_file, os.path.join(output_path, os.path.basename(in_file)), denoise, white_thresh)
+                    for in_file in files]
+
+            # 输出文件夹中的任务记录，参数写法与命令行版一致，两边可以互相续跑
+            params = {"op": "denoise", "strength": denoise, "white": white_thresh}
+            manifest = JobManifest(output_path)
+            if self.resume_val.get():
+                jobs, skipped = manifest.pending(jobs, params)
+                if skipped:
+                    self.root.after(0, self.log, f"断点续跑: 跳过 {skipped} 个已完成的文件")
+            cache = ResultCache() if self.cache_val.get() else None
+            total_jobs = len(jobs)
+            # 用缓存时输入哈希在这里算一次，任务查缓存和写任务记录共用
+            io_total = IOStats()
+            jobs = ((clean_manga_scan_job,) + job + (cache, input_digest(job[0], io_total) if cache is not None else None)
+                    for job in jobs)
+            # 结果按文件顺序返回；workers 为 1 时在本线程顺序处理
+            for i, (job, result, error) in enumerate(imap_ordered(call_with_stats, jobs, workers)):
+                if error is not None:
+                    messages = [f"处理异常 {os.path.basename(job[1])}: {str(error)}"]
+                    ok = False
+                else:
+                    (ok, messages), stats = result
+                    io_total.add(stats)
+                manifest.record(job[1], params, ok, output_path=job[2], error=None if ok else "; ".join(messages),
+                                digest=job[-1], stats=io_total)
+                for msg in messages:
+                    self.root.after(0, self.log, msg)
 
-            for i, filename in enumerate(files):
-                in_file = os.path.join(input_path, filename)
-                out_file = os.path.join(output_path, filename)
-                
-                # 调用处理函数
-                clean_manga_scan(
-                    in_file, 
-                    out_file, 
-                    denoise_strength=denoise, 
-                    white_threshold_percentile=white_thresh,
-                    log_callback=lambda msg: self.root.after(0, self.log, msg)
-                )
-                
                 # 更新进度条
-                progress = (i + 1) / total_files * 100
+                progress = (i + 1) / total_jobs * 100
                 self.root.after(0, self.update_progress, progress)
 
+            self.root.after(0, self.log, f"I/O 统计: {io_total}")
             self.root.after(0, self.log, "--- 全部处理完成! ---")
-            self.root.after(0, lambda: messagebox.showinfo("完成", f"处理完成！\n共处理 {total_files} 张图片。"))
+            processed = total_jobs
+            self.root.after(0, self.update_progress, 100)
+            self.root.after(0, lambda: messagebox.showinfo("完成", f"处理完成！\n共处理 {processed} 张图片。"))
 
         except Exception as e:
             self.root.after(0, self.log, f"发生未知错误: {str(e)}")
@@ -248,6 +229,8 @@ class MangaCleanerApp:
 
 
 if __name__ == "__main__":
+    # 打包成 exe 后多进程需要此调用
+    multiprocessing.freeze_support()
     root = tk.Tk()
     # 尝试设置Windows高分屏支持，防止界面模糊
     try:
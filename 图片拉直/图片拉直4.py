@@ -1,4 +1,6 @@
 import os
+import queue
+import sys
 import cv2
 import numpy as np
 from PIL import Image, ImageTk
@@ -7,53 +9,70 @@ from tkinter import filedialog, messagebox
 from tkinter import ttk
 from ttkthemes import ThemedTk
 
-# ==========================================
-# 核心图像处理逻辑 (保持 V4.0 的修复和标准化)
-# ==========================================
-def straighten_and_crop(image_cv, contour):
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.batch import BackgroundWriter, Prefetcher
+from pyimg.cache import ResultCache
+from pyimg.pyramid import pyramid_cache
+from pyimg.straighten import color_distance, largest_region, straighten_and_crop, straightened_size
+
+WORK_SIZE = 1000    # 取色预览用的工作图最大边长
+PREFETCH_AHEAD = 2  # 后台提前载入的页数
+SAVE_POLL_MS = 50  # 界面线程取后台保存结果的间隔
+
+
+def load_page(filepath):
     """
-    根据轮廓旋转图像（微调 +/- 45度），防止翻转。
+    读取一页并准备好界面要用的数据，在后台预读线程中运行：
+    RGB 原图、显示用的金字塔、取色预览用的缩小工作图 (BGR) 及其缩放比例。
     """
-    rect = cv2.minAreaRect(contour)
-    (cx, cy), (w, h), angle = rect
-
-    # 角度规范化，防止180度翻转
-    if angle < -45:
-        angle += 90
-        w, h = h, w
-    elif angle > 45:
-        angle -= 90
-        w, h = h, w
-
-    (h_img, w_img) = image_cv.shape[:2]
-    center = (w_img // 2, h_img // 2)
-    M = cv2.getRotationMatrix2D(center, angle, 1.0)
-    
-    contour_points = contour.reshape(-1, 1, 2).astype(np.float32)
-    rotated_contour_points = cv2.transform(contour_points, M)
-    
-    x, y, w_crop, h_crop = cv2.boundingRect(rotated_contour_points)
+    pil_img = Image.open(filepath)
+    if pil_img.mode != 'RGB':
+        pil_img = pil_img.convert('RGB')
+    image_rgb = np.array(pil_img)
+    height, width = image_rgb.shape[:2]
+    work_scale = min(1, WORK_SIZE / max(width, height))
+    img_work = cv2.resize(image_rgb, (int(width * work_scale), int(height * work_scale)))
+    return {
+        "rgb": image_rgb,
+        "pyramid": pyramid_cache.get(filepath, image_rgb),
+        "work": cv2.cvtColor(img_work, cv2.COLOR_RGB2BGR),
+        "work_scale": work_scale,
+    }
+
+
+def save_page(image_cv, contour, size, input_path, output_path, cache=None):
+    """
+    裁剪、统一尺寸并保存一页，在后台写出线程中运行。
+    size 为统一的输出尺寸，None 表示保持裁剪后的尺寸 (第一页)。
+    """
+    # 同一张图、同样的轮廓和目标尺寸处理过，直接取缓存结果
+    cache_key = None
+    if cache is not None:
+        params = {"contour": contour.tolist(), "size": size}
+        hit, cache_key = cache.lookup("straighten", params, input_path, output_path)
+        if hit:
+            print(f"已保存 (缓存): {output_path}")
+            return
 
-    if w_crop <= 0 or h_crop <= 0:
-        return np.full((10, 10, 3), 255, dtype=np.uint8)
+    # 对原图进行裁剪
+    final_image = straighten_and_crop(image_cv, contour)
+    if size is not None:
+        final_image = cv2.resize(final_image, size, interpolation=cv2.INTER_LANCZOS4)
 
-    M[0, 2] -= x
-    M[1, 2] -= y
+    # 保存
+    final_image_rgb = cv2.cvtColor(final_image, cv2.COLOR_BGR2RGB)
+    Image.fromarray(final_image_rgb).save(output_path)
+    if cache is not None:
+        cache.store(cache_key, output_path)
+    print(f"已保存: {output_path}")
 
-    final_image = cv2.warpAffine(
-        image_cv, M, (w_crop, h_crop),
-        flags=cv2.INTER_CUBIC, 
-        borderMode=cv2.BORDER_CONSTANT, 
-        borderValue=(255, 255, 255)
-    )
-    
-    return final_image
 
 # ==========================================
 # 交互式处理窗口 (V5.0 重大升级)
 # ==========================================
 class InteractiveProcessorWindow(tk.Toplevel):
-    def __init__(self, parent, file_list, output_dir):
+    def __init__(self, parent, file_list, output_dir, cache=None):
         super().__init__(parent)
         self.title("交互式处理 - 滚轮缩放 | 右键拖拽 | 左键取色")
         
@@ -62,11 +81,21 @@ class InteractiveProcessorWindow(tk.Toplevel):
         
         self.file_list = file_list
         self.output_dir = output_dir
+        self.cache = cache # ResultCache 或 None
         self.current_index = 0
+        # 处理当前页时，后台读入接下来几页，按确认后可以立即切换
+        self.prefetcher = Prefetcher(load_page)
+        # 裁剪、缩放和保存放到后台，确认后立即切到下一页；保存失败时弹窗提示。
+        # 写出线程只把结果放进队列，由界面线程定时取出 (工作线程里调用 after 会和等待保存的界面线程互相卡死)
+        self.save_results = queue.Queue()
+        self.writer = BackgroundWriter(on_done=lambda name, error: self.save_results.put((name, error)))
+        self.closing = False # 正在等剩余的图片保存完再关闭窗口
         
         # 数据状态
         self.reference_size = None
         self.selected_color = None
+        self.color_distance = None # 工作图上各像素与选中颜色的距离，换容差时只需重新阈值
+        self.preview_tolerance = None # 上次预览用的容差
         self.current_contour_orig = None # 存储基于原图坐标的轮廓
         
         # 视图状态
@@ -86,6 +115,8 @@ class InteractiveProcessorWindow(tk.Toplevel):
         
         self.canvas = tk.Canvas(canvas_frame, bg="#404040", cursor="crosshair")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        # 只渲染可见区域，画布大小变化 (包括窗口最大化) 时需要重绘
+        self.canvas.bind("<Configure>", lambda e: self.redraw_image())
 
         # 布局 - 底部控制面板
         control_panel = ttk.Frame(self)
@@ -141,6 +172,7 @@ class InteractiveProcessorWindow(tk.Toplevel):
         
         self.protocol("WM_DELETE_WINDOW", self.on_close)
         
+        self.poll_id = self.after(SAVE_POLL_MS, self.poll_saves)
         # 加载第一张图
         self.load_image()
         self.deiconify()
@@ -153,6 +185,8 @@ class InteractiveProcessorWindow(tk.Toplevel):
 
         self.canvas.delete("all")
         self.selected_color = None
+        self.color_distance = None
+        self.preview_tolerance = None
         self.current_contour_orig = None
         self.color_preview.config(bg="white")
         self.color_text.config(text="未选择")
@@ -168,18 +202,21 @@ class InteractiveProcessorWindow(tk.Toplevel):
             info_text += f"  [锁定输出尺寸: {self.reference_size[0]}x{self.reference_size[1]}]"
         self.info_label.config(text=info_text)
 
-        # 读取原图
-        pil_img = Image.open(filepath)
-        if pil_img.mode != 'RGB':
-            pil_img = pil_img.convert('RGB')
-        self.image_pil_orig = pil_img
-        self.image_cv_orig = np.array(pil_img)[:, :, ::-1]
+        # 读取原图 (通常已在后台读好)，同时提交接下来几页的预读
+        self.prefetcher.prefetch(self.file_list[self.current_index:self.current_index + 1 + PREFETCH_AHEAD])
+        page = self.prefetcher.get(filepath)
+        self.image_rgb = page["rgb"]
+        self.image_cv_orig = self.image_rgb[:, :, ::-1]
+        # 显示用的金字塔：缩放时从最接近的一层取样，不必每次都从原图缩放
+        self.pyramid = page["pyramid"]
+        self.img_work, self.work_scale = page["work"], page["work_scale"]
         
         # 计算初始适应屏幕的缩放比例
+        img_h, img_w = self.image_rgb.shape[:2]
         screen_w = self.winfo_screenwidth() * 0.8
         screen_h = self.winfo_screenheight() * 0.7
-        w_ratio = screen_w / self.image_pil_orig.width
-        h_ratio = screen_h / self.image_pil_orig.height
+        w_ratio = screen_w / img_w
+        h_ratio = screen_h / img_h
         self.base_scale = min(w_ratio, h_ratio, 1.0) # 初始不放大，只缩小
         
         self.zoom_level = self.base_scale
@@ -188,25 +225,24 @@ class InteractiveProcessorWindow(tk.Toplevel):
 
     def redraw_image(self):
         """核心绘制函数：根据当前缩放和平移重绘图像"""
-        if not hasattr(self, 'image_pil_orig'): return
+        if not hasattr(self, 'pyramid'): return
+        canvas_w, canvas_h = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if canvas_w <= 1 or canvas_h <= 1: return
 
-        # 1. 计算目标尺寸
-        new_w = int(self.image_pil_orig.width * self.zoom_level)
-        new_h = int(self.image_pil_orig.height * self.zoom_level)
-        
-        # 2. 只有当尺寸变化较大时才重新 Resize (简单优化)
-        # 为了流畅性，这里每次都 resize，Pillow 的 resize 速度在现代 CPU 上通常足够快
-        # 使用 Nearest 在缩放操作时最快，但质量差；LANCZOS 最慢。这里用 BILINEAR 平衡
-        self.image_pil_display = self.image_pil_orig.resize((new_w, new_h), Image.BILINEAR)
-        self.image_tk = ImageTk.PhotoImage(self.image_pil_display)
-        
-        # 3. 更新 Canvas
+        # 1. 只渲染画布上看得见的部分：从金字塔中不小于当前缩放比例的那一层裁出可见区域再缩放，
+        #    耗时只与画布大小有关。插值用 BILINEAR
         self.canvas.delete("img_tag")
-        # 注意：我们将图像放在 (pan_x, pan_y) 位置
-        self.canvas.create_image(self.pan_x, self.pan_y, anchor=tk.NW, image=self.image_tk, tags="img_tag")
-        self.canvas.tag_lower("img_tag") # 确保图片在框线下面
+        view = self.pyramid.render(-self.pan_x / self.zoom_level, -self.pan_y / self.zoom_level, self.zoom_level,
+                                   canvas_w, canvas_h, cv2.INTER_LINEAR)
+        if view is not None:
+            region, (x, y) = view
+            self.image_tk = ImageTk.PhotoImage(Image.fromarray(region))
+
+            # 2. 更新 Canvas，图片左上角在 (pan_x, pan_y)，这里贴的是其中可见的部分
+            self.canvas.create_image(x, y, anchor=tk.NW, image=self.image_tk, tags="img_tag")
+            self.canvas.tag_lower("img_tag") # 确保图片在框线下面
         
-        # 4. 如果有轮廓，也需要重绘
+        # 3. 如果有轮廓，也需要重绘
         self.draw_preview_contour()
 
     # === 交互逻辑 ===
@@ -226,10 +262,8 @@ class InteractiveProcessorWindow(tk.Toplevel):
         self.pan_x = self.start_pan_x + dx
         self.pan_y = self.start_pan_y + dy
         
-        # 移动所有元素
-        self.canvas.delete("all") # 清除旧的
-        self.canvas.create_image(self.pan_x, self.pan_y, anchor=tk.NW, image=self.image_tk, tags="img_tag")
-        self.draw_preview_contour()
+        # 只渲染了可见区域，平移后需要重新渲染
+        self.redraw_image()
 
     def on_zoom(self, event):
         # 获取鼠标当前在 Canvas 上的位置
@@ -269,17 +303,21 @@ class InteractiveProcessorWindow(tk.Toplevel):
         img_y = int((event.y - self.pan_y) / self.zoom_level)
         
         # 边界检查
-        if 0 <= img_x < self.image_pil_orig.width and 0 <= img_y < self.image_pil_orig.height:
+        if 0 <= img_x < self.image_rgb.shape[1] and 0 <= img_y < self.image_rgb.shape[0]:
             # 从原图中获取颜色，保证最准确
-            rgb = self.image_pil_orig.getpixel((img_x, img_y))
-            # PIL是RGB, OpenCV是BGR
-            self.selected_color = (rgb[0], rgb[1], rgb[2]) # RGB tuple
+            rgb = self.image_rgb[img_y, img_x]
+            # 原图数组是RGB, OpenCV是BGR
+            self.selected_color = (int(rgb[0]), int(rgb[1]), int(rgb[2])) # RGB tuple
             
             # 更新 UI
             hex_color = '#%02x%02x%02x' % self.selected_color
             self.color_preview.config(bg=hex_color)
             self.color_text.config(text=f"RGB: {self.selected_color}")
             
+            # 每次取色只算一次距离图 (OpenCV 需要 BGR)
+            self.color_distance = color_distance(self.img_work, self.selected_color[::-1])
+            self.preview_tolerance = None
+            
             # 触发预览更新
             self.update_preview()
 
@@ -292,44 +330,26 @@ class InteractiveProcessorWindow(tk.Toplevel):
         if self.selected_color is None: return
         
         tolerance = self.tolerance_var.get()
+        # 拖动滑块时同一个整数容差会触发多次，结果不变，不必重算
+        if tolerance == self.preview_tolerance: return
+        self.preview_tolerance = tolerance
         
         # 这里的计算策略：
         # 为了速度，我们不应该在 4K 原图上做 cv2.inRange，那样会卡。
         # 我们应该在一个较小的“工作图”上做运算，得到轮廓后，再映射回原图坐标。
-        
-        # 创建一个工作图 (固定最大边长 1000px，保证速度)
-        work_scale = 1000 / max(self.image_pil_orig.width, self.image_pil_orig.height)
-        if work_scale > 1: work_scale = 1
-        
-        w_work = int(self.image_pil_orig.width * work_scale)
-        h_work = int(self.image_pil_orig.height * work_scale)
-        
-        img_work = cv2.resize(self.image_cv_orig, (w_work, h_work))
-        
-        # OpenCV 需要 BGR
-        target_bgr = self.selected_color[::-1] # RGB to BGR
-        
-        lower_bound = np.array([max(0, c - tolerance) for c in target_bgr])
-        upper_bound = np.array([min(255, c + tolerance) for c in target_bgr])
-        
-        mask = cv2.inRange(img_work, lower_bound, upper_bound)
-        mask_inv = cv2.bitwise_not(mask)
-        
-        contours, _ = cv2.findContours(mask_inv, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # 工作图 (固定最大边长 WORK_SIZE) 在读图时已经准备好，与选中颜色的距离图在取色时算好，
+        # 这里只需对距离图做一次阈值：距离大于容差即与背景不同，与原先的 inRange 再取反完全相同。
+        largest = largest_region(self.color_distance, tolerance)
         
         self.canvas.delete("preview_box")
         
-        if contours:
-            largest = max(contours, key=cv2.contourArea)
-            if cv2.contourArea(largest) < 50:
-                self.current_contour_orig = None
-                return
-            
-            # 将轮廓坐标从 work 尺寸映射回 orig 尺寸
-            self.current_contour_orig = (largest / work_scale).astype(np.int32)
-            self.draw_preview_contour()
-        else:
+        if largest is None:
             self.current_contour_orig = None
+            return
+            
+        # 将轮廓坐标从 work 尺寸映射回 orig 尺寸
+        self.current_contour_orig = (largest / self.work_scale).astype(np.int32)
+        self.draw_preview_contour()
 
     def draw_preview_contour(self):
         if self.current_contour_orig is None: return
@@ -345,59 +365,97 @@ class InteractiveProcessorWindow(tk.Toplevel):
         # 计算最小矩形用于绘制
         rect = cv2.minAreaRect(cnt_final.astype(np.int32))
         box = cv2.boxPoints(rect)
-        box = np.int0(box)
+        box = np.intp(box)
         
         self.canvas.delete("preview_box")
         # 绘制加粗红线
         self.canvas.create_polygon(tuple(box.flatten()), outline='#FF0000', width=3, fill='', tags="preview_box")
 
     def process_and_next(self):
+        if self.closing:
+            return
         if self.current_contour_orig is None:
             messagebox.showwarning("提示", "未检测到有效区域，请点击背景取色。", parent=self)
             return
         
-        # 对原图进行裁剪
-        processed_image = straighten_and_crop(self.image_cv_orig, self.current_contour_orig)
-        
-        # 统一尺寸逻辑
-        current_h, current_w = processed_image.shape[:2]
-        
+        input_path = self.file_list[self.current_index]
+        output_path = os.path.join(self.output_dir, os.path.basename(input_path))
+
+        # 统一尺寸逻辑：第一页的裁剪尺寸作为之后各页的输出尺寸，只需几何计算，不必等裁剪完成
+        size = self.reference_size
         if self.reference_size is None:
-            self.reference_size = (current_w, current_h)
-            final_image = processed_image
-        else:
-            target_w, target_h = self.reference_size
-            final_image = cv2.resize(processed_image, (target_w, target_h), interpolation=cv2.INTER_LANCZOS4)
+            self.reference_size = straightened_size(self.image_cv_orig.shape, self.current_contour_orig)
 
-        # 保存
-        output_path = os.path.join(self.output_dir, os.path.basename(self.file_list[self.current_index]))
-        final_image_rgb = cv2.cvtColor(final_image, cv2.COLOR_BGR2RGB)
-        Image.fromarray(final_image_rgb).save(output_path)
-        
-        print(f"已保存: {output_path}")
+        # 裁剪、缩放、编码和写盘都在后台进行 (在途任务过多时这里会稍等)
+        self.writer.submit(os.path.basename(input_path), save_page, self.image_cv_orig, self.current_contour_orig,
+                           size, input_path, output_path, self.cache)
         self.current_index += 1
         self.load_image()
 
+    def on_save_done(self, name, error):
+        if error is not None:
+            print(f"保存失败: {name} ({error})")
+            messagebox.showerror("保存失败", f"{name} 保存失败：\n{error}", parent=self)
+
+    def poll_saves(self):
+        """在界面线程中取出后台保存的结果，每 SAVE_POLL_MS 毫秒一次"""
+        while True:
+            try:
+                name, error = self.save_results.get_nowait()
+            except queue.Empty:
+                break
+            self.on_save_done(name, error)
+        self.poll_id = self.after(SAVE_POLL_MS, self.poll_saves)
+
     def skip(self):
+        if self.closing:
+            return
         self.current_index += 1
         self.load_image()
 
-    def finish_processing(self):
-        messagebox.showinfo("完成", "所有图片已处理完毕！")
+    def wait_for_saves(self, then):
+        """
+        不再提交新任务，等后台保存全部完成、其中的失败提示也处理完后调用 then()。
+        不阻塞界面线程，由 poll_saves 继续取结果，这里只定时检查写出线程是否已空闲。
+        """
+        self.closing = True
+        self.prefetcher.shutdown()
+        self.writer.shutdown(wait=False)
+        self.info_label.config(text="正在保存剩余图片...")
+
+        def check():
+            # idle 时所有结果都已入队，队列取空后才算处理完
+            if self.writer.idle() and self.save_results.empty():
+                then()
+            else:
+                self.after(SAVE_POLL_MS, check)
+        check()
+
+    def close_window(self):
+        self.after_cancel(self.poll_id)
         self.destroy()
 
+    def finish_processing(self):
+        def done():
+            messagebox.showinfo("完成", "所有图片已处理完毕！", parent=self)
+            self.close_window()
+        self.wait_for_saves(done)
+
     def on_close(self):
+        if self.closing:
+            return
         if messagebox.askyesno("确认", "您确定要中断处理吗？", parent=self):
-            self.destroy()
+            self.wait_for_saves(self.close_window)
 
 class MainApp:
     def __init__(self, root):
         self.root = root
         self.root.title("图片批处理工具 - V5.0 专业面板")
-        self.root.geometry("600x200") # 初始面板也稍微大一点
+        self.root.geometry("600x240") # 初始面板也稍微大一点
         
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
+        self.use_cache = tk.BooleanVar(value=True)
         
         frame = ttk.Frame(root, padding="20")
         frame.pack(fill=tk.BOTH, expand=True)
@@ -417,8 +475,10 @@ class MainApp:
         ttk.Entry(frame, textvariable=self.output_folder, width=50).grid(row=1, column=1, **grid_opts)
         ttk.Button(frame, text="浏览...", command=self.browse_output).grid(row=1, column=2, **grid_opts)
         
+        ttk.Checkbutton(frame, text="使用结果缓存 (同一张图用同样的区域处理过时直接复制上次的结果)", variable=self.use_cache).grid(row=2, column=1, sticky=tk.W)
+
         start_btn = ttk.Button(frame, text="▶ 开始处理", command=self.start_processing)
-        start_btn.grid(row=2, column=1, pady=20, ipadx=20, ipady=5)
+        start_btn.grid(row=3, column=1, pady=20, ipadx=20, ipady=5)
         
         frame.columnconfigure(1, weight=1)
         
@@ -445,7 +505,8 @@ class MainApp:
             messagebox.showinfo("提示", "没有找到图片文件。")
             return
             
-        InteractiveProcessorWindow(self.root, files, output_dir)
+        cache = ResultCache() if self.use_cache.get() else None
+        InteractiveProcessorWindow(self.root, files, output_dir, cache=cache)
 
 if __name__ == "__main__":
     root = ThemedTk(theme="arc")
@@ -0,0 +1,207 @@
+# font_index.py
+# 系统字体索引：字体族/字形 -> 字体文件路径和度量。
+# 索引保存在磁盘上，启动时直接读取，不必等待遍历字体目录；
+# 后台线程按目录修改时间增量刷新，只重新读取有变化的目录中新增或改动的字体文件。
+import json
+import os
+import platform
+import threading
+from PIL import ImageFont
+
+INDEX_VERSION = 1
+FONT_EXTENSIONS = ('.ttf', '.otf', '.ttc', '.otc')
+COLLECTION_EXTENSIONS = ('.ttc', '.otc') # 一个文件中包含多个字体
+METRICS_SIZE = 1000 # 度量按每 em 1000 单位保存
+PREFERRED_STYLES = ("Regular", "Normal", "Book", "Roman", "Medium")
+
+
+def default_font_dirs():
+    """各平台的系统字体和用户字体目录"""
+    if platform.system() == "Windows":
+        return [
+            os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
+            os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft\\Windows\\Fonts")
+        ]
+    elif platform.system() == "Darwin": # macOS
+        return [
+            "/System/Library/Fonts",
+            "/Library/Fonts",
+            os.path.expanduser("~/Library/Fonts")
+        ]
+    else: # Linux
+        return [
+            "/usr/share/fonts",
+            "/usr/local/share/fonts",
+            os.path.expanduser("~/.local/share/fonts")
+        ]
+
+
+def default_index_path():
+    """索引文件放在用户缓存目录下，环境变量 QIANZI_FONT_INDEX 可指定其他位置"""
+    path = os.environ.get("QIANZI_FONT_INDEX")
+    if path:
+        return path
+    base = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "qianzi", "font_index.json")
+
+
+def read_font_faces(path):
+    """读取字体文件中的所有字体，返回 [{family, style, index, ascent, descent}]，读不了时返回空列表"""
+    faces = []
+    index = 0
+    while True:
+        try:
+            font = ImageFont.truetype(path, METRICS_SIZE, index=index)
+            family, style = font.getname()
+            ascent, descent = font.getmetrics()
+        except Exception:
+            # 损坏的文件，或者字体集合中已经没有更多字体
+            break
+        faces.append({"family": family, "style": style, "index": index, "ascent": ascent, "descent": descent})
+        if not path.lower().endswith(COLLECTION_EXTENSIONS):
+            break
+        index += 1
+    return faces
+
+
+class FontIndex:
+    """
+    持久化的字体索引。load() 读取磁盘上的索引，refresh() 遍历字体目录并增量更新，
+    families() / find() 只查内存中的字典。可以在后台线程中 refresh，查询不受影响。
+    """
+
+    def __init__(self, path=None, font_dirs=None):
+        self.path = path or default_index_path()
+        self.font_dirs = font_dirs or default_font_dirs()
+        self._dirs = {} # 目录 -> {"mtime", "subdirs", "files": {文件名: {"mtime", "size", "faces"}}}
+        self._families = {} # 字体族 -> {字形: {"path", "index", "ascent", "descent"}}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load(self):
+        """读取磁盘上的索引 (没有或版本不符时为空)，只读一次"""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION:
+            return
+        dirs = data.get("dirs", {})
+        families = self._build_lookup(dirs)
+        with self._lock:
+            self._dirs, self._families = dirs, families
+
+    def save(self):
+        """先写临时文件再替换，中途退出不会留下损坏的索引"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with self._lock:
+            data = {"version": INDEX_VERSION, "dirs": self._dirs}
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _build_lookup(dirs):
+        families = {}
+        for dir_path, entry in sorted(dirs.items()):
+            for name, info in sorted(entry["files"].items()):
+                for face in info["faces"]:
+                    styles = families.setdefault(face["family"], {})
+                    # 同名字体出现在多个目录时保留先找到的
+                    styles.setdefault(face["style"], {
+                        "path": os.path.join(dir_path, name), "index": face["index"],
+                        "ascent": face["ascent"], "descent": face["descent"],
+                    })
+        return families
+
+    def _scan_dir(self, path, old_dirs, new_dirs):
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return
+        old = old_dirs.get(path)
+        if old is not None and old["mtime"] == mtime:
+            # 目录内容 (增删改名) 没变，沿用上次的结果，不必列目录和读字体
+            entry = old
+        else:
+            subdirs, files = [], {}
+            old_files = old["files"] if old is not None else {}
+            try:
+                with os.scandir(path) as it:
+                    for item in it:
+                        if item.is_dir():
+                            subdirs.append(item.name)
+                        elif item.name.lower().endswith(FONT_EXTENSIONS):
+                            st = item.stat()
+                            prev = old_files.get(item.name)
+                            if prev is not None and prev["mtime"] == st.st_mtime and prev["size"] == st.st_size:
+                                files[item.name] = prev
+                            else:
+                                files[item.name] = {"mtime": st.st_mtime, "size": st.st_size,
+                                                    "faces": read_font_faces(item.path)}
+            except OSError:
+                return
+            entry = {"mtime": mtime, "subdirs": sorted(subdirs), "files": files}
+        new_dirs[path] = entry
+        for name in entry["subdirs"]:
+            self._scan_dir(os.path.join(path, name), old_dirs, new_dirs)
+
+    def refresh(self):
+        """遍历字体目录，更新有变化的部分并保存。返回索引是否有变化"""
+        self.load()
+        with self._lock:
+            old_dirs = self._dirs
+        new_dirs = {}
+        for font_dir in self.font_dirs:
+            if font_dir and os.path.isdir(font_dir):
+                self._scan_dir(os.path.abspath(font_dir), old_dirs, new_dirs)
+        if new_dirs == old_dirs:
+            return False
+        families = self._build_lookup(new_dirs)
+        with self._lock:
+            self._dirs, self._families = new_dirs, families
+        try:
+            self.save()
+        except OSError as e:
+            print(f"保存字体索引失败: {e}")
+        return True
+
+    def refresh_async(self, on_done=None):
+        """
+        在后台线程中刷新索引。有变化时在该线程中调用 on_done(families())，
+        界面程序应通过信号回到界面线程。
+        """
+        def run():
+            if self.refresh() and on_done is not None:
+                on_done(self.families())
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def families(self):
+        """所有字体族名称，按名称排序"""
+        self.load()
+        with self._lock:
+            return sorted(self._families)
+
+    def find(self, family, style=None):
+        """
+        查找字体，返回 {"path", "index", "ascent", "descent"}，没有时返回 None。
+        不指定字形或没有该字形时，优先取常规字形。
+        """
+        self.load()
+        with self._lock:
+            styles = self._families.get(family)
+            if not styles:
+                return None
+            if style in styles:
+                return styles[style]
+            for preferred in PREFERRED_STYLES:
+                if preferred in styles:
+                    return styles[preferred]
+            return next(iter(styles.values()))
@@ -0,0 +1,42 @@
+# history_manager.py
+import copy
+
+class HistoryManager:
+    def __init__(self):
+        self.history = []
+        self.current_state_index = -1
+
+    def save_state(self, state):
+        """保存当前状态到历史记录"""
+        # 移除当前索引之后的所有“未来”状态（如果进行了撤销后又进行了新操作）
+        if self.current_state_index < len(self.history) - 1:
+            self.history = self.history[:self.current_state_index + 1]
+        
+        # 深度拷贝状态，确保修改不会影响历史记录
+        self.history.append(copy.deepcopy(state))
+        self.current_state_index = len(self.history) - 1
+        # print(f"状态已保存。当前历史记录长度: {len(self.history)}, 索引: {self.current_state_index}")
+
+    def undo(self):
+        """撤销到上一个状态"""
+        if self.current_state_index > 0:
+            self.current_state_index -= 1
+            # print(f"执行撤销。新索引: {self.current_state_index}")
+            return copy.deepcopy(self.history[self.current_state_index])
+        # print("无法撤销，已是最初状态。")
+        return None
+
+    def redo(self):
+        """重做到下一个状态"""
+        if self.current_state_index < len(self.history) - 1:
+            self.current_state_index += 1
+            # print(f"执行重做。新索引: {self.current_state_index}")
+            return copy.deepcopy(self.history[self.current_state_index])
+        # print("无法重做，已是最新状态。")
+        return None
+
+    def clear(self):
+        """清空所有历史记录"""
+        self.history = []
+        self.current_state_index = -1
+        # print("历史记录已清空。")
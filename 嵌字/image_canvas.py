@@ -4,7 +4,7 @@ import cairo
 import os
 from PyQt5.QtWidgets import QWidget, QMessageBox, QApplication
 from PyQt5.QtGui import QPixmap, QImage, QPainter, QMouseEvent, QWheelEvent, QCursor
-from PyQt5.QtCore import Qt, QPoint, QRect, QSize, pyqtSignal, QTimer
+from PyQt5.QtCore import Qt, QPoint, QRect, QRectF, QSize, pyqtSignal, QTimer
 from text_box import TextBox
 from utils import pil_to_qimage, qimage_to_pil, get_font_path
 
@@ -70,6 +70,31 @@ class ImageCanvas(QWidget):
         self.selected_text_boxes = []
         self.update()
 
+    def _display_origin(self):
+        """图片左上角在画布上的位置 (居中显示再加上平移量)"""
+        img_width = self.inpaint_image.width() * self.zoom_factor
+        img_height = self.inpaint_image.height() * self.zoom_factor
+        display_x = (self.width() - img_width) / 2 + self.offset_x
+        display_y = (self.height() - img_height) / 2 + self.offset_y
+        return display_x, display_y
+
+    def _text_box_screen_rect(self, tb):
+        """文本框的文字、边框和控制点在画布上占的区域，用于局部重绘"""
+        rect = tb.handles_bounding_rect()
+        ink = tb.ink_rect()
+        if ink is not None:
+            rect = rect.united(ink)
+        display_x, display_y = self._display_origin()
+        screen_rect = QRectF(display_x + rect.x() * self.zoom_factor, display_y + rect.y() * self.zoom_factor,
+                             rect.width() * self.zoom_factor, rect.height() * self.zoom_factor)
+        return screen_rect.toAlignedRect().adjusted(-2, -2, 2, 2)
+
+    def _text_boxes_screen_rect(self, text_boxes):
+        rect = QRect()
+        for tb in text_boxes:
+            rect = rect.united(self._text_box_screen_rect(tb))
+        return rect
+
     def paintEvent(self, event):
         """绘制事件，负责所有绘图操作"""
         painter = QPainter(self)
@@ -85,54 +110,54 @@ class ImageCanvas(QWidget):
         img_height = self.inpaint_image.height() * self.zoom_factor
 
         # 居中显示图片
-        display_x = (self.width() - img_width) / 2 + self.offset_x
-        display_y = (self.height() - img_height) / 2 + self.offset_y
+        display_x, display_y = self._display_origin()
         display_rect = QRect(int(display_x), int(display_y), int(img_width), int(img_height))
 
+        # 拖动文本框时只重绘改动前后所在的区域 (event.rect())，底图也只画这一部分
+        target = QRectF(event.rect()).intersected(QRectF(display_rect))
+        if target.isEmpty():
+            return
+        scale_x = self.inpaint_image.width() / display_rect.width()
+        scale_y = self.inpaint_image.height() / display_rect.height()
+        source = QRectF((target.x() - display_rect.x()) * scale_x, (target.y() - display_rect.y()) * scale_y,
+                        target.width() * scale_x, target.height() * scale_y)
+
         # 绘制去字后的图片
-        painter.drawImage(display_rect, self.inpaint_image)
+        painter.drawImage(target, self.inpaint_image, source)
 
         # 绘制原始图片（作为透明参考）
         if self.original_image and self.original_image_opacity > 0:
             painter.setOpacity(self.original_image_opacity)
-            painter.drawImage(display_rect, self.original_image)
+            painter.drawImage(target, self.original_image, source)
             painter.setOpacity(1.0) # 恢复不透明度
 
-        # 将QPainter的绘图上下文转换为PyCairo上下文
-        # 这种方法允许PyCairo在QImage上绘制，然后QImage再由QPainter绘制到QWidget
-        # 或者直接在QPainter的设备上获取PyCairo上下文
-        # 考虑到性能和兼容性，直接在QPainter上操作可能更直接，但PyCairo的文本渲染更强大
-        # 这里我们创建一个临时的QImage，用Cairo绘制，再用QPainter绘制这个QImage
-        if self.inpaint_image:
-            # 创建一个与inpaint_image相同大小的QImage用于Cairo绘制文本
-            # 确保QImage格式兼容Cairo
-            temp_image = QImage(self.inpaint_image.size(), QImage.Format_ARGB32_Premultiplied)
-            temp_image.fill(Qt.transparent) # 填充透明
-
-            # 获取Cairo上下文
-            # Cairo需要一个PyQt5的QImage对象，并且格式必须是Format_ARGB32_Premultiplied
-            cairo_surface = cairo.ImageSurface.create_for_data(
-                temp_image.bits().as_buffer(temp_image.byteCount()),
-                cairo.FORMAT_ARGB32,
-                temp_image.width(),
-                temp_image.height(),
-                temp_image.bytesPerLine()
-            )
-            ctx = cairo.Context(cairo_surface)
-
-            # 缩放和偏移Cairo上下文以匹配图片显示
-            ctx.translate(-display_x / self.zoom_factor, -display_y / self.zoom_factor)
-            ctx.scale(1.0 / self.zoom_factor, 1.0 / self.zoom_factor)
-
-            # 绘制所有文本框
-            for tb in self.text_boxes:
-                # 仅在选中或拖动时绘制边框和控制点
-                draw_handles = tb in self.selected_text_boxes or \
-                               (self.current_mode in ["drag", "resize", "rotate"] and self.selected_text_boxes and tb == self.selected_text_boxes[0])
-                tb.draw(ctx, draw_handles=draw_handles)
-
-            # 将Cairo绘制的QImage绘制到QPainter上
-            painter.drawImage(display_rect, temp_image)
+        # 文字层：每个文本框的文字按屏幕分辨率 (缩放比例 x 设备像素比) 画成位图并缓存 (TextBox.rasterize)，
+        # 只画窗口内看得见的部分，耗时与窗口大小有关，与页面大小无关；按图片分辨率绘制只在保存时进行。
+        # 这里只把与重绘区域相交的位图贴上去，只有属性或缩放改变的文本框才会重新绘制
+        dpr = self.devicePixelRatioF()
+        visible = QRectF((-display_x) / self.zoom_factor, (-display_y) / self.zoom_factor,
+                         self.width() / self.zoom_factor, self.height() / self.zoom_factor)
+        painter.save()
+        painter.setClipRect(target)
+        for tb in self.text_boxes:
+            raster = tb.rasterize(self.zoom_factor * dpr, visible)
+            if raster is None:
+                continue
+            image, rect = raster
+            screen_rect = QRectF(display_x + rect.x() * self.zoom_factor, display_y + rect.y() * self.zoom_factor,
+                                 rect.width() * self.zoom_factor, rect.height() * self.zoom_factor)
+            if screen_rect.intersects(target):
+                painter.drawImage(screen_rect, image)
+        painter.restore()
+
+        painter.save()
+        painter.translate(display_x, display_y)
+        painter.scale(self.zoom_factor, self.zoom_factor)
+        # 仅在选中时绘制边框和控制点
+        for tb in self.selected_text_boxes:
+            if tb in self.text_boxes:
+                tb.paint_handles(painter)
+        painter.restore()
 
     def mousePressEvent(self, event: QMouseEvent):
         """鼠标按下事件"""
@@ -230,16 +255,18 @@ class ImageCanvas(QWidget):
             delta_x = mouse_point_img.x() - self.drag_offset.x()
             delta_y = mouse_point_img.y() - self.drag_offset.y()
 
-            # 移动所有选中的文本框
+            # 移动所有选中的文本框，只重绘它们移动前后所在的区域
+            dirty = self._text_boxes_screen_rect(self.selected_text_boxes)
             for tb in self.selected_text_boxes:
                 tb.set_pos(tb._drag_start_pos.x() + delta_x, tb._drag_start_pos.y() + delta_y)
-            self.update()
+            self.update(dirty.united(self._text_boxes_screen_rect(self.selected_text_boxes)))
 
         elif self.current_mode == "resize" and self.selected_text_boxes and self.resizing_handle:
             # 调整大小
             tb = self.selected_text_boxes[0] # 只调整第一个选中的文本框
+            dirty = self._text_box_screen_rect(tb)
             tb.resize_from_handle(mouse_point_img, self.resizing_handle, self.zoom_factor)
-            self.update()
+            self.update(dirty.united(self._text_box_screen_rect(tb)))
 
         elif self.current_mode == "rotate" and self.selected_text_boxes:
             # 旋转
@@ -248,8 +275,9 @@ class ImageCanvas(QWidget):
             dy = mouse_point_img.y() - self.rotating_center.y()
             current_angle = (180 / 3.14159) * cairo.Context.atan2(dy, dx)
             rotation_delta = current_angle - self.rotation_start_angle
+            dirty = self._text_box_screen_rect(tb)
             tb.rotation = (self.rotation_start_value + rotation_delta) % 360
-            self.update()
+            self.update(dirty.united(self._text_box_screen_rect(tb)))
 
         else:
             # 鼠标样式反馈
@@ -8,7 +8,7 @@ from PyQt5.QtWidgets import (
     QSlider, QPushButton, QFileDialog, QMessageBox, QSizePolicy, QAction,
     QShortcut
 )
-from PyQt5.QtCore import Qt, QSize, QTimer
+from PyQt5.QtCore import Qt, QSize, QTimer, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage, QPainter, QKeySequence
 
 # 导入自定义模块
@@ -16,9 +16,11 @@ from image_canvas import ImageCanvas
 from ui_panels import TextPropertiesPanel, ThumbnailPanel
 from history_manager import HistoryManager
 from text_box import TextBox
-from utils import get_system_fonts, load_image_paths, create_required_dirs, save_image_with_text
+from utils import get_system_fonts, refresh_font_index, load_image_paths, create_required_dirs, save_image_with_text
 
 class MainWindow(QMainWindow):
+    fonts_updated = pyqtSignal(list) # 后台刷新字体索引完成 (从后台线程发出)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("轻量化漫画嵌字软件")
@@ -36,6 +38,10 @@ class MainWindow(QMainWindow):
         self._init_ui()
         self._init_shortcuts()
 
+        # 字体列表先用磁盘上的索引，启动时不遍历字体目录；后台增量刷新，有新字体时再更新面板
+        self.fonts_updated.connect(self.text_properties_panel.set_system_fonts)
+        refresh_font_index(self.fonts_updated.emit)
+
     def _init_ui(self):
         # 创建中央小部件和主布局
         central_widget = QWidget()
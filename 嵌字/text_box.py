@@ -1,9 +1,32 @@
 
 # text_box.py
 import cairo
+import json
 import math
-from PyQt5.QtCore import QPoint, QRect, QSize
-from utils import get_font_path
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QPoint, QPointF, QRect, QRectF, QSize
+from PyQt5.QtGui import QImage, QColor, QPen
+from text_layout import layout_text
+
+# 文字缓存分两级，键都不含位置，移动文本框不需要重新绘制；撤销/重做时重建的 TextBox 属性相同，也能直接取用。
+# 录制缓存：按属性保存 Cairo 录制的矢量绘制结果和墨迹范围，排版只做一次；
+# 位图缓存：按 (属性, 缩放, 裁剪) 保存回放成的位图，预览时按屏幕分辨率回放，与页面分辨率无关
+RECORDING_CACHE_SIZE = 256
+RASTER_CACHE_SIZE = 128
+_recording_cache = OrderedDict()
+_raster_cache = OrderedDict()
+
+
+def _cached(cache, key, create, max_items):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = cache[key] = create()
+    while len(cache) > max_items:
+        cache.popitem(last=False)
+    return value
+
+HANDLE_SIZE = 8 # 控制点边长 (图片坐标)
 
 class TextBox:
     def __init__(self, x, y, width, height, text="",
@@ -84,6 +107,12 @@ class TextBox:
         ctx: Cairo 上下文
         draw_handles: 是否绘制边框和控制点
         """
+        self.draw_text(ctx)
+        if draw_handles:
+            self.draw_handles(ctx)
+
+    def draw_text(self, ctx: cairo.Context):
+        """只绘制文字 (含描边和阴影)，不绘制边框和控制点"""
         ctx.save() # 保存当前上下文状态
 
         # 移动到文本框中心，然后旋转
@@ -93,110 +122,164 @@ class TextBox:
         ctx.rotate(math.radians(self.rotation))
         ctx.translate(-center_x, -center_y) # 移回原点，但现在是旋转后的坐标系
 
-        # 设置字体
-        # PyCairo的select_font_face需要字体文件名或系统名称
-        # 这里尝试使用系统字体路径，如果找不到，则回退到通用字体
-        font_path = get_font_path(self.font_name)
-        if font_path and os.path.exists(font_path):
-            ctx.set_font_face(cairo.ToyFontFace(self.font_name))
-        else:
-            ctx.select_font_face(self.font_name,
-                                 cairo.FONT_SLANT_NORMAL,
-                                 cairo.FONT_WEIGHT_NORMAL)
-
-        ctx.set_font_size(self.font_size)
-
-        # 应用水平和垂直缩放
-        # 注意：PyCairo的scale会影响所有后续绘制，包括描边宽度
-        # 更好的做法是计算缩放后的字体度量，或者在绘制文本后再应用描边
-        # 这里简化处理，直接在绘制前缩放
+        # 应用水平和垂直缩放 (描边宽度和阴影偏移也随之缩放)，原点移到文本框左上角
         ctx.translate(self.x, self.y)
         ctx.scale(self.h_scale, self.v_scale)
-        ctx.translate(-self.x, -self.y)
-
-        # 计算文本布局
-        lines = self.text.split('\n')
-        current_y = self.y + self.font_size # 初始Y位置
-
-        for line_idx, line in enumerate(lines):
-            if self.is_vertical:
-                # 竖排文本（每个字符旋转并堆叠）
-                current_x_vertical = self.x + self.width - self.font_size # 从右往左写
-                for char_idx, char in enumerate(line):
-                    # 绘制阴影
-                    if self.shadow_color[3] > 0: # 检查alpha
-                        ctx.set_source_rgba(*self.shadow_color)
-                        ctx.move_to(current_x_vertical + self.shadow_offset[0],
-                                    current_y + self.shadow_offset[1] + char_idx * (self.font_size + self.char_spacing))
-                        ctx.show_text(char)
-
-                    # 绘制描边
-                    if self.stroke_width > 0:
-                        ctx.set_source_rgba(*self.stroke_color)
-                        ctx.set_line_width(self.stroke_width)
-                        ctx.text_path(char)
-                        ctx.stroke_preserve() # 保持路径，用于填充
-
-                    # 绘制文本
-                    ctx.set_source_rgba(*self.color)
-                    ctx.move_to(current_x_vertical, current_y + char_idx * (self.font_size + self.char_spacing))
-                    ctx.show_text(char)
-                current_y += (self.font_size + self.char_spacing) * len(line) * self.line_spacing # 下一行偏移
-            else:
-                # 横排文本
-                text_extents = ctx.text_extents(line)
-                # 计算文本在文本框内居中
-                text_x = self.x + (self.width / self.h_scale - text_extents.width) / 2
-                text_y = current_y
-
-                # 绘制阴影
-                if self.shadow_color[3] > 0:
-                    ctx.set_source_rgba(*self.shadow_color)
-                    ctx.move_to(text_x + self.shadow_offset[0], text_y + self.shadow_offset[1])
-                    ctx.show_text(line)
-
-                # 绘制描边
-                if self.stroke_width > 0:
-                    ctx.set_source_rgba(*self.stroke_color)
-                    ctx.set_line_width(self.stroke_width)
-                    ctx.move_to(text_x, text_y)
-                    ctx.text_path(line)
-                    ctx.stroke_preserve() # 保持路径，用于填充
-
-                # 绘制文本
-                ctx.set_source_rgba(*self.color)
-                ctx.move_to(text_x, text_y)
-                ctx.show_text(line)
-
-                current_y += (self.font_size * self.v_scale * self.line_spacing) # 计算下一行Y位置
 
-        ctx.restore() # 恢复上下文状态（移除旋转和缩放）
+        # 排版结果按 (文字, 字体, 字号, 间距, 方向, 缩放, 宽度) 缓存，这里只按字形列表绘制
+        layout = layout_text(self.text, self.font_name, self.font_size, self.char_spacing, self.line_spacing,
+                             self.is_vertical, self.h_scale, self.v_scale, self.width)
+        ctx.set_font_face(layout.face)
+        ctx.set_font_size(self.font_size)
 
-        if draw_handles:
-            # 绘制文本框边框和控制点
+        # 绘制阴影
+        if self.shadow_color[3] > 0: # 检查alpha
             ctx.save()
-            # 再次应用旋转，因为边框和句柄也需要旋转
-            ctx.translate(center_x, center_y)
-            ctx.rotate(math.radians(self.rotation))
-            ctx.translate(-center_x, -center_y)
-
-            # 绘制边框
-            ctx.set_source_rgba(0, 0.5, 1, 0.8) # 蓝色半透明
-            ctx.set_line_width(2)
-            ctx.rectangle(self.x, self.y, self.width, self.height)
+            ctx.translate(*self.shadow_offset)
+            ctx.set_source_rgba(*self.shadow_color)
+            ctx.show_glyphs(layout.glyphs)
+            ctx.restore()
+
+        # 绘制描边
+        if self.stroke_width > 0:
+            ctx.set_source_rgba(*self.stroke_color)
+            ctx.set_line_width(self.stroke_width)
+            ctx.append_path(layout.path())
             ctx.stroke()
 
-            # 绘制控制点
-            handle_size = 8
-            handles = self.get_handles_rects(handle_size)
-            for handle_name, rect in handles.items():
-                if handle_name == "rotate":
-                    ctx.set_source_rgba(1, 0, 0, 1) # 红色旋转点
-                else:
-                    ctx.set_source_rgba(0.8, 0.8, 0.8, 1) # 灰色控制点
-                ctx.rectangle(rect.x(), rect.y(), rect.width(), rect.height())
-                ctx.fill()
-            ctx.restore()
+        # 绘制文本
+        ctx.set_source_rgba(*self.color)
+        ctx.show_glyphs(layout.glyphs)
+
+        ctx.restore() # 恢复上下文状态（移除旋转和缩放）
+
+    def draw_handles(self, ctx: cairo.Context):
+        """绘制文本框边框和控制点"""
+        center_x = self.x + self.width / 2
+        center_y = self.y + self.height / 2
+
+        # 绘制边框 (边框需要旋转)
+        ctx.save()
+        ctx.translate(center_x, center_y)
+        ctx.rotate(math.radians(self.rotation))
+        ctx.translate(-center_x, -center_y)
+        ctx.set_source_rgba(0, 0.5, 1, 0.8) # 蓝色半透明
+        ctx.set_line_width(2)
+        ctx.rectangle(self.x, self.y, self.width, self.height)
+        ctx.stroke()
+        ctx.restore()
+
+        # 绘制控制点 (get_handles_rects 返回的已经是旋转后的位置，与点击检测一致)
+        for handle_name, rect in self.get_handles_rects(HANDLE_SIZE).items():
+            if handle_name == "rotate":
+                ctx.set_source_rgba(1, 0, 0, 1) # 红色旋转点
+            else:
+                ctx.set_source_rgba(0.8, 0.8, 0.8, 1) # 灰色控制点
+            ctx.rectangle(rect.x(), rect.y(), rect.width(), rect.height())
+            ctx.fill()
+
+    def paint_handles(self, painter):
+        """用 QPainter 绘制边框和控制点，painter 需已变换到图片坐标系，效果与 draw_handles 相同"""
+        center_x = self.x + self.width / 2
+        center_y = self.y + self.height / 2
+
+        painter.save()
+        painter.translate(center_x, center_y)
+        painter.rotate(self.rotation)
+        painter.translate(-center_x, -center_y)
+        painter.setPen(QPen(QColor.fromRgbF(0, 0.5, 1, 0.8), 2))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(QRectF(self.x, self.y, self.width, self.height))
+        painter.restore()
+
+        for handle_name, rect in self.get_handles_rects(HANDLE_SIZE).items():
+            color = QColor.fromRgbF(1, 0, 0, 1) if handle_name == "rotate" else QColor.fromRgbF(0.8, 0.8, 0.8, 1)
+            painter.fillRect(rect, color)
+
+    def handles_bounding_rect(self):
+        """边框和控制点在图片坐标系中占的区域 (含线宽)"""
+        points = [rect.center() for rect in self.get_handles_rects(HANDLE_SIZE).values()]
+        xs = [p.x() for p in points]
+        ys = [p.y() for p in points]
+        margin = HANDLE_SIZE
+        return QRectF(min(xs) - margin, min(ys) - margin,
+                      max(xs) - min(xs) + 2 * margin, max(ys) - min(ys) + 2 * margin)
+
+    def raster_key(self):
+        """影响文字外观的属性，用作位图缓存的键。位置只保留小数部分 (影响亚像素渲染)"""
+        props = self.to_dict()
+        props["x"] = round(self.x - math.floor(self.x), 3)
+        props["y"] = round(self.y - math.floor(self.y), 3)
+        return json.dumps(props, sort_keys=True, ensure_ascii=False)
+
+    def _recording(self):
+        # 画到无边界的录制表面上，得到墨迹范围 (文字可能超出文本框)。
+        # 坐标以位置的整数部分为原点，这样同样属性的文本框移动后可以直接复用
+        def record():
+            recording = cairo.RecordingSurface(cairo.CONTENT_COLOR_ALPHA, None)
+            ctx = cairo.Context(recording)
+            ctx.translate(-math.floor(self.x), -math.floor(self.y))
+            self.draw_text(ctx)
+            ink_x, ink_y, ink_w, ink_h = recording.ink_extents()
+            if ink_w <= 0 or ink_h <= 0:
+                return None
+            return recording, QRectF(ink_x, ink_y, ink_w, ink_h)
+        return _cached(_recording_cache, self.raster_key(), record, RECORDING_CACHE_SIZE)
+
+    def ink_rect(self):
+        """文字实际占的区域 (图片坐标)，没有可见的文字时返回 None"""
+        entry = self._recording()
+        if entry is None:
+            return None
+        return entry[1].translated(math.floor(self.x), math.floor(self.y))
+
+    def rasterize(self, scale=1.0, visible=None):
+        """
+        返回 (QImage, QRectF)：只含文字的位图 (不含边框和控制点) 及其对应的图片坐标区域；
+        没有需要显示的文字时返回 None。
+        scale 为每个图片像素对应的位图像素数，预览时传入缩放比例乘以设备像素比，按屏幕分辨率绘制；
+        visible 为图片坐标中的可见区域，文字超出可见区域时只绘制可见的部分。
+        属性没变时直接取缓存，缩放改变时从录制结果回放，不必重新排版。
+        """
+        entry = self._recording()
+        if entry is None:
+            return None
+        recording, ink = entry
+        origin_x, origin_y = math.floor(self.x), math.floor(self.y)
+        region = ink
+        if visible is not None:
+            region = region.intersected(visible.translated(-origin_x, -origin_y))
+            if region.isEmpty():
+                return None
+
+        # 位图像素网格相对于文本框原点对齐，移动文本框时位图不变
+        x0, y0 = math.floor(region.left() * scale), math.floor(region.top() * scale)
+        x1, y1 = math.ceil(region.right() * scale), math.ceil(region.bottom() * scale)
+        clip = None if region == ink else (x0, y0, x1, y1)
+        key = (self.raster_key(), round(scale, 6), clip)
+        image = _cached(_raster_cache, key, lambda: self._replay(recording, scale, x0, y0, x1 - x0, y1 - y0),
+                        RASTER_CACHE_SIZE)
+        return image, QRectF(origin_x + x0 / scale, origin_y + y0 / scale, (x1 - x0) / scale, (y1 - y0) / scale)
+
+    @staticmethod
+    def _replay(recording, scale, x0, y0, width, height):
+        # 把录制结果按 scale 回放到位图上，位图左上角对应回放后的 (x0, y0)
+        image = QImage(max(1, width), max(1, height), QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+        surface = cairo.ImageSurface.create_for_data(
+            image.bits().as_buffer(image.byteCount()),
+            cairo.FORMAT_ARGB32,
+            image.width(),
+            image.height(),
+            image.bytesPerLine()
+        )
+        ctx = cairo.Context(surface)
+        ctx.translate(-x0, -y0)
+        ctx.scale(scale, scale)
+        ctx.set_source_surface(recording, 0, 0)
+        ctx.paint()
+        surface.finish()
+        return image
 
     def contains_point(self, point: QPoint):
         """检查点是否在文本框内（考虑旋转）"""
@@ -226,11 +309,11 @@ class TextBox:
         # 句柄位置是相对于文本框的，然后整个文本框旋转
         # 我们可以先计算未旋转时的句柄位置，然后将其旋转
         handles = {
-            "top_left": QPoint(self.x, self.y),
-            "top_right": QPoint(self.x + self.width, self.y),
-            "bottom_left": QPoint(self.x, self.y + self.height),
-            "bottom_right": QPoint(self.x + self.width, self.y + self.height),
-            "rotate": QPoint(self.x + self.width / 2, self.y - 20) # 旋转手柄在顶部中间稍微上方
+            "top_left": QPointF(self.x, self.y),
+            "top_right": QPointF(self.x + self.width, self.y),
+            "bottom_left": QPointF(self.x, self.y + self.height),
+            "bottom_right": QPointF(self.x + self.width, self.y + self.height),
+            "rotate": QPointF(self.x + self.width / 2, self.y - 20) # 旋转手柄在顶部中间稍微上方
         }
 
         rotated_handles = {}
@@ -255,8 +338,8 @@ class TextBox:
             rotated_handles[name] = QRect(
                 int(final_x - half_handle),
                 int(final_y - half_handle),
-                handle_size,
-                handle_size
+                math.ceil(handle_size), # 点击检测时按缩放换算，可能是小数
+                math.ceil(handle_size)
             )
         return rotated_handles
 
@@ -0,0 +1,66 @@
+# text_layout.py
+# 文本排版缓存：同样的文字、字体和排版参数只排一次版，之后直接用字形列表绘制
+import cairo
+from functools import lru_cache
+
+LAYOUT_CACHE_SIZE = 512
+
+
+@lru_cache(maxsize=None)
+def font_face(font_name):
+    """按名称取字体 (常规字重、不倾斜)，同一字体只创建一次"""
+    return cairo.ToyFontFace(font_name, cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_NORMAL)
+
+
+class TextLayout:
+    """
+    排好版的文字：glyphs 为字形及其位置，坐标相对于文本框左上角，且未经 h_scale / v_scale 缩放。
+    描边用的字形轮廓路径在第一次需要时生成并保存。
+    """
+
+    def __init__(self, font_name, font_size, glyphs):
+        self.face = font_face(font_name)
+        self.font_size = font_size
+        self.glyphs = glyphs
+        self._path = None
+
+    def path(self):
+        """全部字形的轮廓路径，与 glyphs 使用同样的坐标"""
+        if self._path is None:
+            ctx = cairo.Context(cairo.RecordingSurface(cairo.CONTENT_ALPHA, None))
+            ctx.set_font_face(self.face)
+            ctx.set_font_size(self.font_size)
+            ctx.glyph_path(self.glyphs)
+            self._path = ctx.copy_path()
+        return self._path
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def layout_text(text, font_name, font_size, char_spacing, line_spacing, is_vertical, h_scale, v_scale, width):
+    """
+    按 TextBox 的排版规则排版，返回 TextLayout。
+    横排每行在文本框内水平居中；竖排每个字符依次向下排列。
+    度量不做微调 (hint)，排版结果与显示缩放无关，预览和导出一致。
+    """
+    options = cairo.FontOptions()
+    options.set_hint_metrics(cairo.HINT_METRICS_OFF)
+    scaled_font = cairo.ScaledFont(font_face(font_name), cairo.Matrix(xx=font_size, yy=font_size),
+                                   cairo.Matrix(), options)
+
+    glyphs = []
+    current_y = font_size # 初始Y位置
+    for line in text.split('\n'):
+        if is_vertical:
+            # 竖排文本（每个字符堆叠）
+            x = width - font_size # 从右往左写
+            for char_idx, char in enumerate(line):
+                glyphs.extend(scaled_font.text_to_glyphs(x, current_y + char_idx * (font_size + char_spacing),
+                                                         char, False))
+            current_y += (font_size + char_spacing) * len(line) * line_spacing # 下一行偏移
+        else:
+            # 横排文本，在文本框内居中
+            extents = scaled_font.text_extents(line)
+            x = (width / h_scale - extents.width) / 2
+            glyphs.extend(scaled_font.text_to_glyphs(x, current_y, line, False))
+            current_y += font_size * v_scale * line_spacing # 计算下一行Y位置
+    return TextLayout(font_name, font_size, glyphs)
@@ -1,13 +1,14 @@
 
 # ui_panels.py
 import os
+import threading
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox,
     QSpinBox, QColorDialog, QLineEdit, QCheckBox, QSlider, QGroupBox,
     QScrollArea, QListWidget, QListWidgetItem, QSizePolicy
 )
-from PyQt5.QtGui import QColor, QPixmap, QImage
-from PyQt5.QtCore import Qt, QSize, pyqtSignal
+from PyQt5.QtGui import QColor, QPixmap, QImage, QIcon
+from PyQt5.QtCore import Qt, QPoint, QSize, pyqtSignal, QObject, QRunnable, QThread, QThreadPool
 
 from text_box import TextBox # 导入TextBox类
 from utils import pil_to_qimage, qimage_to_pil, get_font_path # 导入辅助函数
@@ -251,6 +252,16 @@ class TextPropertiesPanel(QWidget):
         self.char_spacing_spin.setValue(0)
         self._connect_signals()
 
+    def set_system_fonts(self, system_fonts):
+        """更新字体列表 (后台刷新字体索引后调用)，保留当前选中的字体"""
+        self.system_fonts = system_fonts
+        current_font = self.font_combo.currentText()
+        self.font_combo.blockSignals(True) # 只是换列表，不要把字体应用到文本框
+        self.font_combo.clear()
+        self.font_combo.addItems(sorted(self.system_fonts))
+        self.font_combo.setCurrentText(current_font)
+        self.font_combo.blockSignals(False)
+
     def _disconnect_signals(self):
         """断开所有控件的信号连接"""
         self.text_input.textChanged.disconnect(self._on_text_changed)
@@ -353,6 +364,46 @@ class TextPropertiesPanel(QWidget):
         self.apply_format_to_selection.emit(self._get_current_format_data())
 
 
+class ThumbnailSignals(QObject):
+    # 工作线程加载完一页后发出，由界面线程设置图标 (QPixmap 只能在界面线程中创建)
+    loaded = pyqtSignal(int, int, QImage) # (批次, 行号, 缩略图)
+
+
+def load_thumbnail_image(path, size):
+    """
+    在工作线程中生成缩略图 (QImage)。JPEG 用 draft 模式在解码时直接按 1/2~1/8 缩小，
+    其他格式由 thumbnail 先整数倍缩小再用 LANCZOS 缩放到 size 以内。
+    """
+    with Image.open(path) as img:
+        img.draft("RGB", size)
+        img = img.convert("RGB")
+    img.thumbnail(size, Image.LANCZOS)
+    data = img.tobytes("raw", "RGB")
+    # 指定每行字节数并复制一份，返回的 QImage 不再引用 data
+    return QImage(data, img.width, img.height, img.width * 3, QImage.Format_RGB888).copy()
+
+
+class ThumbnailTask(QRunnable):
+    """线程池中的一个工作项：运行时才从面板取当前最该加载的一页，滚动后可见的页面自然优先"""
+
+    def __init__(self, panel, generation):
+        super().__init__()
+        self.panel = panel
+        self.generation = generation
+
+    def run(self):
+        job = self.panel._take_pending(self.generation)
+        if job is None:
+            return
+        row, path = job
+        try:
+            image = load_thumbnail_image(path, self.panel.thumbnail_size)
+        except Exception as e:
+            print(f"加载缩略图失败: {e}")
+            image = QImage()
+        self.panel.signals.loaded.emit(self.generation, row, image)
+
+
 class ThumbnailPanel(QWidget):
     thumbnail_clicked = pyqtSignal(int) # 发送点击的索引
 
@@ -361,6 +412,18 @@ class ThumbnailPanel(QWidget):
         self.image_paths = []
         self.current_selected_index = -1
 
+        # 缩略图在线程池中生成：_pending 为还没开始加载的行号，工作线程按可见范围 _visible_rows 挑选
+        self.thumbnail_size = (120, 90)
+        self.signals = ThumbnailSignals()
+        self.signals.loaded.connect(self._on_thumbnail_loaded)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(max(1, min(4, QThread.idealThreadCount())))
+        self._generation = 0 # 每次打开文件夹加一，丢弃上一批的结果
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._visible_rows = (0, 0)
+        self._placeholder_icon = None
+
         self._init_ui()
 
     def _init_ui(self):
@@ -374,8 +437,9 @@ class ThumbnailPanel(QWidget):
         self.list_widget = QListWidget()
         self.list_widget.setFlow(QListWidget.TopToBottom) # 垂直排列
         self.list_widget.setSpacing(5) # 缩略图间距
-        self.list_widget.setIconSize(QSize(120, 90)) # 缩略图大小
+        self.list_widget.setIconSize(QSize(*self.thumbnail_size)) # 缩略图大小
         self.list_widget.itemClicked.connect(self._on_item_clicked)
+        self.list_widget.verticalScrollBar().valueChanged.connect(self._update_visible_rows)
         self.list_widget.setStyleSheet("""
             QListWidget::item:selected {
                 border: 2px solid #007bff; /* 选中边框 */
@@ -390,7 +454,7 @@ class ThumbnailPanel(QWidget):
         main_layout.addWidget(self.scroll_area)
 
     def load_thumbnails(self, image_paths):
-        """加载图片路径并创建缩略图列表项"""
+        """加载图片路径并创建缩略图列表项，缩略图在后台线程池中生成，可见的页面优先"""
         self.image_paths = image_paths
         self.list_widget.clear()
 
@@ -399,22 +463,65 @@ class ThumbnailPanel(QWidget):
             item.setText(f"第 {i+1} 页")
             item.setData(Qt.UserRole, path) # 存储原始路径
             item.setSizeHint(QSize(140, 100)) # 列表项大小
+            self._set_placeholder(item)
             self.list_widget.addItem(item)
 
-            # 异步加载缩略图以避免UI阻塞
-            self._load_thumbnail_async(item, path)
-
-    def _load_thumbnail_async(self, item, path):
-        """异步加载单个缩略图"""
-        # 这是一个简化的异步加载，实际应用中可能需要线程池
-        # 这里只是延迟加载，模拟"点击后加载"
-        # 真正的异步加载需要QThreadPool或QThread
-        # 为了演示目的，我们只在需要时生成缩略图，而不是预先加载所有
-        # 这里的thumbnail_path只是一个占位符，实际在_on_item_clicked中加载完整图片
-        pixmap = QPixmap(self.list_widget.iconSize())
-        pixmap.fill(Qt.lightGray) # 占位符
-        item.setIcon(QPixmap(pixmap))
-
+        # 丢弃上一个文件夹还在排队的任务，然后为每一页提交一个工作项
+        self.thread_pool.clear()
+        with self._pending_lock:
+            self._generation += 1
+            self._pending = set(range(len(image_paths)))
+        self._update_visible_rows()
+        for _ in image_paths:
+            self.thread_pool.start(ThumbnailTask(self, self._generation))
+
+    def _set_placeholder(self, item):
+        """缩略图生成之前先显示灰色占位图，所有列表项共用一个"""
+        if self._placeholder_icon is None:
+            pixmap = QPixmap(self.list_widget.iconSize())
+            pixmap.fill(Qt.lightGray) # 占位符
+            self._placeholder_icon = QIcon(pixmap)
+        item.setIcon(self._placeholder_icon)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self._update_visible_rows()
+
+    def _update_visible_rows(self, *args):
+        """
+        记录列表中当前可见的首末行，工作线程优先加载这些行，其次是离它们最近的。
+        只用 indexAt 查视口上下边缘处的项，滚动时的耗时与页数无关。
+        """
+        viewport = self.list_widget.viewport().rect()
+        x = viewport.center().x() # 列表项左右有间距，取中间
+        margin = self.list_widget.spacing() + 1 # 边缘正好落在两项之间的间距上时，往里挪一点再查
+        first = self.list_widget.indexAt(QPoint(x, viewport.top())).row()
+        if first < 0:
+            first = self.list_widget.indexAt(QPoint(x, viewport.top() + margin)).row()
+        last = self.list_widget.indexAt(QPoint(x, viewport.bottom())).row()
+        if last < 0:
+            last = self.list_widget.indexAt(QPoint(x, viewport.bottom() - margin)).row()
+        if last < 0:
+            # 最后一项下面是空白
+            last = self.list_widget.count() - 1
+        with self._pending_lock:
+            self._visible_rows = (max(first, 0), max(last, 0))
+
+    def _take_pending(self, generation):
+        # 在工作线程中调用：取出可见范围内 (没有时取离可见范围最近) 的一页
+        with self._pending_lock:
+            if generation != self._generation or not self._pending:
+                return None
+            first, last = self._visible_rows
+            row = min(self._pending, key=lambda r: (not first <= r <= last, abs(r - first)))
+            self._pending.discard(row)
+            return row, self.image_paths[row]
+
+    def _on_thumbnail_loaded(self, generation, row, image):
+        if generation != self._generation or row >= self.list_widget.count():
+            return
+        item = self.list_widget.item(row)
+        item.setIcon(QIcon(QPixmap.fromImage(image)) if not image.isNull() else QIcon())
 
     def _on_item_clicked(self, item):
         """处理缩略图点击事件"""
@@ -427,252 +534,6 @@ class ThumbnailPanel(QWidget):
             self.list_widget.setCurrentRow(index)
             self.current_selected_index = index
 
-            # 确保选中项可见
+            # 确保选中项可见，滚动后可见范围内还没生成的缩略图会被优先加载
             self.list_widget.scrollToItem(self.list_widget.item(index), QListWidget.EnsureVisible)
-
-            # 实际加载缩略图并更新图标
-            item = self.list_widget.item(index)
-            image_path = item.data(Qt.UserRole)
-            try:
-                # 使用Pillow加载并生成缩略图
-                img = Image.open(image_path).convert("RGB")
-                img.thumbnail((self.list_widget.iconSize().width(), self.list_widget.iconSize().height()), Image.LANCZOS)
-                qimage = pil_to_qimage(img)
-                item.setIcon(QPixmap.fromImage(qimage))
-            except Exception as e:
-                print(f"加载缩略图失败: {e}")
-                item.setIcon(QPixmap()) # 清除图标
-```python
-# history_manager.py
-import copy
-
-class HistoryManager:
-    def __init__(self):
-        self.history = []
-        self.current_state_index = -1
-
-    def save_state(self, state):
-        """保存当前状态到历史记录"""
-        # 移除当前索引之后的所有“未来”状态（如果进行了撤销后又进行了新操作）
-        if self.current_state_index < len(self.history) - 1:
-            self.history = self.history[:self.current_state_index + 1]
-        
-        # 深度拷贝状态，确保修改不会影响历史记录
-        self.history.append(copy.deepcopy(state))
-        self.current_state_index = len(self.history) - 1
-        # print(f"状态已保存。当前历史记录长度: {len(self.history)}, 索引: {self.current_state_index}")
-
-    def undo(self):
-        """撤销到上一个状态"""
-        if self.current_state_index > 0:
-            self.current_state_index -= 1
-            # print(f"执行撤销。新索引: {self.current_state_index}")
-            return copy.deepcopy(self.history[self.current_state_index])
-        # print("无法撤销，已是最初状态。")
-        return None
-
-    def redo(self):
-        """重做到下一个状态"""
-        if self.current_state_index < len(self.history) - 1:
-            self.current_state_index += 1
-            # print(f"执行重做。新索引: {self.current_state_index}")
-            return copy.deepcopy(self.history[self.current_state_index])
-        # print("无法重做，已是最新状态。")
-        return None
-
-    def clear(self):
-        """清空所有历史记录"""
-        self.history = []
-        self.current_state_index = -1
-        # print("历史记录已清空。")
-
-```python
-# utils.py
-import os
-import glob
-import shutil
-import platform
-from PyQt5.QtGui import QImage, QPixmap
-from PIL import Image, ImageDraw, ImageFont
-import cairo
-
-def get_system_fonts():
-    """获取系统可用字体列表"""
-    fonts = set()
-    if platform.system() == "Windows":
-        font_dirs = [
-            os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts"),
-            os.path.join(os.environ.get("LOCALAPPDATA", ""), "Microsoft\\Windows\\Fonts")
-        ]
-        for font_dir in font_dirs:
-            if os.path.exists(font_dir):
-                for font_file in glob.glob(os.path.join(font_dir, "*.ttf")):
-                    try:
-                        # Pillow可以用来读取字体名称
-                        font = ImageFont.truetype(font_file, 10) # 随便一个大小
-                        fonts.add(font.font_variant) # 获取字体名称
-                    except Exception:
-                        pass
-                for font_file in glob.glob(os.path.join(font_dir, "*.ttc")):
-                    try:
-                        # 对于.ttc文件，可能包含多个字体
-                        # Pillow的ImageFont.truetype可以接受index参数
-                        # 但这里简单起见，只尝试加载，如果成功就添加文件名
-                        font = ImageFont.truetype(font_file, 10)
-                        fonts.add(font.font_variant)
-                    except Exception:
-                        pass
-    elif platform.system() == "Darwin": # macOS
-        font_dirs = [
-            "/System/Library/Fonts",
-            "/Library/Fonts",
-            os.path.expanduser("~/Library/Fonts")
-        ]
-        for font_dir in font_dirs:
-            if os.path.exists(font_dir):
-                for font_file in glob.glob(os.path.join(font_dir, "*.ttf")) + glob.glob(os.path.join(font_dir, "*.otf")):
-                    try:
-                        font = ImageFont.truetype(font_file, 10)
-                        fonts.add(font.font_variant)
-                    except Exception:
-                        pass
-    else: # Linux
-        font_dirs = [
-            "/usr/share/fonts",
-            "/usr/local/share/fonts",
-            os.path.expanduser("~/.local/share/fonts")
-        ]
-        for font_dir in font_dirs:
-            if os.path.exists(font_dir):
-                for font_file in glob.glob(os.path.join(font_dir, "**/*.ttf"), recursive=True) + \
-                                 glob.glob(os.path.join(font_dir, "**/*.otf"), recursive=True):
-                    try:
-                        font = ImageFont.truetype(font_file, 10)
-                        fonts.add(font.font_variant)
-                    except Exception:
-                        pass
-    # 确保至少有一些通用字体
-    if not fonts:
-        fonts.add("Arial")
-        fonts.add("SimHei")
-        fonts.add("Times New Roman")
-    return sorted(list(fonts))
-
-# 缓存字体路径，避免重复查找
-_font_path_cache = {}
-
-def get_font_path(font_name):
-    """根据字体名称获取字体文件路径，用于PyCairo"""
-    if font_name in _font_path_cache:
-        return _font_path_cache[font_name]
-
-    # 这是一个简化的查找，实际可能需要更复杂的字体匹配逻辑
-    # PyCairo通常能直接通过字体名称找到系统字体，但如果需要精确路径，则需要查找
-    # 暂时返回None，让PyCairo尝试自行查找
-    # 如果PyCairo无法找到，可以考虑在这里实现更复杂的字体文件查找逻辑
-    # 例如：遍历get_system_fonts()找到的字体文件，并用Pillow验证其名称
-    
-    # 示例：如果需要精确路径，可以这样尝试查找
-    # for font_dir in ["C:\\Windows\\Fonts", "/System/Library/Fonts", "/Library/Fonts", "/usr/share/fonts", os.path.expanduser("~/Library/Fonts"), os.path.expanduser("~/.local/share/fonts")]:
-    #     if os.path.exists(font_dir):
-    #         for ext in ["ttf", "otf", "ttc"]:
-    #             font_file = os.path.join(font_dir, f"{font_name}.{ext}")
-    #             if os.path.exists(font_file):
-    #                 _font_path_cache[font_name] = font_file
-    #                 return font_file
-    #             # 尝试不区分大小写
-    #             font_file = os.path.join(font_dir, f"{font_name.lower()}.{ext}")
-    #             if os.path.exists(font_file):
-    #                 _font_path_cache[font_name] = font_file
-    #                 return font_file
-    #             # 尝试模糊匹配
-    #             for f in glob.glob(os.path.join(font_dir, f"*.{ext}")):
-    #                 try:
-    #                     pil_font = ImageFont.truetype(f, 10)
-    #                     if font_name.lower() in pil_font.font_variant.lower():
-    #                         _font_path_cache[font_name] = f
-    #                         return f
-    #                 except Exception:
-    #                     pass
-    
-    return None # PyCairo通常能直接通过名称找到，无需精确路径
-
-def load_image_paths(folder_path):
-    """加载文件夹中所有支持的图片文件路径"""
-    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp', '*.webp']
-    image_paths = []
-    for ext in image_extensions:
-        image_paths.extend(glob.glob(os.path.join(folder_path, ext)))
-    image_paths.sort() # 按文件名排序
-    return image_paths
-
-def create_required_dirs(base_dir):
-    """创建inpaint和qianresult文件夹"""
-    inpaint_dir = os.path.join(base_dir, "inpaint")
-    qianresult_dir = os.path.join(base_dir, "qianresult")
-
-    os.makedirs(inpaint_dir, exist_ok=True)
-    os.makedirs(qianresult_dir, exist_ok=True)
-    return inpaint_dir, qianresult_dir
-
-def pil_to_qimage(pil_image: Image.Image):
-    """将PIL Image转换为QImage"""
-    if pil_image.mode == "RGB":
-        return QImage(pil_image.tobytes("raw", "RGB"), pil_image.width, pil_image.height, QImage.Format_RGB888)
-    elif pil_image.mode == "RGBA":
-        return QImage(pil_image.tobytes("raw", "RGBA"), pil_image.width, pil_image.height, QImage.Format_ARGB32)
-    else:
-        # 转换为RGB或RGBA以兼容
-        return QImage(pil_image.convert("RGBA").tobytes("raw", "RGBA"), pil_image.width, pil_image.height, QImage.Format_ARGB32)
-
-def qimage_to_pil(q_image: QImage):
-    """将QImage转换为PIL Image"""
-    buffer = q_image.constBits()
-    # 根据QImage的格式选择PIL的模式
-    if q_image.format() == QImage.Format_RGB888:
-        return Image.frombuffer("RGB", (q_image.width(), q_image.height()), buffer, "raw", "RGB", 0, 1)
-    elif q_image.format() == QImage.Format_ARGB32:
-        return Image.frombuffer("RGBA", (q_image.width(), q_image.height()), buffer, "raw", "BGRA", 0, 1)
-    elif q_image.format() == QImage.Format_ARGB32_Premultiplied:
-        # Cairo通常使用这个格式，需要特殊处理
-        return Image.frombuffer("RGBA", (q_image.width(), q_image.height()), buffer, "raw", "RGBA", 0, 1).transpose(Image.FLIP_TOP_BOTTOM)
-    else:
-        # 转换为RGBA以兼容
-        return Image.frombuffer("RGBA", (q_image.convertToFormat(QImage.Format_ARGB32).width(), q_image.convertToFormat(QImage.Format_ARGB32).height()), q_image.convertToFormat(QImage.Format_ARGB32).constBits(), "raw", "BGRA", 0, 1)
-
-def save_image_with_text(image_path, text_boxes, output_path):
-    """
-    加载图片，绘制文本框，然后保存。
-    这个函数现在由 ImageCanvas.save_rendered_image 替代，
-    但保留作为通用工具函数示例。
-    """
-    try:
-        # 使用Pillow加载图片
-        img = Image.open(image_path).convert("RGBA") # 确保有alpha通道
-
-        # 创建一个与PIL Image兼容的Cairo表面
-        # PyCairo需要一个可写的缓冲区，因此我们直接从PIL图像的像素数据创建
-        surface = cairo.ImageSurface.create_for_data(
-            bytearray(img.tobytes()),
-            cairo.FORMAT_ARGB32, # PIL的RGBA通常对应Cairo的ARGB32
-            img.width,
-            img.height,
-            img.width * 4 # 4 bytes per pixel (RGBA)
-        )
-        ctx = cairo.Context(surface)
-
-        # 绘制所有文本框
-        for tb in text_boxes:
-            tb.draw(ctx, draw_handles=False) # 保存时不要绘制句柄
-
-        # 将Cairo表面数据转换回PIL Image
-        # Cairo的ARGB32是BGRA顺序，PIL的RGBA是RGBA顺序，可能需要转换
-        buf = surface.get_data()
-        final_pil_img = Image.frombuffer(
-            "RGBA", (img.width, img.height), buf, "raw", "ARGB", 0, 1
-        )
-        final_pil_img.save(output_path)
-        print(f"图片已保存到: {output_path}")
-    except Exception as e:
-        print(f"保存图片失败: {e}")
-
+            self._update_visible_rows()
@@ -0,0 +1,107 @@
+# utils.py
+import os
+import glob
+import shutil
+from PyQt5.QtGui import QImage, QPixmap
+from PIL import Image, ImageDraw
+import cairo
+from font_index import FontIndex
+
+# 字体索引保存在磁盘上，查询只查内存中的字典；启动后由主窗口在后台刷新 (refresh_font_index)
+font_index = FontIndex()
+
+DEFAULT_FONTS = ["Arial", "SimHei", "Times New Roman"]
+
+def get_system_fonts():
+    """获取系统可用字体列表 (来自上次保存的字体索引，不遍历字体目录)"""
+    fonts = font_index.families()
+    # 第一次运行时索引还是空的，先用通用字体，后台扫描完成后再更新
+    return fonts or list(DEFAULT_FONTS)
+
+def refresh_font_index(on_done=None):
+    """在后台线程中增量刷新字体索引，有变化时调用 on_done(字体列表)"""
+    return font_index.refresh_async(on_done)
+
+def get_font_path(font_name, style=None):
+    """根据字体名称获取字体文件路径，找不到时返回 None"""
+    face = font_index.find(font_name, style)
+    return face["path"] if face else None
+
+def load_image_paths(folder_path):
+    """加载文件夹中所有支持的图片文件路径"""
+    image_extensions = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp', '*.webp']
+    image_paths = []
+    for ext in image_extensions:
+        image_paths.extend(glob.glob(os.path.join(folder_path, ext)))
+    image_paths.sort() # 按文件名排序
+    return image_paths
+
+def create_required_dirs(base_dir):
+    """创建inpaint和qianresult文件夹"""
+    inpaint_dir = os.path.join(base_dir, "inpaint")
+    qianresult_dir = os.path.join(base_dir, "qianresult")
+
+    os.makedirs(inpaint_dir, exist_ok=True)
+    os.makedirs(qianresult_dir, exist_ok=True)
+    return inpaint_dir, qianresult_dir
+
+def pil_to_qimage(pil_image: Image.Image):
+    """将PIL Image转换为QImage"""
+    if pil_image.mode == "RGB":
+        return QImage(pil_image.tobytes("raw", "RGB"), pil_image.width, pil_image.height, QImage.Format_RGB888)
+    elif pil_image.mode == "RGBA":
+        return QImage(pil_image.tobytes("raw", "RGBA"), pil_image.width, pil_image.height, QImage.Format_ARGB32)
+    else:
+        # 转换为RGB或RGBA以兼容
+        return QImage(pil_image.convert("RGBA").tobytes("raw", "RGBA"), pil_image.width, pil_image.height, QImage.Format_ARGB32)
+
+def qimage_to_pil(q_image: QImage):
+    """将QImage转换为PIL Image"""
+    buffer = q_image.constBits()
+    # 根据QImage的格式选择PIL的模式
+    if q_image.format() == QImage.Format_RGB888:
+        return Image.frombuffer("RGB", (q_image.width(), q_image.height()), buffer, "raw", "RGB", 0, 1)
+    elif q_image.format() == QImage.Format_ARGB32:
+        return Image.frombuffer("RGBA", (q_image.width(), q_image.height()), buffer, "raw", "BGRA", 0, 1)
+    elif q_image.format() == QImage.Format_ARGB32_Premultiplied:
+        # Cairo通常使用这个格式，需要特殊处理
+        return Image.frombuffer("RGBA", (q_image.width(), q_image.height()), buffer, "raw", "RGBA", 0, 1).transpose(Image.FLIP_TOP_BOTTOM)
+    else:
+        # 转换为RGBA以兼容
+        return Image.frombuffer("RGBA", (q_image.convertToFormat(QImage.Format_ARGB32).width(), q_image.convertToFormat(QImage.Format_ARGB32).height()), q_image.convertToFormat(QImage.Format_ARGB32).constBits(), "raw", "BGRA", 0, 1)
+
+def save_image_with_text(image_path, text_boxes, output_path):
+    """
+    加载图片，绘制文本框，然后保存。
+    这个函数现在由 ImageCanvas.save_rendered_image 替代，
+    但保留作为通用工具函数示例。
+    """
+    try:
+        # 使用Pillow加载图片
+        img = Image.open(image_path).convert("RGBA") # 确保有alpha通道
+
+        # 创建一个与PIL Image兼容的Cairo表面
+        # PyCairo需要一个可写的缓冲区，因此我们直接从PIL图像的像素数据创建
+        surface = cairo.ImageSurface.create_for_data(
+            bytearray(img.tobytes()),
+            cairo.FORMAT_ARGB32, # PIL的RGBA通常对应Cairo的ARGB32
+            img.width,
+            img.height,
+            img.width * 4 # 4 bytes per pixel (RGBA)
+        )
+        ctx = cairo.Context(surface)
+
+        # 绘制所有文本框
+        for tb in text_boxes:
+            tb.draw(ctx, draw_handles=False) # 保存时不要绘制句柄
+
+        # 将Cairo表面数据转换回PIL Image
+        # Cairo的ARGB32是BGRA顺序，PIL的RGBA是RGBA顺序，可能需要转换
+        buf = surface.get_data()
+        final_pil_img = Image.frombuffer(
+            "RGBA", (img.width, img.height), buf, "raw", "ARGB", 0, 1
+        )
+        final_pil_img.save(output_path)
+        print(f"图片已保存到: {output_path}")
+    except Exception as e:
+        print(f"保存图片失败: {e}")
@@ -1,9 +1,18 @@
 import os
+import sys
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import cv2
 from PIL import Image, ImageTk
 
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.chromatic import ChannelShifter, estimate_channel_offsets
+from pyimg.imgio import imread, imwrite
+from pyimg.preview import render_view
+from pyimg.pyramid import pyramid_cache
+
 class ChromaticAberrationCorrector(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -14,9 +23,11 @@ class ChromaticAberrationCorrector(tk.Tk):
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
         self.image_files = []
-        self.original_pil_image = None
-        self.corrected_pil_image = None
+        self.original_image = None  # BGR 数组
+        self.pyramid = None  # original_image 的各级缩小版本，缩小预览时从这里取样
         self.display_photo = None
+        # 预览只平移画布上可见的部分，缓冲区按画布大小复用
+        self.preview_shifter = ChannelShifter()
 
         # --- 缩放与平移 ---
         self.zoom_level = 1.0
@@ -25,11 +36,12 @@ class ChromaticAberrationCorrector(tk.Tk):
         self.pan_start_x = 0
         self.pan_start_y = 0
 
-        # --- 通道偏移量 ---
-        self.offsets = {'r': {'x': tk.IntVar(value=0), 'y': tk.IntVar(value=0)},
-                        'g': {'x': tk.IntVar(value=0), 'y': tk.IntVar(value=0)},
-                        'b': {'x': tk.IntVar(value=0), 'y': tk.IntVar(value=0)}}
+        # --- 通道偏移量 (可以是小数，亚像素平移) ---
+        self.offsets = {'r': {'x': tk.DoubleVar(value=0), 'y': tk.DoubleVar(value=0)},
+                        'g': {'x': tk.DoubleVar(value=0), 'y': tk.DoubleVar(value=0)},
+                        'b': {'x': tk.DoubleVar(value=0), 'y': tk.DoubleVar(value=0)}}
         self.active_channel = tk.StringVar(value='r')
+        self.auto_per_page = tk.BooleanVar(value=False)
 
         # --- 性能优化：用于更新节流(Debouncing) ---
         self.update_job_id = None
@@ -93,6 +105,10 @@ class ChromaticAberrationCorrector(tk.Tk):
         self.y_offset_entry.grid(row=1, column=1, pady=5)
         self.y_offset_entry.bind("<KeyRelease>", self.schedule_update)
 
+        self.auto_button = ttk.Button(control_panel, text="自动对齐 (以 G 通道为基准)", command=self.start_auto_align)
+        self.auto_button.pack(fill="x", pady=(10, 5))
+        ttk.Checkbutton(control_panel, text="批量处理时逐页自动对齐", variable=self.auto_per_page).pack(anchor="w")
+
         ttk.Separator(control_panel).pack(fill="x", pady=15)
         
         tips_frame = ttk.LabelFrame(control_panel, text="操作提示", padding=10)
@@ -133,7 +149,7 @@ class ChromaticAberrationCorrector(tk.Tk):
     def load_image_list(self):
         folder = self.input_folder.get()
         self.image_files, self.image_selector['values'] = [], []
-        self.canvas.delete("all"); self.original_pil_image = None
+        self.canvas.delete("all"); self.original_image = None
         if not folder: return
         try:
             self.image_files = sorted([f for f in os.listdir(folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff'))])
@@ -147,13 +163,19 @@ class ChromaticAberrationCorrector(tk.Tk):
         if not selected_file: return
         image_path = os.path.join(self.input_folder.get(), selected_file)
         try:
-            self.original_pil_image = Image.open(image_path)
+            self.pyramid = pyramid_cache.get(image_path, lambda: self._load_image(image_path))
+            self.original_image = self.pyramid.levels[0]
             self.reset_view()
             self.apply_offsets_and_redraw()
         except Exception as e:
             messagebox.showerror("错误", f"打开图片失败: {e}")
-            self.original_pil_image = None
+            self.original_image = None
     
+    def _load_image(self, image_path):
+        image = imread(image_path, cv2.IMREAD_COLOR)
+        if image is None: raise IOError("无法解码图片")
+        return image
+
     def on_canvas_resize(self, event=None):
         self.schedule_update(delay=100) # 窗口大小变化时也延迟更新，防止卡顿
 
@@ -167,8 +189,8 @@ class ChromaticAberrationCorrector(tk.Tk):
 
     def update_from_slider(self, event=None):
         channel = self.active_channel.get()
-        self.offsets[channel]['x'].set(int(float(self.x_slider.get())))
-        self.offsets[channel]['y'].set(int(float(self.y_slider.get())))
+        self.offsets[channel]['x'].set(round(float(self.x_slider.get()), 1))
+        self.offsets[channel]['y'].set(round(float(self.y_slider.get()), 1))
         self.schedule_update()
 
     # --- 性能优化核心：更新节流 ---
@@ -179,43 +201,59 @@ class ChromaticAberrationCorrector(tk.Tk):
         self.update_job_id = self.after(delay, self.apply_offsets_and_redraw)
 
     # --- 图像处理与显示核心 ---
+    def current_offsets(self):
+        return {ch: (val['x'].get(), val['y'].get()) for ch, val in self.offsets.items()}
+
     def apply_offsets_and_redraw(self):
-        if not self.original_pil_image: return
-        img = self.original_pil_image
-        if img.mode != 'RGB': img = img.convert('RGB')
-        r, g, b = img.split()
-        r = self._shift_channel(r, self.offsets['r']['x'].get(), self.offsets['r']['y'].get())
-        g = self._shift_channel(g, self.offsets['g']['x'].get(), self.offsets['g']['y'].get())
-        b = self._shift_channel(b, self.offsets['b']['x'].get(), self.offsets['b']['y'].get())
-        self.corrected_pil_image = Image.merge('RGB', (r, g, b))
+        # 偏移只作用于可见部分，在 redraw_canvas 中完成
         self.redraw_canvas()
 
-    def _shift_channel(self, channel, dx, dy):
-        if dx == 0 and dy == 0: return channel
-        shifted = Image.new('L', channel.size, 0)
-        shifted.paste(channel, (dx, dy))
-        return shifted
+    # --- 自动对齐 ---
+    def start_auto_align(self):
+        if self.original_image is None: messagebox.showwarning("警告", "请先选择参考图。"); return
+        self.auto_button.config(state="disabled")
+        threading.Thread(target=self._auto_align_thread, args=(self.original_image,), daemon=True).start()
+
+    def _auto_align_thread(self, image):
+        try:
+            offsets = estimate_channel_offsets(image)
+        except Exception as e:
+            print(f"自动对齐失败: {e}")
+            offsets = None
+        self.after(0, self.on_auto_align_done, offsets)
+
+    def on_auto_align_done(self, offsets):
+        self.auto_button.config(state="normal")
+        if offsets is None:
+            messagebox.showerror("错误", "自动对齐失败，请手动调整。")
+            return
+        for ch, (dx, dy) in offsets.items():
+            self.offsets[ch]['x'].set(round(dx, 2))
+            self.offsets[ch]['y'].set(round(dy, 2))
+        self.update_controls()
+        self.schedule_update()
 
     def redraw_canvas(self):
-        if not self.corrected_pil_image: return
+        if self.original_image is None: return
         cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
         if cw <= 1 or ch <= 1: return
 
-        new_w, new_h = int(self.corrected_pil_image.width * self.zoom_level), int(self.corrected_pil_image.height * self.zoom_level)
-        if new_w < 1 or new_h < 1: return
-
-        # 性能优化：使用速度更快的BILINEAR算法进行实时预览，效果几乎无差别，但流畅度大大提升
-        display_img = self.corrected_pil_image.resize((new_w, new_h), Image.Resampling.BILINEAR)
-        
-        self.display_photo = ImageTk.PhotoImage(display_img)
+        # 只裁出画布上看得见的区域，平移通道后再缩放，耗时只与画布大小有关，与缩放倍数无关
+        # 使用速度更快的双线性插值进行实时预览
+        view = render_view(self.original_image, self.current_offsets(),
+                           -self.canvas_image_x / self.zoom_level, -self.canvas_image_y / self.zoom_level,
+                           self.zoom_level, cw, ch, self.preview_shifter, cv2.INTER_LINEAR, self.pyramid)
         self.canvas.delete("all")
-        self.canvas.create_image(self.canvas_image_x, self.canvas_image_y, anchor="nw", image=self.display_photo)
+        if view is None: return
+        region, (x, y) = view
+        self.display_photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(region, cv2.COLOR_BGR2RGB)))
+        self.canvas.create_image(x, y, anchor="nw", image=self.display_photo)
 
     def reset_view(self):
-        if not self.original_pil_image: return
+        if self.original_image is None: return
         self.zoom_level = 1.0
         cw, ch = self.canvas.winfo_width(), self.canvas.winfo_height()
-        iw, ih = self.original_pil_image.size
+        ih, iw = self.original_image.shape[:2]
         if iw > 0 and ih > 0: self.zoom_level = min(cw / iw, ch / ih, 1.0) # 初始缩放不超过100%
         zoomed_w, zoomed_h = int(iw * self.zoom_level), int(ih * self.zoom_level)
         self.canvas_image_x = (cw - zoomed_w) // 2
@@ -223,7 +261,7 @@ class ChromaticAberrationCorrector(tk.Tk):
 
     # --- 缩放与平移事件处理 ---
     def zoom_image(self, event):
-        if not self.corrected_pil_image: return
+        if self.original_image is None: return
         zoom_factor = 1.1 if event.delta > 0 else 1 / 1.1
         img_coord_x = event.x - self.canvas_image_x
         img_coord_y = event.y - self.canvas_image_y
@@ -252,17 +290,16 @@ class ChromaticAberrationCorrector(tk.Tk):
 
     def _batch_process_thread(self):
         input_dir, output_dir = self.input_folder.get(), self.output_folder.get()
-        offsets = {ch: (val['x'].get(), val['y'].get()) for ch, val in self.offsets.items()}
+        offsets = self.current_offsets()
+        auto_per_page = self.auto_per_page.get()
+        shifter = ChannelShifter()
         for i, filename in enumerate(self.image_files):
             try:
-                with Image.open(os.path.join(input_dir, filename)) as img:
-                    if img.mode != 'RGB': img = img.convert('RGB')
-                    r, g, b = img.split()
-                    r = self._shift_channel(r, offsets['r'][0], offsets['r'][1])
-                    g = self._shift_channel(g, offsets['g'][0], offsets['g'][1])
-                    b = self._shift_channel(b, offsets['b'][0], offsets['b'][1])
-                    corrected_img = Image.merge('RGB', (r, g, b))
-                    corrected_img.save(os.path.join(output_dir, filename))
+                img = imread(os.path.join(input_dir, filename), cv2.IMREAD_COLOR)
+                if img is None: raise IOError("无法解码图片")
+                # 逐页自动对齐时每页单独计算偏移，否则所有页面使用同一组偏移
+                page_offsets = estimate_channel_offsets(img) if auto_per_page else offsets
+                imwrite(os.path.join(output_dir, filename), shifter.apply(img, page_offsets))
             except Exception as e: print(f"处理文件 {filename} 时出错: {e}")
             self.after(0, self.progress_bar.config, {'value': i + 1})
         self.after(0, self.on_processing_done)
@@ -3,8 +3,16 @@ import sys
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import cv2
 from PIL import Image, ImageTk
 
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.chromatic import ChannelShifter
+from pyimg.imgio import imread
+from pyimg.preview import render_view
+from pyimg.pyramid import pyramid_cache
+
 class ChromaticAberrationCorrector(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -26,9 +34,11 @@ class ChromaticAberrationCorrector(tk.Tk):
         self.input_folder = tk.StringVar()
         self.output_folder = tk.StringVar()
         self.image_files = []
-        self.original_pil_image = None
-        self.corrected_pil_image = None
+        self.original_image = None  # 预览用的 BGR 数组
+        self.pyramid = None  # original_image 的各级缩小版本，缩小预览时从这里取样
         self.display_photo = None
+        # 预览只平移画布上可见的部分，缓冲区按画布大小复用
+        self.preview_shifter = ChannelShifter()
 
         self.offsets = {'r': {'x': tk.IntVar(value=0), 'y': tk.IntVar(value=0)},
                         'g': {'x': tk.IntVar(value=0), 'y': tk.IntVar(value=0)},
@@ -148,7 +158,7 @@ class ChromaticAberrationCorrector(tk.Tk):
                 self.load_selected_image()
             else:
                 self.canvas.delete("all")
-                self.original_pil_image = None
+                self.original_image = None
                 messagebox.showinfo("提示", "未在所选文件夹中找到支持的图片格式。")
         except Exception as e:
             messagebox.showerror("错误", f"加载图片列表失败: {e}")
@@ -158,13 +168,19 @@ class ChromaticAberrationCorrector(tk.Tk):
         if not selected_file: return
         self.current_image_path = os.path.join(self.input_folder.get(), selected_file)
         try:
-            self.original_pil_image = Image.open(self.current_image_path)
+            self.pyramid = pyramid_cache.get(self.current_image_path, self._load_current_image)
+            self.original_image = self.pyramid.levels[0]
             self.zoom_level, self.view_x, self.view_y = 1.0, 0, 0
             self.process_and_redraw()
         except Exception as e:
-            self.original_pil_image = None
+            self.original_image = None
             messagebox.showerror("错误", f"打开图片失败: {e}")
 
+    def _load_current_image(self):
+        image = imread(self.current_image_path, cv2.IMREAD_COLOR)
+        if image is None: raise IOError("无法解码图片")
+        return image
+
     def switch_active_channel(self):
         """当点击Radiobutton时调用，只负责更新UI控件的状态"""
         self._is_switching_channel = True  # 上锁
@@ -197,47 +213,37 @@ class ChromaticAberrationCorrector(tk.Tk):
         self.process_and_redraw()
 
     def process_and_redraw(self):
-        """核心函数：应用色彩偏移并重绘Canvas"""
-        if not self.original_pil_image: return
-        self.corrected_pil_image = self.apply_channel_shift(self.original_pil_image)
+        """核心函数：应用色彩偏移并重绘Canvas。偏移只作用于可见部分，在 redraw_canvas 中完成"""
         self.redraw_canvas()
 
     def redraw_canvas(self):
-        if not self.corrected_pil_image: return
+        if self.original_image is None: return
         canvas_width, canvas_height = self.canvas.winfo_width(), self.canvas.winfo_height()
         if canvas_width <= 1 or canvas_height <= 1: return
 
         crop_width = canvas_width / self.zoom_level
         crop_height = canvas_height / self.zoom_level
         
-        img_w, img_h = self.corrected_pil_image.size
+        img_h, img_w = self.original_image.shape[:2]
         self.view_x = max(0, min(self.view_x, img_w - crop_width))
         self.view_y = max(0, min(self.view_y, img_h - crop_height))
 
-        box = (self.view_x, self.view_y, self.view_x + crop_width, self.view_y + crop_height)
-        
-        try:
-            cropped_img = self.corrected_pil_image.crop(box)
-            resized_img = cropped_img.resize((canvas_width, canvas_height), Image.Resampling.NEAREST)
-            self.display_photo = ImageTk.PhotoImage(resized_img)
-            self.canvas.delete("all")
-            self.canvas.create_image(0, 0, anchor="nw", image=self.display_photo)
-        except ValueError: pass # 忽略因快速缩放导致的无效box尺寸
-
-    def apply_channel_shift(self, pil_image):
-        img_to_process = pil_image.convert('RGB') if pil_image.mode != 'RGB' else pil_image
-        r, g, b = img_to_process.split()
-        r = self._shift_channel(r, self.offsets['r']['x'].get(), self.offsets['r']['y'].get())
-        g = self._shift_channel(g, self.offsets['g']['x'].get(), self.offsets['g']['y'].get())
-        b = self._shift_channel(b, self.offsets['b']['x'].get(), self.offsets['b']['y'].get())
-        return Image.merge('RGB', (r, g, b))
+        # 只裁出画布上看得见的区域，平移通道后再缩放，耗时只与画布大小有关
+        offsets = {ch: (val['x'].get(), val['y'].get()) for ch, val in self.offsets.items()}
+        view = render_view(self.original_image, offsets, self.view_x, self.view_y, self.zoom_level,
+                           canvas_width, canvas_height, self.preview_shifter, pyramid=self.pyramid)
+        self.canvas.delete("all")
+        if view is None: return
+        region, (x, y) = view
+        self.display_photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(region, cv2.COLOR_BGR2RGB)))
+        self.canvas.create_image(x, y, anchor="nw", image=self.display_photo)
 
     def _shift_channel(self, channel, dx, dy):
         if dx == 0 and dy == 0: return channel
         return channel.transform(channel.size, Image.AFFINE, (1, 0, -dx, 0, 1, -dy))
 
     def zoom_handler(self, event):
-        if not self.corrected_pil_image: return
+        if self.original_image is None: return
         zoom_factor = 1.1 if (event.delta > 0 or event.num == 4) else 0.9
         mouse_x = self.view_x + (event.x / self.zoom_level)
         mouse_y = self.view_y + (event.y / self.zoom_level)
@@ -248,7 +254,7 @@ class ChromaticAberrationCorrector(tk.Tk):
 
     def pan_start(self, event): self.pan_start_x, self.pan_start_y = event.x, event.y; self.canvas.config(cursor="fleur")
     def pan_move(self, event):
-        if not self.corrected_pil_image: return
+        if self.original_image is None: return
         dx = (event.x - self.pan_start_x) / self.zoom_level
         dy = (event.y - self.pan_start_y) / self.zoom_level
         self.view_x -= dx; self.view_y -= dy
@@ -1,20 +1,32 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
 import os
-import cv2
-import numpy as np
+import sys
 import threading
 import queue
 
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.chromatic import correct_aberration, correct_radial, estimate_profile, save_profile, load_profile
+from pyimg.batch import list_images
+from pyimg.imgio import IOStats
+from pyimg.manifest import JobManifest, input_digest
+from pyimg.cache import ResultCache
+
 class ChromaticAberrationFixerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("漫画扫描色差校正工具")
-        self.root.geometry("600x550")
+        self.root.geometry("600x650")
 
         self.input_dir = tk.StringVar()
         self.output_dir = tk.StringVar()
         self.log_queue = queue.Queue()
+        self.resume = tk.BooleanVar(value=True)
+        self.use_cache = tk.BooleanVar(value=True)
+        # "scale" 为滑块统一缩放，"radial" 为按配置文件做径向校正
+        self.mode = tk.StringVar(value="scale")
+        self.profile = None
 
         # --- UI 布局 ---
         main_frame = tk.Frame(root, padx=10, pady=10)
@@ -47,6 +59,19 @@ class ChromaticAberrationFixerApp:
         self.b_scale = tk.Scale(param_frame, from_=0.998, to=1.002, resolution=0.0001, orient=tk.HORIZONTAL)
         self.b_scale.set(1.0005)
         self.b_scale.grid(row=1, column=1, sticky="ew")
+
+        tk.Radiobutton(param_frame, text="统一缩放 (使用上面的滑块)", variable=self.mode, value="scale").grid(row=2, column=0, columnspan=2, sticky="w")
+        radial_frame = tk.Frame(param_frame)
+        radial_frame.grid(row=3, column=0, columnspan=2, sticky="ew")
+        tk.Radiobutton(radial_frame, text="径向校正 (使用配置文件):", variable=self.mode, value="radial").pack(side=tk.LEFT)
+        tk.Button(radial_frame, text="载入配置...", command=self.load_profile_file).pack(side=tk.LEFT, padx=2)
+        self.estimate_button = tk.Button(radial_frame, text="从输入文件夹估算...", command=self.start_estimate_thread)
+        self.estimate_button.pack(side=tk.LEFT, padx=2)
+        self.profile_label = tk.Label(param_frame, text="未载入配置", anchor="w", fg="gray")
+        self.profile_label.grid(row=4, column=0, columnspan=2, sticky="w")
+
+        tk.Checkbutton(param_frame, text="断点续跑 (跳过上次已成功、输入和参数都没变的文件)", variable=self.resume).grid(row=5, column=0, columnspan=2, sticky="w")
+        tk.Checkbutton(param_frame, text="使用结果缓存 (同一张图用同样参数处理过时直接复制上次的结果)", variable=self.use_cache).grid(row=6, column=0, columnspan=2, sticky="w")
         
         param_frame.grid_columnconfigure(1, weight=1)
 
@@ -79,6 +104,54 @@ class ChromaticAberrationFixerApp:
             self.output_dir.set(path)
             self.output_label.config(text=path)
             
+    def set_profile(self, profile, source):
+        self.profile = profile
+        self.mode.set("radial")
+        self.profile_label.config(text=f"当前配置: {source}", fg="black")
+
+    def load_profile_file(self):
+        path = filedialog.askopenfilename(title="选择色差配置文件", filetypes=[("JSON", "*.json")])
+        if not path:
+            return
+        try:
+            self.set_profile(load_profile(path), os.path.basename(path))
+        except (OSError, ValueError, KeyError) as e:
+            messagebox.showerror("错误", f"无法读取配置文件: {e}")
+
+    def start_estimate_thread(self):
+        input_path = self.input_dir.get()
+        if not input_path:
+            messagebox.showerror("错误", "请先选择输入文件夹！")
+            return
+        self.estimate_button.config(state="disabled")
+        threading.Thread(target=self.estimate, args=(input_path,), daemon=True).start()
+
+    def estimate(self, input_dir, pages=5):
+        """在后台线程中从输入文件夹均匀抽取几页估算径向色差"""
+        files = list_images(input_dir, recursive=True)
+        sample = files[::max(1, len(files) // pages)][:pages]
+        self.log(f"从 {len(sample)} 页估算径向色差...")
+        try:
+            profile = estimate_profile(sample)
+        except Exception as e:
+            self.log(f"  [错误] 估算失败: {e}")
+            profile = None
+        else:
+            self.log(f"红通道系数: {profile['r']} (四角位移 {profile['r_corner_px']} 像素)")
+            self.log(f"蓝通道系数: {profile['b']} (四角位移 {profile['b_corner_px']} 像素)")
+        self.root.after(0, self.on_estimate_done, profile)
+
+    def on_estimate_done(self, profile):
+        self.estimate_button.config(state="normal")
+        if profile is None:
+            return
+        # 同一台扫描仪只需估算一次，保存下来以后直接载入
+        path = filedialog.asksaveasfilename(title="保存色差配置", defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if path:
+            save_profile(path, profile)
+            self.log(f"配置已保存到 {path}")
+        self.set_profile((tuple(profile["r"]), tuple(profile["b"])), os.path.basename(path) if path else "估算结果 (未保存)")
+
     def log(self, message):
         """将日志消息放入队列"""
         self.log_queue.put(message)
@@ -107,27 +180,47 @@ class ChromaticAberrationFixerApp:
             messagebox.showwarning("警告", "输入和输出文件夹不能是同一个，请重新选择输出文件夹。")
             return
 
+        profile = None
+        if self.mode.get() == "radial":
+            if self.profile is None:
+                messagebox.showerror("错误", "请先载入或估算色差配置！")
+                return
+            profile = self.profile
+
         self.start_button.config(state="disabled", text="正在处理中...")
         
         # 创建并启动处理线程
         processing_thread = threading.Thread(
             target=self.process_images, 
-            args=(input_path, output_path, self.r_scale.get(), self.b_scale.get()),
+            args=(input_path, output_path, self.r_scale.get(), self.b_scale.get(), self.resume.get(), self.use_cache.get(), profile),
             daemon=True
         )
         processing_thread.start()
 
-    def process_images(self, input_dir, output_dir, r_scale, b_scale):
+    def process_images(self, input_dir, output_dir, r_scale, b_scale, resume=True, use_cache=True, profile=None):
+        """profile 为 (r 系数, b 系数) 时按径向模型校正，忽略 r_scale / b_scale"""
         self.log("="*20)
         self.log(f"开始处理任务...")
         self.log(f"输入文件夹: {input_dir}")
         self.log(f"输出文件夹: {output_dir}")
-        self.log(f"红通道缩放: {r_scale}, 蓝通道缩放: {b_scale}")
+        if profile is None:
+            self.log(f"红通道缩放: {r_scale}, 蓝通道缩放: {b_scale}")
+        else:
+            self.log(f"径向校正: 红 {list(profile[0])}, 蓝 {list(profile[1])}")
         self.log("="*20)
 
         os.makedirs(output_dir, exist_ok=True)
         
         image_count = 0
+        skipped_count = 0
+        io_stats = IOStats()
+        # 输出文件夹中的任务记录，参数写法与命令行版一致
+        if profile is None:
+            params = {"op": "chroma", "r_scale": r_scale, "b_scale": b_scale}
+        else:
+            params = {"op": "chroma-radial", "r": profile[0], "b": profile[1]}
+        manifest = JobManifest(output_dir)
+        cache = ResultCache() if use_cache else None
         supported_formats = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
 
         for root, _, files in os.walk(input_dir):
@@ -142,14 +235,34 @@ class ChromaticAberrationFixerApp:
                     os.makedirs(output_sub_dir, exist_ok=True)
                     output_image_path = os.path.join(output_sub_dir, filename)
 
+                    if resume and manifest.is_done(input_image_path, params, output_image_path):
+                        skipped_count += 1
+                        continue
+
                     self.log(f"处理中: {filename}")
+                    # 用缓存时输入哈希只算一次，查缓存和写任务记录共用
+                    digest = input_digest(input_image_path, io_stats) if cache is not None else None
                     try:
-                        self.correct_aberration(input_image_path, output_image_path, r_scale, b_scale)
+                        if profile is None:
+                            hit = correct_aberration(input_image_path, output_image_path, r_scale, b_scale, cache=cache,
+                                                     digest=digest, stats=io_stats)
+                        else:
+                            hit = correct_radial(input_image_path, output_image_path, *profile, cache=cache,
+                                                 digest=digest, stats=io_stats)
+                        if hit:
+                            self.log(f"  (缓存) {filename}")
+                        manifest.record(input_image_path, params, True, output_path=output_image_path, digest=digest,
+                                       stats=io_stats)
                     except Exception as e:
                         self.log(f"  [错误] 处理 {filename} 失败: {e}")
+                        manifest.record(input_image_path, params, False, output_path=output_image_path, error=e,
+                                        digest=digest, stats=io_stats)
 
         self.log("="*20)
-        self.log(f"处理完成！共处理了 {image_count} 张图片。")
+        self.log(f"处理完成！共处理了 {image_count - skipped_count} 张图片。")
+        if skipped_count:
+            self.log(f"断点续跑: 跳过了 {skipped_count} 张已完成的图片。")
+        self.log(f"I/O 统计: {io_stats}")
         self.log("="*20)
         
         # 在主线程中更新UI
@@ -159,49 +272,6 @@ class ChromaticAberrationFixerApp:
         messagebox.showinfo("完成", "所有图片已处理完毕！")
         self.start_button.config(state="normal", text="开始处理")
 
-    def scale_channel(self, channel, scale_factor):
-        """按中心缩放单个颜色通道"""
-        height, width = channel.shape[:2]
-        
-        # 计算新的尺寸
-        new_width = int(width * scale_factor)
-        new_height = int(height * scale_factor)
-
-        # 缩放
-        scaled = cv2.resize(channel, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
-
-        # 从中心裁剪回原始尺寸
-        x_start = (new_width - width) // 2
-        y_start = (new_height - height) // 2
-        
-        return scaled[y_start:y_start+height, x_start:x_start+width]
-
-    def correct_aberration(self, input_path, output_path, r_scale, b_scale):
-        # 使用 numpy.fromfile 和 cv2.imdecode 来读取包含非ASCII字符（如中文）的路径
-        img_np = np.fromfile(input_path, dtype=np.uint8)
-        img = cv2.imdecode(img_np, cv2.IMREAD_COLOR)
-
-        if img is None:
-            raise IOError("无法读取图像文件，请检查文件是否损坏或路径是否正确。")
-
-        # OpenCV默认通道顺序是 B, G, R
-        b_channel, g_channel, r_channel = cv2.split(img)
-
-        # 以G通道为基准，缩放R和B通道
-        corrected_r = self.scale_channel(r_channel, r_scale)
-        corrected_b = self.scale_channel(b_channel, b_scale)
-
-        # 合并通道
-        corrected_img = cv2.merge([corrected_b, g_channel, corrected_r])
-
-        # 使用 cv2.imencode 和 tofile 来保存到包含非ASCII字符的路径
-        is_success, buffer = cv2.imencode(os.path.splitext(output_path)[1], corrected_img)
-        if is_success:
-            with open(output_path, 'wb') as f:
-                f.write(buffer)
-        else:
-            raise IOError(f"无法编码图像到路径: {output_path}")
-
 if __name__ == "__main__":
     root = tk.Tk()
     app = ChromaticAberrationFixerApp(root)
@@ -1,7 +1,13 @@
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
 from PIL import Image, ImageTk, ImageDraw
+import numpy as np
 import os
+import sys
+
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.pyramid import pyramid_cache
 
 class ImageProcessorApp:
     def __init__(self, root):
@@ -100,9 +106,13 @@ class ImageProcessorApp:
 
         self.preview_path = self.image_files[0]
         self.original_image = Image.open(self.preview_path).convert("RGB")
-        self.display_image(self.original_image)
+        # 预览用的金字塔：缩小到画布大小时从最接近的一层取样，不必每次都从原图缩放
+        self.pyramid = pyramid_cache.get(self.preview_path, lambda: np.asarray(self.original_image))
+        self.display_preview()
     
-    def display_image(self, img):
+    def display_preview(self):
+        """把预览图 (original_image) 缩放到画布大小显示，缩小时从它的金字塔取样"""
+        img = self.original_image
         if not img:
             return
 
@@ -118,7 +128,7 @@ class ImageProcessorApp:
             ratio = min(canvas_width / img_width, canvas_height / img_height)
             self.scaled_width = int(img_width * ratio)
             self.scaled_height = int(img_height * ratio)
-            self.scaled_image = img.resize((self.scaled_width, self.scaled_height), Image.Resampling.LANCZOS)
+            self.scaled_image = Image.fromarray(self.pyramid.resize((self.scaled_width, self.scaled_height)))
         else:
             self.scaled_width = img_width
             self.scaled_height = img_height
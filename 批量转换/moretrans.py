@@ -1,24 +1,12 @@
 import os
-from PIL import Image
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import threading
 
-def get_image_formats(folder):
-    """
-    获取文件夹中所有图片的格式（不重复）
-    """
-    formats = set()
-    if not os.path.exists(folder):
-        return []
-    
-    for filename in os.listdir(folder):
-        try:
-            with Image.open(os.path.join(folder, filename)) as img:
-                formats.add(img.format.upper())
-        except (IOError, ValueError):
-            continue
-    return sorted(list(formats))
+# 把仓库根目录加入搜索路径，以便直接运行本脚本时导入 pyimg
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.convert import get_image_formats, output_filename_for, convert_image
 
 def convert_images_task(input_folder, output_folder, from_format, to_format, progress_bar, status_label, start_button):
     """
@@ -45,19 +33,10 @@ def convert_images_task(input_folder, output_folder, from_format, to_format, pro
 
     for i, filename in enumerate(files_to_convert):
         input_path = os.path.join(input_folder, filename)
-        base_name = os.path.splitext(filename)[0]
-        if to_format.upper() == 'JPEG':
-            output_filename = f"{base_name}.jpg"
-        else:
-            output_filename = f"{base_name}.{to_format.lower()}"
-        output_path = os.path.join(output_folder, output_filename)
+        output_path = os.path.join(output_folder, output_filename_for(filename, to_format))
 
         try:
-            img = Image.open(input_path)
-            # 转换模式以避免JPG保存问题（如RGBA模式）
-            if img.mode == 'RGBA' and to_format.upper() == 'JPEG':
-                img = img.convert('RGB')
-            img.save(output_path, to_format.upper())
+            convert_image(input_path, output_path, to_format)
             count_success += 1
             status_label.config(text=f"正在转换：{filename}")
         except Exception as e:
@@ -1,84 +1,14 @@
-import cv2
-import numpy as np
 import os
+import sys
 import tkinter as tk
 from tkinter import filedialog, messagebox, simpledialog
 from tkinter.ttk import Progressbar
 # from PIL import Image, ImageTk # Not strictly necessary for this version
 
-def stitch_images(image_paths, direction="vertical"):
-    """
-    Stitches multiple images either vertically or horizontally.
-    Adjusts dimensions to match for seamless stitching.
-    Returns the stitched image as a NumPy array.
-
-    Args:
-        image_paths (list): A list of paths to the images to be stitched.
-        direction (str): "vertical" for vertical stitching, "horizontal" for horizontal.
-                         Defaults to "vertical".
-    """
-    if not image_paths:
-        return None
-
-    images = []
-    for path in image_paths:
-        # Robustly read image for non-ASCII paths
-        img_bytes = np.fromfile(path, np.uint8)
-        img = cv2.imdecode(img_bytes, cv2.IMREAD_COLOR)
-
-        if img is not None:
-            images.append(img)
-        else:
-            print(f"Warning: Could not read image '{path}'. Skipping.")
-
-    if not images:
-        return None
-
-    if direction == "vertical":
-        # Find the maximum width among all images for vertical stacking
-        max_dim = max(img.shape[1] for img in images) # Max width
-        # Check if the combined height might exceed limits (rough estimate)
-        total_height_estimate = sum(img.shape[0] * (max_dim / img.shape[1]) for img in images) if images else 0
-        if total_height_estimate > 65000: # Slightly less than 65500 for safety margin
-            print(f"Warning: Estimated total height {total_height_estimate} pixels exceeds typical max dimension for vertical stitch.")
-
-    elif direction == "horizontal":
-        # Find the maximum height among all images for horizontal stacking
-        max_dim = max(img.shape[0] for img in images) # Max height
-        # Check if the combined width might exceed limits (rough estimate)
-        total_width_estimate = sum(img.shape[1] * (max_dim / img.shape[0]) for img in images) if images else 0
-        if total_width_estimate > 65000: # Slightly less than 65500 for safety margin
-            print(f"Warning: Estimated total width {total_width_estimate} pixels exceeds typical max dimension for horizontal stitch.")
-    else:
-        raise ValueError("Direction must be 'vertical' or 'horizontal'.")
-
-    # Resize images to the max dimension along the non-stitching axis
-    resized_images = []
-    for img in images:
-        if direction == "vertical":
-            # Resize width to max_dim (max_width), maintaining aspect ratio
-            if img.shape[1] != max_dim:
-                new_height = int(img.shape[0] * (max_dim / img.shape[1]))
-                resized_img = cv2.resize(img, (max_dim, new_height), interpolation=cv2.INTER_AREA)
-                resized_images.append(resized_img)
-            else:
-                resized_images.append(img)
-        elif direction == "horizontal":
-            # Resize height to max_dim (max_height), maintaining aspect ratio
-            if img.shape[0] != max_dim:
-                new_width = int(img.shape[1] * (max_dim / img.shape[0]))
-                resized_img = cv2.resize(img, (new_width, max_dim), interpolation=cv2.INTER_AREA)
-                resized_images.append(resized_img)
-            else:
-                resized_images.append(img)
-
-    # Stack the resized images
-    if direction == "vertical":
-        stitched_image = np.vstack(resized_images)
-    elif direction == "horizontal":
-        stitched_image = np.hstack(resized_images)
-
-    return stitched_image
+# Make the repository root importable so this script can be run directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyimg.stitch import stitch_images, save_stitched, stitch_streaming, measure_strip, MAX_ENCODE_DIM
+from pyimg.imgio import IOStats
 
 def image_stitcher_gui():
     """
@@ -86,13 +16,15 @@ def image_stitcher_gui():
     """
     root = tk.Tk()
     root.title("图片拼接工具")
-    root.geometry("680x550") # Adjust initial window size for new controls
+    root.geometry("680x620") # Adjust initial window size for new controls
     root.resizable(False, False) # Prevent resizing
 
     input_folder_path = tk.StringVar()
     output_file_path = tk.StringVar()
     stitch_direction = tk.StringVar(value="vertical") # Default to vertical stitching
     images_per_batch = tk.IntVar(value=0) # Default to 0, meaning all in one batch
+    output_mode = tk.StringVar(value="whole") # whole / stream (row-by-row PNG) / tiles
+    tile_size = tk.IntVar(value=16000) # Tile length in pixels for "tiles" mode
 
     def select_input_folder():
         folder_selected = filedialog.askdirectory(title="选择图片源文件夹")
@@ -124,6 +56,7 @@ def image_stitcher_gui():
         output_base_file = output_file_path.get()
         direction = stitch_direction.get()
         batch_size = images_per_batch.get()
+        mode = output_mode.get()
 
         if not input_folder:
             messagebox.showwarning("警告", "请选择图片源文件夹！")
@@ -131,6 +64,20 @@ def image_stitcher_gui():
         if not output_base_file:
             messagebox.showwarning("警告", "请选择拼接图片保存路径和文件名！")
             return
+        if mode == "stream":
+            if direction != "vertical":
+                messagebox.showwarning("警告", "流式 PNG 只支持垂直拼接，水平拼接请选择分块保存。")
+                return
+            if os.path.splitext(output_base_file)[1].lower() != ".png":
+                output_base_file = os.path.splitext(output_base_file)[0] + ".png"
+                output_file_path.set(output_base_file)
+        if mode == "tiles":
+            try:
+                if not 0 < tile_size.get() <= 65500:
+                    raise ValueError
+            except (tk.TclError, ValueError):
+                messagebox.showwarning("无效输入", "分块长度必须是 1 到 65500 之间的整数。")
+                return
 
         # Clear progress bar and status
         progress_bar['value'] = 0
@@ -162,8 +109,11 @@ def image_stitcher_gui():
             num_batches = 1
             status_label.config(text=f"发现 {total_images} 张图片，将整体拼接 ({'垂直' if direction == 'vertical' else '水平'})...")
             # Warn if single batch might be too large (heuristic check)
-            if total_images > 50 and (direction == "vertical" or direction == "horizontal"): # Arbitrary threshold
-                response = messagebox.askyesno("警告", "您选择不分批处理所有图片。如果图片数量过多，拼接后尺寸可能超过系统限制导致保存失败。是否继续？")
+            # Streaming modes are not limited by the encoder, so only warn for whole-image output.
+            # The exact size comes from the file headers, no image is decoded here.
+            strip_size = measure_strip(all_image_paths, direction) if mode == "whole" else None
+            if strip_size is not None and max(strip_size) > MAX_ENCODE_DIM:
+                response = messagebox.askyesno("警告", f"拼接后尺寸为 {strip_size[0]}x{strip_size[1]} 像素，超过 OpenCV 保存限制 ({MAX_ENCODE_DIM} 像素)，保存将会失败。\n建议设置 '每批图片数量' 或选择流式 PNG / 分块保存。是否仍要继续？")
                 if not response:
                     status_label.config(text="操作已取消。")
                     return
@@ -179,45 +129,51 @@ def image_stitcher_gui():
 
         successful_saves = 0
         failed_saves = 0
+        io_stats = IOStats()
 
         for i, batch_image_paths in enumerate(batches):
             current_batch_num = i + 1
             status_label.config(text=f"正在处理第 {current_batch_num}/{num_batches} 批次 ({len(batch_image_paths)} 张图片)...")
             root.update_idletasks()
 
+            stitched_image = None
             try:
-                stitched_image = stitch_images(batch_image_paths, direction=direction)
-
-                if stitched_image is None:
-                    messagebox.showerror("错误", f"第 {current_batch_num} 批次拼接失败，可能没有可处理的图片。")
-                    failed_saves += 1
-                    continue
-
                 # Generate output filename for current batch
                 if num_batches > 1:
                     batch_output_file = os.path.join(output_dir, f"{output_name}_part{current_batch_num}{output_ext}")
                 else: # Single batch, use the original chosen filename
                     batch_output_file = output_base_file
 
+                if mode != "whole":
+                    # Streamed output never holds the whole strip in memory
+                    written = stitch_streaming(batch_image_paths, batch_output_file, direction=direction,
+                                               tile_size=tile_size.get() if mode == "tiles" else 0, stats=io_stats)
+                    if not written:
+                        messagebox.showerror("错误", f"第 {current_batch_num} 批次拼接失败，可能没有可处理的图片。")
+                        failed_saves += 1
+                    else:
+                        successful_saves += 1
+                        print(f"成功保存批次 {current_batch_num} 到: {', '.join(written)}")
+                    progress_bar['value'] = (current_batch_num / num_batches) * 100
+                    root.update_idletasks()
+                    continue
+
+                stitched_image = stitch_images(batch_image_paths, direction=direction, stats=io_stats)
+
+                if stitched_image is None:
+                    messagebox.showerror("错误", f"第 {current_batch_num} 批次拼接失败，可能没有可处理的图片。")
+                    failed_saves += 1
+                    continue
+
                 # Save the stitched image (robustly for non-ASCII paths)
-                encode_param = []
-                if output_ext.lower() in ('.jpg', '.jpeg'):
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 95]
-                elif output_ext.lower() == '.png':
-                    encode_param = [int(cv2.IMWRITE_PNG_COMPRESSION), 9]
-
-                is_success, buffer = cv2.imencode(output_ext, stitched_image, encode_param)
-                if is_success:
-                    buffer.tofile(batch_output_file)
-                    successful_saves += 1
-                    print(f"成功保存批次 {current_batch_num} 到: {batch_output_file}")
-                else:
-                    raise Exception("Failed to encode image for saving.")
+                save_stitched(batch_output_file, stitched_image, stats=io_stats)
+                successful_saves += 1
+                print(f"成功保存批次 {current_batch_num} 到: {batch_output_file}")
 
             except Exception as e:
                 # Catch the specific OpenCV dimension error more gracefully
-                if "Maximum supported image dimension is 65500 pixels" in str(e):
-                     messagebox.showerror("保存失败", f"第 {current_batch_num} 批次图片拼接后尺寸过大 ({stitched_image.shape[1]}x{stitched_image.shape[0]} 像素)，超出 OpenCV 限制 (通常为 65500 像素)。请尝试减少 '每批图片数量' 或缩小原图。")
+                if stitched_image is not None and "Maximum supported image dimension is 65500 pixels" in str(e):
+                     messagebox.showerror("保存失败", f"第 {current_batch_num} 批次图片拼接后尺寸过大 ({stitched_image.shape[1]}x{stitched_image.shape[0]} 像素)，超出 OpenCV 限制 (通常为 65500 像素)。请尝试减少 '每批图片数量'，或选择流式 PNG / 分块保存。")
                 else:
                     messagebox.showerror("错误", f"处理第 {current_batch_num} 批次时发生错误: {e}")
                 print(f"Error during stitching batch {current_batch_num}: {e}")
@@ -228,6 +184,7 @@ def image_stitcher_gui():
             root.update_idletasks()
 
         progress_bar['value'] = 100
+        print(f"I/O 统计: {io_stats}")
         final_message = f"所有批次处理完成！\n成功保存 {successful_saves} 张长图。\n失败 {failed_saves} 张长图。"
         messagebox.showinfo("完成", final_message)
         status_label.config(text="完成。")
@@ -268,6 +225,23 @@ def image_stitcher_gui():
     tk.Label(root, text="(0为不分批，即全部拼接)").grid(row=row_idx, column=1, padx=(100,0), pady=5, sticky="w")
     batch_entry.bind("<FocusOut>", lambda e: validate_batch_size()) # Validate on losing focus
 
+    # Output Mode Selection
+    row_idx += 1
+    tk.Label(root, text="保存方式:").grid(row=row_idx, column=0, padx=10, pady=5, sticky="w")
+
+    mode_frame = tk.Frame(root)
+    mode_frame.grid(row=row_idx, column=1, columnspan=2, padx=5, pady=5, sticky="w")
+
+    tk.Radiobutton(mode_frame, text="整张保存", variable=output_mode, value="whole").pack(side=tk.LEFT, padx=10)
+    tk.Radiobutton(mode_frame, text="流式PNG (仅垂直)", variable=output_mode, value="stream").pack(side=tk.LEFT, padx=10)
+    tk.Radiobutton(mode_frame, text="分块保存", variable=output_mode, value="tiles").pack(side=tk.LEFT, padx=10)
+
+    # Tile Size Input
+    row_idx += 1
+    tk.Label(root, text="分块长度(像素):").grid(row=row_idx, column=0, padx=10, pady=5, sticky="w")
+    tk.Entry(root, textvariable=tile_size, width=10).grid(row=row_idx, column=1, padx=5, pady=5, sticky="w")
+    tk.Label(root, text="(分块保存时每块的长度，输出为 _001、_002…)").grid(row=row_idx, column=1, padx=(100,0), pady=5, sticky="w")
+
     # Start Button
     row_idx += 1
     tk.Button(root, text="开始拼接", command=start_stitching_process, bg="#4CAF50", fg="white", width=20, height=2).grid(row=row_idx, column=0, columnspan=3, pady=30)